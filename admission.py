@@ -0,0 +1,169 @@
+# ======================== ADMISSION CONTROL ========================
+"""Admission control for expensive routes (PDF/ZIP generation and uploads).
+
+Views wrapped in ``admission.heavy()`` must pass two checks before they run:
+
+* a per-user token bucket. Each user gets ``ADMISSION_BURST`` requests at
+  once, refilled at ``ADMISSION_RATE_PER_MINUTE``.
+* a host-wide cap of ``ADMISSION_MAX_CONCURRENT`` heavy requests in flight,
+  so the remaining workers stay free for interactive pages.
+
+Both answer ``429`` with ``Retry-After`` straight away instead of queueing.
+
+State is shared by every worker on the host through ``ADMISSION_DIR``. The
+cap is one lock file per slot, held with ``flock`` for as long as the
+response lasts, streamed bodies included. The kernel drops the lock if a
+worker dies, so a crash can never leak a slot. Buckets live in a small
+SQLite file, with ``BEGIN IMMEDIATE`` serialising the workers. Where
+``fcntl`` is unavailable, the cap falls back to one semaphore per process.
+"""
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request, session
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers
+    fcntl = None
+
+PRUNE_EVERY_SECONDS = 3600
+
+
+class Admission:
+    """Shared concurrency cap and per-user token buckets for heavy views"""
+
+    def __init__(self):
+        self.enabled = False
+        self.rejected = {'busy': 0, 'rate': 0}
+        self.admitted = 0
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('ADMISSION_CONTROL', True)
+        self.directory = app.config['ADMISSION_DIR']
+        self.max_concurrent = int(app.config.get('ADMISSION_MAX_CONCURRENT', 2))
+        self.rate = float(app.config.get('ADMISSION_RATE_PER_MINUTE', 6)) / 60.0
+        self.burst = float(app.config.get('ADMISSION_BURST', 3))
+        self.busy_retry = int(app.config.get('ADMISSION_BUSY_RETRY_SECONDS', 5))
+        os.makedirs(self.directory, exist_ok=True)
+        self._buckets_path = os.path.join(self.directory, 'buckets.sqlite3')
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        finally:
+            conn.close()
+
+    # ---------- token buckets ----------
+
+    def _connect(self):
+        return sqlite3.connect(self._buckets_path, timeout=2, isolation_level=None)
+
+    def _take(self, key, cost):
+        """Seconds to wait before retrying, or 0 when cost tokens were taken"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            if now - self._pruned_at > PRUNE_EVERY_SECONDS:
+                # Idle long enough to be full again
+                self._pruned_at = now
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - self.burst / self.rate - 60,))
+            conn.execute('COMMIT')
+            return wait
+        finally:
+            conn.close()
+
+    # ---------- concurrency slots ----------
+
+    def _acquire_slot(self):
+        """A release callable, or None when every slot is taken"""
+        if fcntl is None:
+            if not self._semaphore.acquire(blocking=False):
+                return None
+            return self._semaphore.release
+        for slot in range(self.max_concurrent):
+            f = open(os.path.join(self.directory, f'slot-{slot}.lock'), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            return f.close  # closing the file releases the lock
+        return None
+
+    # ---------- decorator ----------
+
+    def _reject(self, reason, retry_after, message):
+        with self._lock:
+            self.rejected[reason] += 1
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def heavy(self, cost=1):
+        """Admit the view only within the caller's rate and the host-wide concurrency cap"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                # Slot first, so a request turned away as busy costs the user no tokens
+                release = self._acquire_slot()
+                if release is None:
+                    return self._reject('busy', self.busy_retry,
+                                        'The server is busy generating other reports. Please retry shortly.')
+
+                key = f"user:{session.get('user_id')}" if session.get('user_id') else f'ip:{request.remote_addr}'
+                try:
+                    wait = self._take(key, cost)
+                except sqlite3.Error:
+                    # The limiter must never take the route down with it
+                    self.app.logger.exception('Admission bucket store unavailable; admitting')
+                    wait = 0
+                if wait:
+                    release()
+                    return self._reject('rate', max(1, int(wait + 0.999)),
+                                        'Too many report or upload requests. Please wait a moment.')
+                with self._lock:
+                    self.admitted += 1
+                try:
+                    response = self.app.make_response(f(*args, **kwargs))
+                except BaseException:
+                    release()
+                    raise
+                # Held until the body has been sent, which for streamed responses is after the view returns
+                if response.direct_passthrough:
+                    # send_file bodies skip Response.close, so release when the server closes the body
+                    response.response = ClosingIterator(response.response, [release])
+                else:
+                    response.call_on_close(release)
+                return response
+            return decorated_function
+        return decorator
+
+    def metrics(self):
+        if not self.enabled:
+            return
+        yield 'admission_admitted_total', 'counter', 'Heavy requests admitted by this worker.', [({}, self.admitted)]
+        yield 'admission_rejected_total', 'counter', 'Heavy requests answered 429 by this worker.', [
+            ({'reason': reason}, count) for reason, count in sorted(self.rejected.items())
+        ]
@@ -1,44 +1,78 @@
 # ======================== IMPORTS ========================
-from sqlalchemy import text
+from sqlalchemy import text, func, and_, tuple_, event, inspect, select
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.orm import validates, joinedload, selectinload, contains_eager
+from sqlalchemy.schema import CreateIndex
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
+import click
+from collections import namedtuple
 from functools import wraps
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from flask import send_file
+from flask import send_file, send_from_directory, stream_with_context
+from jinja2 import FileSystemBytecodeCache
 import os
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import threading
+import time
 
-# ======================== NEW IMPORTS FOR PDF REPORTS ========================
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib import colors
-from io import BytesIO
-from reportlab.platypus import Image as ReportLabImage 
-import ssl
-from urllib.request import Request, urlopen
-from reportlab.lib.utils import ImageReader
 from werkzeug.utils import secure_filename
+from passwords import hasher_from_env, PasswordHasherBusy
+import fulltext
+from metrics import RequestMetrics
+from queryaudit import QueryAudit
+from profiler import RequestProfiler
+from replica import ReplicaRouter, RoutingSession
+from leavefeed import LeaveFeed
+import attendancebits
+import balances
+import precompute
+import workcalendar
+from admission import Admission
+from usercache import UserCache
 
 # import qrcode
 
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'workzen-secret-key-2025')
+# Bound to the app in create_app(), so importing this module opens no connections
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-# PostgreSQL Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    f"postgresql://{os.environ.get('DB_USER', 'postgres')}:"
-    f"{os.environ.get('DB_PASSWORD', '8511')}@"
-    f"{os.environ.get('DB_HOST', 'localhost')}:"
-    f"{os.environ.get('DB_PORT', 5432)}/"
-    f"{os.environ.get('DB_NAME', 'workzen_db')}"
-)
+# Calibrated once per process (the master, when preloaded); verification runs on a bounded worker pool
+password_hasher = hasher_from_env()
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# Latency, SQL and response-size histograms per endpoint, served on /metrics
+request_metrics = RequestMetrics()
+
+# N+1 / slow-query logging, only hooked when QUERY_AUDIT is set
+query_audit = QueryAudit()
+
+# Samples single requests flagged with X-Profile: 1 by an HOD
+request_profiler = RequestProfiler()
+
+# Sends reporting and export reads to REPLICA_DATABASE_URL while it is healthy and caught up
+replica_router = ReplicaRouter(db)
+
+# Pushes committed leave status changes to open time-off pages
+leave_feed = LeaveFeed()
+
+# Pre-rendered standard reports, served while their data version is unchanged
+report_store = precompute.ReportStore()
+
+# Host-wide cap and per-user rate for PDF/ZIP generation and uploads
+admission = Admission()
+
+# Users, the counselor list and cohorts across requests; dropped on every user write
+user_cache = UserCache()
+
+# Working days between dates from per-academic-year prefix sums over weekends and holidays
+work_calendar = workcalendar.WorkCalendar()
 
 
 # ======================== DATABASE MODELS ========================
@@ -53,14 +87,32 @@ class User(db.Model):
     full_name = db.Column(db.String(255), nullable=True)
     
     # --- CHANGED: Use ID instead of Email ---
-    counselor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    counselor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
     # ----------------------------------------
 
+    # Directory search: roles are stored upper-case so (role, prefix) lookups hit these
+    __table_args__ = (
+        db.Index('ix_users_role_name_prefix', 'role', func.lower(full_name).label('name_lower'),
+                 postgresql_ops={'name_lower': 'text_pattern_ops'}),
+        db.Index('ix_users_role_email_prefix', 'role', func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+    )
+
+    @validates('role')
+    def normalize_role(self, key, value):
+        return value.strip().upper() if value else value
+
     def set_password(self, password):
-        self.password = password
+        self.password = password_hasher.hash_in_pool(password)
 
     def check_password(self, password):
-        return self.password == password
+        """Verify on the hashing pool, migrating plaintext/weak hashes on success"""
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.set_password(password)
+            db.session.commit()
+        return True
 
 
 class Attendance(db.Model):
@@ -74,6 +126,39 @@ class Attendance(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     __table_args__ = (db.UniqueConstraint('user_id', 'attendance_date', name='uq_user_date'),)
 
+class AttendanceMonth(db.Model):
+    """One row per student per month; day d is bit d-1 (see attendancebits.py)"""
+    __tablename__ = 'attendance_months'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)  # yyyymm
+    present_bits = db.Column(db.Integer, nullable=False, default=0)
+    absent_bits = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_attendance_months_month', 'month', 'user_id'),)
+
+
+@event.listens_for(Attendance.user_id, 'set', active_history=True)
+@event.listens_for(Attendance.attendance_date, 'set', active_history=True)
+def _attendance_key_changed(target, value, oldvalue, initiator):
+    """No-op; active_history loads the old value so the flush hook also refreshes the month a row left"""
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _refresh_attendance_months(session, flush_context):
+    """Keep attendance_months in step with attendance rows written through the ORM"""
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Attendance):
+            # A moved row also changes the month it left
+            state = inspect(obj)
+            for user_id in list(state.attrs.user_id.history.deleted) + [obj.user_id]:
+                for day in list(state.attrs.attendance_date.history.deleted) + [obj.attendance_date]:
+                    if user_id is not None and day is not None:
+                        keys.add((user_id, day))
+    if keys:
+        attendancebits.refresh(session.connection(), db.metadata, keys)
+
 class Leave(db.Model):
     """Leave request model"""
     __tablename__ = 'leaves'
@@ -90,6 +175,23 @@ class Leave(db.Model):
     number_of_days = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Time-off pages list leaves newest first, a page at a time (see _leave_page)
+    __table_args__ = (
+        db.Index('ix_leaves_created', 'created_at', 'id'),
+        db.Index('ix_leaves_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+class LeaveEvent(db.Model):
+    """Outbox of leave status changes, written in the same transaction as the change"""
+    __tablename__ = 'leave_events'
+    id = db.Column(db.Integer, primary_key=True)
+    leave_id = db.Column(db.Integer, db.ForeignKey('leaves.id'), nullable=False)
+    leave = db.relationship('Leave')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    counselor_id = db.Column(db.Integer)  # requester's counselor when the event happened
+    kind = db.Column(db.String(20), nullable=False)  # created, approved, rejected
+    status = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class LeaveBalance(db.Model):
     """Leave balance tracking"""
@@ -121,11 +223,53 @@ class LeaveDocument(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# ---------- Archive of closed academic years (see archive.py) ----------
+
+class LeaveArchive(db.Model):
+    """Decided leaves from closed academic years; same columns as leaves"""
+    __tablename__ = 'leaves_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    requester = db.relationship('User', foreign_keys=[user_id])
+    leave_type = db.Column(db.String(50), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False, index=True)
+    reason = db.Column(db.Text)
+    status = db.Column(db.String(50))
+    approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    approver = db.relationship('User', foreign_keys=[approved_by])
+    number_of_days = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+class LeaveDocumentArchive(db.Model):
+    __tablename__ = 'leave_documents_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    leave_id = db.Column(db.Integer, db.ForeignKey('leaves_archive.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_url = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer)
+    file_name = db.Column(db.String(255), nullable=False)
+    document_type = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+class AttendanceArchive(db.Model):
+    __tablename__ = 'attendance_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    attendance_date = db.Column(db.Date, nullable=False, index=True)
+    status = db.Column(db.String(50))
+    remarks = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_attendance_archive_user_date', 'user_id', 'attendance_date'),)
+
 class Achievement(db.Model):
     __tablename__ = 'achievements'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     user = db.relationship('User', backref='achievements')
+    __table_args__ = (db.Index('ix_achievements_user_created', 'user_id', 'created_at', 'id'),)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=False)
     file_url = db.Column(db.String(500), nullable=False)
@@ -133,6 +277,132 @@ class Achievement(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class Holiday(db.Model):
+    """Institute holiday; weekends come from WEEKEND_DAYS (see workcalendar.py)"""
+    __tablename__ = 'holidays'
+    day = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+
+class DataVersion(db.Model):
+    """Change counter per data scope; precomputed reports are valid while theirs is unchanged"""
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(50), primary_key=True)  # see precompute.SCOPES
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+_VERSIONED_MODELS = {
+    Leave: 'leaves', LeaveArchive: 'leaves',
+    Attendance: 'attendance', AttendanceArchive: 'attendance',
+    User: 'users',
+    Holiday: 'calendar',
+}
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_data_scopes(session, flush_context):
+    """Scopes this flush wrote to; their counters move once the transaction commits"""
+    scopes = session.info.setdefault('data_scopes', set())
+    scopes.update(_VERSIONED_MODELS[type(obj)] for obj in list(session.new) + list(session.deleted)
+                  if type(obj) in _VERSIONED_MODELS)
+    scopes.update(_VERSIONED_MODELS[type(obj)] for obj in session.dirty
+                  if type(obj) in _VERSIONED_MODELS and session.is_modified(obj))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _bump_data_versions(session):
+    # In a short transaction of its own: bumping inside every write transaction held the
+    # counter rows locked until commit, which serialized all writers on Postgres
+    scopes = session.info.pop('data_scopes', None)
+    if not scopes:
+        return
+    try:
+        with db.engine.begin() as conn:
+            precompute.bump(conn, db.metadata, scopes)
+    except Exception:
+        app.logger.exception('Could not bump data versions %s; stored reports may be served stale', sorted(scopes))
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_data_scopes(session):
+    session.info.pop('data_scopes', None)
+
+# ---------- Cached user lookups (see usercache.py) ----------
+
+UserRef = namedtuple('UserRef', 'id email role full_name counselor_id')
+_USER_REF_COLUMNS = (User.id, User.email, User.role, User.full_name, User.counselor_id)
+
+
+def _primary_rows(statement):
+    # Cached values outlive the request, so they are never read from a lagging replica
+    return db.session.execute(statement, bind_arguments={'bind': db.engine}).all()
+
+
+def cached_user(user_id):
+    """Read-only snapshot of a user (id, email, role, full_name, counselor_id), or None"""
+    if user_id is None:
+        return None
+
+    def load():
+        rows = _primary_rows(select(*_USER_REF_COLUMNS).where(User.id == user_id))
+        return UserRef(*rows[0]) if rows else None
+    return user_cache.get(f'user:{user_id}', load, decode=UserRef._make)
+
+
+def session_user():
+    return cached_user(session.get('user_id'))
+
+
+def counselor_list():
+    """Every counselor as a UserRef, by id"""
+    def load():
+        return tuple(UserRef(*row) for row in _primary_rows(
+            select(*_USER_REF_COLUMNS).where(User.role == 'COUNSELOR').order_by(User.id)))
+    return user_cache.get('counselors', load, decode=lambda rows: tuple(UserRef._make(row) for row in rows))
+
+
+def cohort_ids(counselor_id):
+    """Ids of the students assigned to a counselor"""
+    def load():
+        return tuple(id for id, in _primary_rows(
+            select(User.id).where(User.counselor_id == counselor_id).order_by(User.id)))
+    return user_cache.get(f'cohort:{counselor_id}', load, decode=tuple)
+
+
+@event.listens_for(User.counselor_id, 'set', active_history=True)
+@event.listens_for(User.role, 'set', active_history=True)
+def _load_replaced_value(target, value, oldvalue, initiator):
+    # Registered only for active_history: the replaced value is loaded first, even when
+    # expired, so the flush below also invalidates the cohort the user is leaving
+    pass
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_user_cache_keys(session, flush_context):
+    """Cache keys a flush made stale; dropped once the transaction commits"""
+    keys = session.info.setdefault('user_cache_keys', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User) or (obj in session.dirty and not session.is_modified(obj)):
+            continue
+        attrs = inspect(obj).attrs
+        keys.add(f'user:{obj.id}')
+        # Old and new counselor both lose or gain a student
+        keys.update(f'cohort:{id}' for id in attrs.counselor_id.history.sum() if id is not None)
+        if 'COUNSELOR' in attrs.role.history.sum():
+            keys.add('counselors')
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_user_cache(session):
+    # After the commit, so no worker can reload the old row into the cache
+    keys = session.info.pop('user_cache_keys', None)
+    if keys:
+        user_cache.invalidate(*sorted(keys))
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_user_cache_keys(session):
+    session.info.pop('user_cache_keys', None)
+
 # ======================== DECORATORS ========================
 
 def login_required(f):
@@ -149,13 +419,73 @@ def role_required(*roles):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user = User.query.get(session.get('user_id'))
+            user = session_user()
             if not user or user.role not in roles:
                 return redirect(url_for('login')), 403
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+# ---------- Conditional GET (ETag / 304) ----------
+
+_etag_stats = {}
+_etag_stats_lock = threading.Lock()
+
+
+def table_version(model, *criteria):
+    """Cheap version token for the rows matching criteria: count + newest updated_at"""
+    count, latest = db.session.query(func.count(model.id), func.max(model.updated_at)).filter(*criteria).one()
+    return f'{count}:{latest.isoformat() if latest else ""}'
+
+
+def _record_etag(endpoint, hit):
+    with _etag_stats_lock:
+        stats = _etag_stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        stats['hits' if hit else 'misses'] += 1
+
+
+def etag_stats():
+    """Per-endpoint If-None-Match hit ratios"""
+    with _etag_stats_lock:
+        return {
+            endpoint: dict(stats, ratio=round(stats['hits'] / ((stats['hits'] + stats['misses']) or 1), 3))
+            for endpoint, stats in _etag_stats.items()
+        }
+
+
+def conditional_get(version_fn):
+    """Answer If-None-Match with 304 before the view runs its full query.
+
+    version_fn receives the view arguments and returns a cheap token that
+    changes whenever the response would, or None to skip caching (e.g. when
+    the caller is not authorized, so the view can produce its own error).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = version_fn(*args, **kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+
+            key = f'{request.endpoint}|{session.get("user_id")}|{request.query_string.decode()}|{version}'
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                _record_etag(request.endpoint, hit=True)
+                response = app.response_class(status=304)
+            else:
+                _record_etag(request.endpoint, hit=False)
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Browsers revalidate every time, so writes show up immediately
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
 # ======================== AUTHENTICATION ROUTES ========================
 
 @app.route('/')
@@ -170,7 +500,12 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except PasswordHasherBusy:
+            return render_template('login.html', error='Too many sign-ins in progress. Please try again.'), 503, \
+                {'Retry-After': '1'}
+        if valid:
             session['user_id'] = user.id
             session['role'] = user.role
             return redirect(url_for('dashboard'))
@@ -189,7 +524,7 @@ def logout():
 @login_required
 def dashboard():
     """Dashboard page"""
-    user = User.query.get(session.get('user_id'))
+    user = session_user()
     return render_template('dashboard.html', user=user)
 
 # ======================== TIME OFF (LEAVES) ========================
@@ -197,60 +532,169 @@ def dashboard():
 @app.route('/timeoff')
 @login_required
 def timeoff():
-    user_id = session.get('user_id')
-    user = User.query.get(user_id)
-    current_year = datetime.now().year
+    """Page shell; each tab's data is fetched from timeoff_fragment on demand"""
+    user = session_user()
+    return render_template('timeoff.html', user=user)
 
-    # 1. Own History
-    leaves = Leave.query.filter_by(user_id=user_id).order_by(Leave.created_at.desc()).all()
-    
-    # 2. Balance
-    leave_balance = LeaveBalance.query.filter_by(user_id=user_id, year=current_year).all()
 
-    # 3. All Leaves (History)
-    all_leaves = []
-    if user.role == 'HOD':
-        all_leaves = Leave.query.order_by(Leave.created_at.desc()).all()
-    elif user.role == 'COUNSELOR':
-        # --- CHANGED: Compare counselor_id == user.id ---
-        all_leaves = Leave.query.join(User, Leave.user_id == User.id).filter(
-            User.counselor_id == user.id
-        ).order_by(Leave.created_at.desc()).all()
+def _visible_leaves_query(user, *entities):
+    """Leaves of everyone the user approves for (HOD: all, COUNSELOR: cohort).
+
+    With no entities, rows come back as Leave objects with requester and
+    documents preloaded for the templates.
+    """
+    if entities:
+        query = db.session.query(*entities).select_from(Leave)
     else:
-        all_leaves = [leave for leave in leaves]
+        query = Leave.query.options(joinedload(Leave.requester), selectinload(Leave.documents))
+    if user.role == 'HOD':
+        return query
+    if user.role == 'COUNSELOR':
+        # Cohort ids come from the user cache, so the leaves index answers this without a users join
+        return query.filter(Leave.user_id.in_(cohort_ids(user.id)))
+    return query.filter(Leave.user_id == user.id)
 
-    # 4. Pending Approvals
-    pending_leaves = []
-    approved_today = 0
-    rejected_today = 0
+
+TIMEOFF_PAGE_SIZE = 50
+
+
+def _leave_page(query, after=None):
+    """(leaves, next cursor) for one page of query, newest first, after a decoded cursor"""
+    if after is not None:
+        query = query.filter(_before_cursor(Leave.created_at, Leave.id, after))
+    rows = query.order_by(Leave.created_at.desc().nulls_last(), Leave.id.desc()).limit(TIMEOFF_PAGE_SIZE + 1).all()
+    if len(rows) <= TIMEOFF_PAGE_SIZE:
+        return rows, None
+    rows = rows[:TIMEOFF_PAGE_SIZE]
+    return rows, _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+@app.route('/timeoff/fragments/<name>')
+@login_required
+@query_audit.budget(6)
+def timeoff_fragment(name):
+    """One section of the time-off page, backed only by the queries it needs"""
+    user_id = session.get('user_id')
+    user = cached_user(user_id)
+
+    if name == 'balance':
+        current_year = datetime.now().year
+        leave_balance = LeaveBalance.query.filter_by(user_id=user_id, year=current_year).all()
+        return render_template('timeoff/balance.html', leave_balance=leave_balance, current_year=current_year)
+
+    # Read before the data so the live feed replays anything committed meanwhile
+    feed_cursor = {'X-Feed-Cursor': str(leave_feed.cursor())}
+
+    if name == 'history':
+        leaves = Leave.query.options(
+            joinedload(Leave.approver), selectinload(Leave.documents)
+        ).filter_by(user_id=user_id).order_by(Leave.created_at.desc()).all()
+        return render_template('timeoff/history.html', leaves=leaves), feed_cursor
+
+    if user.role not in ['COUNSELOR', 'HOD']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    if name not in ('all', 'pending'):
+        return jsonify({'error': 'Unknown section'}), 404
+    query = _visible_leaves_query(user)
+    if name == 'pending':
+        query = query.filter(Leave.status == 'Pending')
+    cursor = request.args.get('cursor', '')
+    try:
+        after = _decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    leaves, next_cursor = _leave_page(query, after)
+    row_template = 'timeoff/request_row.html' if name == 'all' else 'timeoff/pending_row.html'
+    more = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+
+    if cursor:
+        # A further page: just its rows, appended below the ones on screen
+        return render_template('timeoff/rows.html', user=user, leaves=leaves, row_template=row_template), more
+
+    if name == 'all':
+        return render_template('timeoff/all_requests.html', user=user, all_leaves=leaves,
+                               next_cursor=next_cursor), {**feed_cursor, **more}
+
+    # Pending total and today's decisions in one pass
     today = datetime.now().date()
+    pending_count, approved_today, rejected_today = _visible_leaves_query(
+        user,
+        func.count(Leave.id).filter(Leave.status == 'Pending'),
+        func.count(Leave.id).filter(Leave.status == 'Approved', Leave.updated_at >= today),
+        func.count(Leave.id).filter(Leave.status == 'Rejected', Leave.updated_at >= today),
+    ).one()
+    return render_template('timeoff/pending.html', pending_leaves=leaves, next_cursor=next_cursor,
+                           pending_count=pending_count, approved_today=approved_today,
+                           rejected_today=rejected_today), {**feed_cursor, **more}
 
-    if user.role in ['COUNSELOR', 'HOD']:
-        if user.role == 'HOD':
-            pending_leaves = Leave.query.filter_by(status='Pending').order_by(Leave.created_at.desc()).all()
-            approved_today = Leave.query.filter(Leave.status == 'Approved', Leave.updated_at >= today).count()
-            rejected_today = Leave.query.filter(Leave.status == 'Rejected', Leave.updated_at >= today).count()
 
-        elif user.role == 'COUNSELOR':
-            # --- CHANGED: Compare counselor_id == user.id ---
-            pending_leaves = Leave.query.join(User, Leave.user_id == User.id).filter(
-                Leave.status == 'Pending',
-                User.counselor_id == user.id
-            ).order_by(Leave.created_at.desc()).all()
-
-            approved_today = Leave.query.join(User, Leave.user_id == User.id).filter(
-                Leave.status == 'Approved', Leave.updated_at >= today,
-                User.counselor_id == user.id
-            ).count()
-
-            rejected_today = Leave.query.join(User, Leave.user_id == User.id).filter(
-                Leave.status == 'Rejected', Leave.updated_at >= today,
-                User.counselor_id == user.id
-            ).count()
-
-    return render_template('timeoff.html', user=user, leaves=leaves, leave_balance=leave_balance,
-                           current_year=current_year, all_leaves=all_leaves, pending_leaves=pending_leaves,
-                           pending_count=len(pending_leaves), approved_today=approved_today, rejected_today=rejected_today)
+# ---------- Live status feed (see leavefeed.py) ----------
+
+def _record_leave_event(leave, kind):
+    """Queue an outbox row; it commits or rolls back with the caller's change"""
+    db.session.add(LeaveEvent(leave_id=leave.id, user_id=leave.user_id,
+                              counselor_id=leave.requester.counselor_id,
+                              kind=kind, status=leave.status))
+
+
+def _leave_events_head():
+    return db.session.query(func.max(LeaveEvent.id)).scalar() or 0
+
+
+def _load_leave_events(after_id, limit):
+    """Outbox rows past after_id, with the table rows approvers' pages insert"""
+    try:
+        events = LeaveEvent.query.options(
+            joinedload(LeaveEvent.leave).joinedload(Leave.requester),
+            joinedload(LeaveEvent.leave).selectinload(Leave.documents)
+        ).filter(LeaveEvent.id > after_id).order_by(LeaveEvent.id).limit(limit).all()
+        out = []
+        for event in events:
+            rows = {'all': render_template('timeoff/request_row.html', leave=event.leave, show_actions=True)}
+            if event.kind == 'created':
+                rows['pending'] = render_template('timeoff/pending_row.html', leave=event.leave)
+            out.append({'id': event.id, 'leave_id': event.leave_id, 'user_id': event.user_id,
+                        'counselor_id': event.counselor_id, 'kind': event.kind,
+                        'status': event.status, 'rows': rows})
+        return out
+    finally:
+        # Streams stay open for minutes; don't keep a pooled connection checked out meanwhile
+        db.session.close()
+
+
+def _prune_leave_events():
+    LeaveEvent.query.filter(LeaveEvent.created_at < datetime.utcnow() - timedelta(days=1)).delete()
+    db.session.commit()
+
+
+@app.route('/api/leaves/events')
+@login_required
+def leave_events():
+    """Server-sent leave status events for the leaves this user can see"""
+    user = session_user()
+    if not user:
+        # The account behind this session is gone; EventSource gives up on a 401
+        return jsonify({'error': 'Unauthorized'}), 401
+    user_id, role = user.id, user.role
+    db.session.close()
+
+    def matches(event):
+        if role == 'HOD' or event['user_id'] == user_id:
+            return True
+        return role == 'COUNSELOR' and event['counselor_id'] == user_id
+
+    def payload(event):
+        data = {key: event[key] for key in ('id', 'leave_id', 'user_id', 'kind', 'status')}
+        if role in ('HOD', 'COUNSELOR'):
+            data['rows'] = event['rows']
+        return data
+
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    since = int(since) if since and since.isdigit() else None
+    return app.response_class(stream_with_context(leave_feed.stream(since, matches, payload)),
+                              mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 """
 @app.route('/api/leaves/apply', methods=['POST'])
 @login_required
@@ -363,6 +807,32 @@ def apply_leave():
         return jsonify(error=str(e)), 500
 """
 
+# ---------- Working days (see workcalendar.py) ----------
+
+def _holiday_dates(first, following):
+    return [day for day, in db.session.query(Holiday.day).filter(Holiday.day >= first, Holiday.day < following)]
+
+
+def _calendar_version():
+    return precompute.current(db.session, db.metadata, ['calendar'])
+
+
+@app.route('/api/leaves/working-days')
+@login_required
+def leave_working_days():
+    """Working days from ?start= to ?end= (YYYY-MM-DD), as apply_leave will count them"""
+    try:
+        start_date = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Use start/end as YYYY-MM-DD'}), 400
+    try:
+        work_calendar.check_range(start_date, end_date, datetime.now().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'working_days': work_calendar.working_days(start_date, end_date)})
+
+
 @app.route('/api/leaves/apply', methods=['POST'])
 @login_required
 def apply_leave():
@@ -371,37 +841,28 @@ def apply_leave():
         user_id = session.get('user_id')
 
         # ================= FORM DATA =================
-        start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+        try:
+            start_date = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Use start_date/end_date as YYYY-MM-DD'}), 400
+        try:
+            work_calendar.check_range(start_date, end_date, datetime.now().date())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         leave_type = request.form.get('leave_type')
         reason = request.form.get('reason')
 
-        num_days = (end_date - start_date).days + 1
-        current_year = datetime.now().year
+        # Weekends and institute holidays are not counted, as of the latest holiday import
+        num_days = work_calendar.working_days(start_date, end_date, fresh=True)
+        if not num_days:
+            return jsonify({'error': 'The selected dates have no working days'}), 400
 
         # ================= FIND COUNSELOR =================
-        counselor = User.query.filter_by(role='COUNSELOR').first()
+        counselor = next(iter(counselor_list()), None)
 
         # ================= UNLIMITED LEAVE BALANCE =================
-        balance = LeaveBalance.query.filter_by(
-            user_id=user_id,
-            leave_type=leave_type,
-            year=current_year
-        ).first()
-
-        # Create balance record only for reporting
-        if not balance:
-            balance = LeaveBalance(
-                user_id=user_id,
-                leave_type=leave_type,
-                total_days=9999,        # Virtual unlimited
-                used_days=0,
-                remaining_days=9999,    # Never blocks leave
-                year=current_year
-            )
-            db.session.add(balance)
-            db.session.commit()
-
+        # Balance rows are provisioned in bulk by `flask leave-balances`
         # ❌ NO balance.remaining_days check
         # Unlimited leave – skip validation
 
@@ -419,6 +880,7 @@ def apply_leave():
 
         db.session.add(leave)
         db.session.flush()  # Get leave.id before commit
+        _record_leave_event(leave, 'created')
 
         # ================= DOCUMENT UPLOAD =================
         if 'document' in request.files:
@@ -468,8 +930,17 @@ def apply_leave():
         return jsonify(error=str(e)), 500
 
 
+def _leave_documents_version(leave_id):
+    leave = Leave.query.get(leave_id)
+    user = session_user()
+    if not leave or (leave.user_id != user.id and user.role not in ['HOD', 'COUNSELOR']):
+        return None
+    return table_version(LeaveDocument, LeaveDocument.leave_id == leave_id)
+
+
 @app.route('/api/leaves/<int:leave_id>/documents', methods=['GET'])
 @login_required
+@conditional_get(_leave_documents_version)
 def get_leave_documents(leave_id):
     """Get all documents for a specific leave request"""
     try:
@@ -480,7 +951,7 @@ def get_leave_documents(leave_id):
             return jsonify({'error': 'Leave request not found'}), 404
         
         # Check authorization
-        user = User.query.get(user_id)
+        user = cached_user(user_id)
         if leave.user_id != user_id and user.role not in ['HOD', 'COUNSELOR']:
             return jsonify({'error': 'Unauthorized access'}), 403
         
@@ -504,6 +975,7 @@ def get_leave_documents(leave_id):
 
 @app.route('/api/leaves/<int:leave_id>/documents/upload', methods=['POST'])
 @login_required
+@admission.heavy()
 def upload_leave_document(leave_id):
     """Upload a document to an existing leave request"""
     try:
@@ -618,7 +1090,7 @@ def download_leave_document(filename):
             return jsonify({'error': 'Document not found'}), 404
         
         user_id = session.get('user_id')
-        user = User.query.get(user_id)
+        user = cached_user(user_id)
         
         # 2. Allow access if user is Owner OR (HOD or COUNSELOR)
         if doc.user_id != user_id and user.role not in ['HOD', 'COUNSELOR']:
@@ -649,235 +1121,133 @@ def fix_database():
 @role_required('HOD', 'COUNSELOR')
 def approve_leave(leave_id):
     """Approve leave request"""
-    leave = Leave.query.get(leave_id)
+    # Locked, so a second approval waits for this one and then sees it is no longer pending
+    leave = Leave.query.filter_by(id=leave_id).with_for_update().first()
     if not leave:
         return jsonify({'error': 'Leave request not found'}), 404
+    if leave.status != 'Pending':
+        return jsonify({'error': f'Leave request is already {leave.status.lower()}'}), 409
+
+    # Provisioned in this transaction, before the status changes: the new row counts the
+    # days of leaves already approved, so this one must not be among them yet
+    balance = _leave_balance(leave.user_id, leave.leave_type, leave.start_date.year)
 
     leave.status = 'Approved'
     leave.approved_by = session.get('user_id')
-    balance = LeaveBalance.query.filter_by(
-        user_id=leave.user_id,
-        leave_type=leave.leave_type,
-        year=datetime.now().year
-    ).first()
+    # Charged at today's calendar, in the year the leave starts (as flask leave-balances counts it).
+    # A request left pending until its dates fell outside the calendar's years keeps the count
+    # it was applied with.
+    try:
+        work_calendar.check_range(leave.start_date, leave.end_date, datetime.now().date())
+    except ValueError:
+        pass
+    else:
+        leave.number_of_days = work_calendar.working_days(leave.start_date, leave.end_date, fresh=True)
 
     if balance:
         balance.used_days += leave.number_of_days
         balance.remaining_days = balance.total_days - balance.used_days
+    else:
+        app.logger.warning('No %s balance for user %s in %s; leave %s not charged',
+                           leave.leave_type, leave.user_id, leave.start_date.year, leave.id)
 
+    _record_leave_event(leave, 'approved')
     db.session.commit()
     return jsonify({'message': 'Leave approved successfully'}), 200
 
+def _leave_balance(user_id, leave_type, year):
+    """The balance row to charge, provisioned first if `flask leave-balances` has not created it yet.
+
+    Provisioning runs on the request's connection, so it commits or rolls back with the approval.
+    """
+    query = LeaveBalance.query.filter_by(user_id=user_id, leave_type=leave_type, year=year)
+    balance = query.first()
+    # No report reads balances (see LEAVE_REPORT_SCOPES), so provisioning bumps no data version
+    if balance is None and balances.provision(db.session.connection(), db.metadata, year, app.config['LEAVE_POLICY'],
+                                              datetime.utcnow(), user_ids=[user_id], leave_types=[leave_type]):
+        balance = query.first()
+    return balance
+
 @app.route('/api/leaves/reject/<int:leave_id>', methods=['PUT'])
 @login_required
 @role_required('HOD', 'COUNSELOR')
 def reject_leave(leave_id):
     """Reject leave request"""
-    leave = Leave.query.get(leave_id)
+    leave = Leave.query.filter_by(id=leave_id).with_for_update().first()
     if not leave:
         return jsonify({'error': 'Leave request not found'}), 404
+    if leave.status != 'Pending':
+        return jsonify({'error': f'Leave request is already {leave.status.lower()}'}), 409
 
     leave.status = 'Rejected'
     leave.approved_by = session.get('user_id')
+    _record_leave_event(leave, 'rejected')
     db.session.commit()
     return jsonify({'message': 'Leave rejected successfully'}), 200
 
 # ======================== PDF REPORT GENERATION ========================
+# Reports cover the live (open) academic years; only date-filtered reports
+# that reach further back also read the archive.
 
-@app.route('/api/leaves/report', methods=['GET'])
-@login_required
+def archived_through():
+    """Last day covered by archived leaves, or None while nothing is archived"""
+    return db.session.query(func.max(LeaveArchive.end_date)).scalar()
+
+# ReportLab is imported inside each route (see reporting.py) so workers that
+# never render a PDF skip its import cost. Rows are streamed into the PDF
+# with yield_per, at most reporting.MAX_REPORT_ROWS of them (ReportLab holds
+# every page until the end), and the summary counts come from GROUP BY queries
+# so they still cover every row. Queries fetch one row past the cap so the
+# PDF can say when rows were left out.
+
+REPORT_FETCH_ROWS = 1000
+
+def _status_counts(model, *criteria):
+    """{status: count} over model rows matching criteria"""
+    return dict(db.session.query(model.status, func.count(model.id)).filter(*criteria).group_by(model.status).all())
+
+# Reports that flask precompute-reports renders ahead of time are looked up in
+# report_store first; the lookup is one query on data_versions.
+
+LEAVE_REPORT_SCOPES = ('leaves', 'users')
+ATTENDANCE_REPORT_SCOPES = ('attendance', 'users')
 
 
+def _precomputed(key, scopes):
+    """(path of the stored report or None, current data version)"""
+    # From the primary: on routed views db.session reads a replica, whose counters may lag the data
+    with db.engine.connect() as conn:
+        version = precompute.current(conn, db.metadata, scopes)
+    return report_store.get(key, version), version
+
+
+def _render_leave_report(user):
+    """Full leave report; user is None when rendered ahead of time"""
+    import reporting
+
+    counts = _status_counts(Leave)
+    leaves = (Leave.query.options(joinedload(Leave.requester)).order_by(Leave.id)
+              .limit(reporting.MAX_REPORT_ROWS + 1).yield_per(REPORT_FETCH_ROWS))
+    return reporting.build_leave_report(
+        leaves, counts, user,
+        title='Leave Management Report',
+        summary_labels=['Total Leave Requests', 'Pending Approvals', 'Approved Requests', 'Rejected Requests'],
+        empty_message='No leave records found.'
+    )
+
+
+@app.route('/api/leaves/report', methods=['GET'])
+@login_required
+@admission.heavy()
+@query_audit.budget(5)
+@replica_router.reads()
 def generate_leave_report():
     """Generate comprehensive PDF report with Robust Image Loading"""
     try:
         user_id = session.get('user_id')
-        user = User.query.get(user_id)
-        leaves = Leave.query.all()
-        
-        # Statistics
-        total_leaves = len(leaves)
-        pending_leaves = len([l for l in leaves if l.status == 'Pending'])
-        approved_leaves = len([l for l in leaves if l.status == 'Approved'])
-        rejected_leaves = len([l for l in leaves if l.status == 'Rejected'])
-        
-        pdf_buffer = BytesIO()
-
-        # --- HELPER: Fetch Image safely (Bypassing SSL errors) ---
-        def get_image_from_url(url):
-            try:
-                # Create a context that doesn't verify SSL certificates (fixes common download issues)
-                ctx = ssl.create_default_context()
-                ctx.check_hostname = False
-                ctx.verify_mode = ssl.CERT_NONE
-                
-                # Add a User-Agent header so the server doesn't block us
-                req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-                
-                # Read data
-                response = urlopen(req, context=ctx)
-                image_data = BytesIO(response.read())
-                return ImageReader(image_data)
-            except Exception as e:
-                print(f"Error fetching image {url}: {e}")
-                return None
-
-        # --- HEADER FUNCTION ---
-        def draw_header(canvas, doc):
-            canvas.saveState()
-            page_width, page_height = A4
-            
-            # 1. Define Image URLs
-            mbit_url = "https://www.mbit.edu.in/wp-content/uploads/2021/12/webMBIT-1@2x.png"
-            cvm_url = "https://www.mbit.edu.in/wp-content/uploads/2020/02/CVM-CVMU.jpg"
-            
-            # 2. Draw Left Logo (MBIT)
-            logo_mbit = get_image_from_url(mbit_url)
-            if logo_mbit:
-                # x=20, y=Top-110, Width=180, Height=Auto
-                canvas.drawImage(logo_mbit, 0.4*inch, page_height - 1.6*inch, 
-                               width=2.5*inch, height=0.9*inch, 
-                               mask='auto', preserveAspectRatio=True, anchor='w')
-            else:
-                # Fallback text
-                canvas.setFont('Helvetica-Oblique', 10)
-                canvas.drawString(0.5*inch, page_height - 1*inch, "MBIT")
-
-            # 3. Draw Right Logo (CVM)
-            logo_cvm = get_image_from_url(cvm_url)
-            if logo_cvm:
-                canvas.drawImage(logo_cvm, page_width - 1.8*inch, page_height - 1.6*inch, 
-                               width=1.3*inch, height=1.3*inch, 
-                               mask='auto', preserveAspectRatio=True, anchor='e')
-            
-            # 4. Draw Center Text
-            # Institute Name
-            canvas.setFont('Helvetica-Bold', 14)
-            canvas.setFillColor(colors.HexColor('#1f2937'))
-            
-            # Center coordinates
-            center_x = page_width / 2.0
-            text_y = page_height - 0.8*inch
-            
-            canvas.drawCentredString(center_x, text_y, "Madhuben & Bhanubhai Patel")
-            canvas.drawCentredString(center_x, text_y - 18, "Institute of Technology")
-            
-            # Subtitle
-            canvas.setFont('Helvetica', 10)
-            canvas.setFillColor(colors.HexColor('#6b7280'))
-            canvas.drawCentredString(center_x, text_y - 35, "(The Charutar Vidya Mandal (CVM) University)")
-
-            # 5. Separator Line
-            canvas.setStrokeColor(colors.HexColor('#e5e7eb'))
-            canvas.setLineWidth(1)
-            canvas.line(0.5*inch, page_height - 1.8*inch, page_width - 0.5*inch, page_height - 1.8*inch)
-            
-            canvas.restoreState()
-
-        # --- SETUP DOCUMENT ---
-        doc = SimpleDocTemplate(
-            pdf_buffer,
-            pagesize=A4,
-            rightMargin=0.5*inch,
-            leftMargin=0.5*inch,
-            topMargin=2.2*inch, # Space for Header
-            bottomMargin=0.75*inch,
-            title='Leave Management Report'
-        )
-        
-        story = []
-        styles = getSampleStyleSheet()
-        
-        heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#208099'), spaceAfter=12, spaceBefore=12)
-        normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=10, spaceAfter=6)
-        
-        # Report Title
-        story.append(Paragraph('Leave Management Report', heading_style))
-        story.append(Paragraph(f'Generated on {datetime.now().strftime("%d %B %Y at %H:%M:%S")}', normal_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Summary Statistics
-        story.append(Paragraph('Summary Statistics', heading_style))
-        
-        summary_data = [
-            ['Metric', 'Count'],
-            ['Total Leave Requests', str(total_leaves)],
-            ['Pending Approvals', str(pending_leaves)],
-            ['Approved Requests', str(approved_leaves)],
-            ['Rejected Requests', str(rejected_leaves)],
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')])
-        ]))
-        
-        story.append(summary_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Detailed Leave Records
-        story.append(Paragraph('Detailed Leave Records', heading_style))
-        
-        if leaves:
-            leave_data = [['Employee', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Status', 'Reason']]
-            
-            for leave in leaves:
-                if leave.requester:
-                    name = getattr(leave.requester, 'full_name', None) or leave.requester.email.split('@')[0]
-                    email = leave.requester.email
-                    emp_details = Paragraph(f"<b>{name}</b><br/>{email}", normal_style)
-                else:
-                    emp_details = 'N/A'
-
-                leave_data.append([
-                    emp_details,
-                    leave.leave_type,
-                    leave.start_date.strftime('%d/%m/%Y'),
-                    leave.end_date.strftime('%d/%m/%Y'),
-                    str(leave.number_of_days),
-                    leave.status,
-                    leave.reason[:30] + '...' if leave.reason and len(leave.reason) > 30 else leave.reason or 'N/A'
-                ])
-            
-            leave_table = Table(leave_data, colWidths=[2.0*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.9*inch, 1.4*inch])
-            leave_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
-            ]))
-            story.append(leave_table)
-        else:
-            story.append(Paragraph('No leave records found.', normal_style))
-        
-        story.append(Spacer(1, 0.5*inch))
-        
-        # Footer
-        footer_text = f"""
-        <b>Report Information:</b><br/>
-        Generated by: {user.email}<br/>
-        Role: {user.role}<br/>
-        <br/>
-
-        """
-        story.append(Paragraph(footer_text, normal_style))
-        
-        # BUILD PDF
-        doc.build(story, onFirstPage=draw_header, onLaterPages=draw_header)
-        
-        pdf_buffer.seek(0)
+        user = cached_user(user_id)
+        path, _ = _precomputed('leave-report', LEAVE_REPORT_SCOPES)
+        pdf_buffer = path or _render_leave_report(user)
         return send_file(
             pdf_buffer,
             mimetype='application/pdf',
@@ -885,6 +1255,8 @@ def generate_leave_report():
             download_name=f'leave_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
         )
     
+    except (OperationalError, InterfaceError):
+        raise  # replica_router.reads() retries these on the primary
     except Exception as e:
         db.session.rollback()
         import traceback
@@ -895,11 +1267,16 @@ def generate_leave_report():
 
 @app.route('/api/leaves/report/filtered', methods=['POST'])
 @login_required
+@admission.heavy()
+@query_audit.budget(6)
+@replica_router.reads()
 def generate_filtered_report():
     """Generate filtered PDF report with Institutional Header"""
     try:
+        import reporting
+
         user_id = session.get('user_id')
-        user = User.query.get(user_id)
+        user = cached_user(user_id)
         
         # Get filter criteria
         data = request.get_json()
@@ -908,107 +1285,33 @@ def generate_filtered_report():
         status = data.get('status')
         leave_type = data.get('leave_type')
         
-        # Build query
-        query = Leave.query
-        
-        if start_date:
-            query = query.filter(Leave.start_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
-        if end_date:
-            query = query.filter(Leave.end_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
-        if status:
-            query = query.filter(Leave.status == status)
-        if leave_type:
-            query = query.filter(Leave.leave_type == leave_type)
-            
-        leaves = query.order_by(Leave.created_at.desc()).all()
-        
-        # Statistics for this filtered set
-        total_leaves = len(leaves)
-        pending_leaves = len([l for l in leaves if l.status == 'Pending'])
-        approved_leaves = len([l for l in leaves if l.status == 'Approved'])
-        rejected_leaves = len([l for l in leaves if l.status == 'Rejected'])
-        
-        pdf_buffer = BytesIO()
-
-        # --- HELPER: Fetch Image safely ---
-        def get_image_from_url(url):
-            try:
-                ctx = ssl.create_default_context()
-                ctx.check_hostname = False
-                ctx.verify_mode = ssl.CERT_NONE
-                req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-                response = urlopen(req, context=ctx)
-                image_data = BytesIO(response.read())
-                return ImageReader(image_data)
-            except Exception:
-                return None
-
-        # --- HEADER FUNCTION (Same as Main Report) ---
-        def draw_header(canvas, doc):
-            canvas.saveState()
-            page_width, page_height = A4
-            
-            # URLs
-            mbit_url = "https://www.mbit.edu.in/wp-content/uploads/2021/12/webMBIT-1@2x.png"
-            cvm_url = "https://www.mbit.edu.in/wp-content/uploads/2020/02/CVM-CVMU.jpg"
-            
-            # Left Logo (MBIT)
-            logo_mbit = get_image_from_url(mbit_url)
-            if logo_mbit:
-                canvas.drawImage(logo_mbit, 0.4*inch, page_height - 1.6*inch, 
-                               width=2.5*inch, height=0.9*inch, 
-                               mask='auto', preserveAspectRatio=True, anchor='w')
-            else:
-                canvas.setFont('Helvetica-Oblique', 10)
-                canvas.drawString(0.5*inch, page_height - 1*inch, "MBIT")
-
-            # Right Logo (CVM)
-            logo_cvm = get_image_from_url(cvm_url)
-            if logo_cvm:
-                canvas.drawImage(logo_cvm, page_width - 1.8*inch, page_height - 1.6*inch, 
-                               width=1.3*inch, height=1.3*inch, 
-                               mask='auto', preserveAspectRatio=True, anchor='e')
-
-            # Center Text
-            canvas.setFont('Helvetica-Bold', 14)
-            canvas.setFillColor(colors.HexColor('#1f2937'))
-            center_x = page_width / 2.0
-            text_y = page_height - 0.8*inch
-            
-            canvas.drawCentredString(center_x, text_y, "Madhuben & Bhanubhai Patel")
-            canvas.drawCentredString(center_x, text_y - 18, "Institute of Technology")
-            
-            canvas.setFont('Helvetica', 10)
-            canvas.setFillColor(colors.HexColor('#6b7280'))
-            canvas.drawCentredString(center_x, text_y - 35, "(The Charutar Vidya Mandal (CVM) University)")
-
-            # Separator Line
-            canvas.setStrokeColor(colors.HexColor('#e5e7eb'))
-            canvas.setLineWidth(1)
-            canvas.line(0.5*inch, page_height - 1.8*inch, page_width - 0.5*inch, page_height - 1.8*inch)
-            
-            canvas.restoreState()
-
-        # --- SETUP DOCUMENT ---
-        doc = SimpleDocTemplate(
-            pdf_buffer,
-            pagesize=A4,
-            rightMargin=0.5*inch,
-            leftMargin=0.5*inch,
-            topMargin=2.2*inch,  # Consistent Header Space
-            bottomMargin=0.75*inch,
-            title='Filtered Leave Report'
-        )
-        
-        story = []
-        styles = getSampleStyleSheet()
-        
-        heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#208099'), spaceAfter=12, spaceBefore=12)
-        normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=10, spaceAfter=6)
-        
-        # Report Title
-        story.append(Paragraph('Filtered Leave Report', heading_style))
-        story.append(Paragraph(f'Generated on {datetime.now().strftime("%d %B %Y at %H:%M:%S")}', normal_style))
+        # Build query (same filters on the archive when the range reaches closed years)
+        def criteria(model):
+            conditions = []
+            if start_date:
+                conditions.append(model.start_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+            if end_date:
+                conditions.append(model.end_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+            if status:
+                conditions.append(model.status == status)
+            if leave_type:
+                conditions.append(model.leave_type == leave_type)
+            return conditions
+
+        def filtered(model):
+            return (model.query.options(joinedload(model.requester)).filter(*criteria(model))
+                    .order_by(model.created_at.desc()).limit(reporting.MAX_REPORT_ROWS + 1)
+                    .yield_per(REPORT_FETCH_ROWS))
+
+        counts = _status_counts(Leave, *criteria(Leave))
+        leaves = filtered(Leave)
+        archived = archived_through()
+        if archived and (not start_date or datetime.strptime(start_date, '%Y-%m-%d').date() <= archived):
+            for key, count in _status_counts(LeaveArchive, *criteria(LeaveArchive)).items():
+                counts[key] = counts.get(key, 0) + count
+            # Both sides are already newest first, so merge instead of sorting everything
+            leaves = heapq.merge(leaves, filtered(LeaveArchive),
+                                 key=lambda leave: leave.created_at or datetime.min, reverse=True)
         
         # Show Filters Applied
         filter_text = []
@@ -1016,93 +1319,15 @@ def generate_filtered_report():
         if end_date: filter_text.append(f"To: {end_date}")
         if status: filter_text.append(f"Status: {status}")
         if leave_type: filter_text.append(f"Type: {leave_type}")
-        
-        if filter_text:
-            story.append(Paragraph(f"<b>Filters:</b> {', '.join(filter_text)}", normal_style))
-            
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Summary Statistics Table
-        story.append(Paragraph('Summary Statistics', heading_style))
-        summary_data = [
-            ['Metric', 'Count'],
-            ['Total Requests', str(total_leaves)],
-            ['Pending', str(pending_leaves)],
-            ['Approved', str(approved_leaves)],
-            ['Rejected', str(rejected_leaves)],
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')])
-        ]))
-        
-        story.append(summary_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Detailed Records Table
-        story.append(Paragraph('Detailed Leave Records', heading_style))
-        
-        if leaves:
-            leave_data = [['Employee', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Status', 'Reason']]
-            
-            for leave in leaves:
-                if leave.requester:
-                    name = getattr(leave.requester, 'full_name', None) or leave.requester.email.split('@')[0]
-                    email = leave.requester.email
-                    emp_details = Paragraph(f"<b>{name}</b><br/>{email}", normal_style)
-                else:
-                    emp_details = 'N/A'
-
-                leave_data.append([
-                    emp_details,
-                    leave.leave_type,
-                    leave.start_date.strftime('%d/%m/%Y'),
-                    leave.end_date.strftime('%d/%m/%Y'),
-                    str(leave.number_of_days),
-                    leave.status,
-                    leave.reason[:30] + '...' if leave.reason and len(leave.reason) > 30 else leave.reason or 'N/A'
-                ])
-            
-            leave_table = Table(leave_data, colWidths=[2.0*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.9*inch, 1.4*inch])
-            leave_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
-            ]))
-            story.append(leave_table)
-        else:
-            story.append(Paragraph('No records match these filters.', normal_style))
-        
-        story.append(Spacer(1, 0.5*inch))
-        
-        # Footer
-        footer_text = f"""
-        <b>Report Information:</b><br/>
-        Generated by: {user.email}<br/>
-        Role: {user.role}<br/>
-        <br/>
-        <i>This is an auto-generated report. Please verify the data before taking any action.</i>
-        """
-        story.append(Paragraph(footer_text, normal_style))
-        
-        # BUILD PDF
-        doc.build(story, onFirstPage=draw_header, onLaterPages=draw_header)
-        
-        pdf_buffer.seek(0)
+
+        pdf_buffer = reporting.build_leave_report(
+            leaves, counts, user,
+            title='Filtered Leave Report',
+            summary_labels=['Total Requests', 'Pending', 'Approved', 'Rejected'],
+            empty_message='No records match these filters.',
+            filters=filter_text,
+            footer_note='<i>This is an auto-generated report. Please verify the data before taking any action.</i>'
+        )
         return send_file(
             pdf_buffer,
             mimetype='application/pdf',
@@ -1110,12 +1335,13 @@ def generate_filtered_report():
             download_name=f'filtered_leave_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
         )
     
+    except (OperationalError, InterfaceError):
+        raise  # replica_router.reads() retries these on the primary
     except Exception as e:
         db.session.rollback()
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
-
 # ======================== SICK LEAVE PDF UPLOAD ========================
 
 class MedicalRecord(db.Model):
@@ -1132,6 +1358,7 @@ class MedicalRecord(db.Model):
 
 @app.route('/api/sick-leave/upload-certificate', methods=['POST'])
 @login_required
+@admission.heavy()
 def upload_sick_certificate():
     """Upload medical certificate for sick leave"""
     try:
@@ -1179,6 +1406,7 @@ def upload_sick_certificate():
 
 @app.route('/api/sick-leave/medical-records', methods=['GET'])
 @login_required
+@conditional_get(lambda: table_version(MedicalRecord, MedicalRecord.user_id == session.get('user_id')))
 def get_medical_records():
     """Get user's medical records"""
     user_id = session.get('user_id')
@@ -1232,9 +1460,10 @@ def download_medical_record(filename):
 @app.route('/reports')
 @login_required
 @role_required('HOD', 'COUNSELOR')
+@replica_router.reads()
 def reports():
     """Reports page"""
-    user = User.query.get(session.get('user_id'))
+    user = session_user()
 
     # Get attendance data
     today = datetime.now().date()
@@ -1258,15 +1487,30 @@ def reports():
 @app.route('/reports/<report_type>')
 @login_required
 @role_required('HOD', 'COUNSELOR')
+@replica_router.reads()
 def report_detail(report_type):
     """Detailed report view"""
-    user = User.query.get(session.get('user_id'))
+    user = session_user()
     
     if report_type == 'attendance':
-        attendance_data = Attendance.query.all()
-        return render_template('report_detail.html', 
+        # Served from the monthly rollups rather than every per-day row
+        first, following = _rollup_period()
+        threshold = app.config['ATTENDANCE_THRESHOLD']
+        present, absent, students = _rollup_scope(user, db.session.query(
+            func.sum(AttendanceMonth.present_days), func.sum(AttendanceMonth.absent_days),
+            func.count(func.distinct(AttendanceMonth.user_id))
+        ), first, following).one()
+        below = len(_student_rollups(user, first, following, below=threshold))
+        summary_stats = [
+            {'icon': '📊', 'value': f'{_percentage(present or 0, absent or 0) or 0}%', 'label': 'Attendance'},
+            {'icon': '👥', 'value': students, 'label': 'Students'},
+            {'icon': '⚠️', 'value': below, 'label': f'Below {threshold:g}%'},
+        ]
+        return render_template('report_detail.html',
                              report_type=report_type,
-                             data=attendance_data,
+                             data=[],
+                             summary_stats=summary_stats,
+                             date_range=f'{_month_label(first)} to {_month_label(attendancebits.previous_month_key(following))}',
                              user=user)
     
     elif report_type == 'leaves':
@@ -1280,6 +1524,220 @@ def report_detail(report_type):
         return redirect(url_for('reports'))
 
 
+# ======================== ATTENDANCE ROLLUPS ========================
+# Percentages come from attendance_months (one row per student per month), so a
+# student costs at most one row per month of the period whatever the day count.
+
+def _month_label(key):
+    return f'{key // 100:04d}-{key % 100:02d}'
+
+
+def _percentage(present, absent):
+    total = present + absent
+    return round(100.0 * present / total, 1) if total else None
+
+
+MAX_PERIOD_MONTHS = 60
+PERIOD_ERROR = f'Use from/to as YYYY-MM, from no later than to and at most {MAX_PERIOD_MONTHS} months'
+
+
+def _month_period(first_month=None, last_month=None):
+    """(first, following) month keys for YYYY-MM bounds, defaulting to the current term.
+
+    Raises ValueError for bad formats, reversed bounds and periods over MAX_PERIOD_MONTHS.
+    """
+    first, following = attendancebits.term_bounds(datetime.now().date(), app.config['ACADEMIC_YEAR_START_MONTH'])
+    if first_month:
+        first = attendancebits.month_key(datetime.strptime(first_month, '%Y-%m'))
+    if last_month:
+        last = attendancebits.month_key(datetime.strptime(last_month, '%Y-%m'))
+        if last == attendancebits.month_key(datetime.max):
+            raise ValueError('period ends after the last representable month')
+        following = attendancebits.next_month_key(last)
+    months = following // 100 * 12 + following % 100 - (first // 100 * 12 + first % 100)
+    if not 0 < months <= MAX_PERIOD_MONTHS:
+        raise ValueError(f'period of {months} months')
+    return first, following
+
+
+def _rollup_period():
+    """(first, following) month keys from ?from=YYYY-MM&to=YYYY-MM, defaulting to the current term"""
+    return _month_period(request.args.get('from'), request.args.get('to'))
+
+
+def _rollup_scope(user, query, first, following, counselor_id=None):
+    """Limit a query over AttendanceMonth to the period and the students this user may see"""
+    query = query.select_from(AttendanceMonth).join(User, User.id == AttendanceMonth.user_id).filter(
+        AttendanceMonth.month >= first, AttendanceMonth.month < following)
+    if user.role == 'COUNSELOR':
+        counselor_id = user.id
+    elif user.role != 'HOD':
+        return query.filter(AttendanceMonth.user_id == user.id)
+    if counselor_id is not None:
+        query = query.filter(User.counselor_id == counselor_id)
+    return query
+
+
+def _student_rollups(user, first, following, counselor_id=None, below=None, limit=None):
+    """Per-student totals in scope, lowest attendance first; below=threshold keeps only those under it"""
+    present = func.sum(AttendanceMonth.present_days)
+    absent = func.sum(AttendanceMonth.absent_days)
+    query = _rollup_scope(user, db.session.query(User.id, User.full_name, User.email, present, absent),
+                          first, following, counselor_id).group_by(User.id, User.full_name, User.email)
+    if below is not None:
+        query = query.having(present * 100 < below * (present + absent))
+    query = query.order_by((present * 1.0 / func.nullif(present + absent, 0)).asc(), User.id)
+    if limit:
+        query = query.limit(limit)
+    return [{'id': id, 'full_name': name, 'email': email, 'present_days': p, 'absent_days': a,
+             'percentage': _percentage(p, a)} for id, name, email, p, a in query]
+
+
+def _rollup_request_args():
+    first, following = _rollup_period()
+    counselor_id = request.args.get('counselor_id', type=int)
+    return first, following, counselor_id
+
+
+@app.route('/api/attendance/rollup')
+@login_required
+@role_required('HOD', 'COUNSELOR')
+@replica_router.reads()
+def attendance_rollup():
+    """Attendance for the HOD's institution (by counselor) or a counselor's cohort (by student)"""
+    user = session_user()
+    try:
+        first, following, counselor_id = _rollup_request_args()
+    except ValueError:
+        return jsonify({'error': PERIOD_ERROR}), 400
+
+    present = func.sum(AttendanceMonth.present_days)
+    absent = func.sum(AttendanceMonth.absent_days)
+    total_present, total_absent = _rollup_scope(user, db.session.query(present, absent),
+                                                first, following, counselor_id).one()
+    result = {
+        'period': {'from': _month_label(first), 'to': _month_label(attendancebits.previous_month_key(following))},
+        'present_days': total_present or 0,
+        'absent_days': total_absent or 0,
+        'percentage': _percentage(total_present or 0, total_absent or 0),
+    }
+
+    if user.role == 'HOD' and counselor_id is None:
+        rows = _rollup_scope(user, db.session.query(
+            User.counselor_id, func.count(func.distinct(AttendanceMonth.user_id)), present, absent
+        ), first, following).group_by(User.counselor_id).all()
+        names = dict(db.session.query(User.id, User.full_name).filter(
+            User.id.in_([row[0] for row in rows if row[0] is not None])))
+        result['counselors'] = [
+            {'counselor_id': cid, 'full_name': names.get(cid), 'students': n,
+             'present_days': p, 'absent_days': a, 'percentage': _percentage(p, a)}
+            for cid, n, p, a in rows
+        ]
+    else:
+        result['students'] = _student_rollups(user, first, following, counselor_id)
+    return jsonify(result)
+
+
+@app.route('/api/attendance/rollup/below')
+@login_required
+@role_required('HOD', 'COUNSELOR')
+@replica_router.reads()
+def attendance_below_threshold():
+    """Students under ?threshold= percent attendance (default ATTENDANCE_THRESHOLD), lowest first"""
+    user = session_user()
+    try:
+        first, following, counselor_id = _rollup_request_args()
+        threshold = float(request.args.get('threshold', app.config['ATTENDANCE_THRESHOLD']))
+    except ValueError:
+        return jsonify({'error': 'Invalid period or threshold'}), 400
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    students = _student_rollups(user, first, following, counselor_id, below=threshold, limit=limit)
+    return jsonify({
+        'period': {'from': _month_label(first), 'to': _month_label(attendancebits.previous_month_key(following))},
+        'threshold': threshold,
+        'students': students,
+    })
+
+
+@app.route('/api/attendance/rollup/students/<int:student_id>')
+@login_required
+@replica_router.reads()
+def student_attendance_rollup(student_id):
+    """One student's attendance by month, for the student, their counselor or the HOD"""
+    user = session_user()
+    student = cached_user(student_id)
+    if not student:
+        return jsonify({'error': 'Student not found'}), 404
+    if not (user.id == student.id or user.role == 'HOD'
+            or (user.role == 'COUNSELOR' and student.counselor_id == user.id)):
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        first, following = _rollup_period()
+    except ValueError:
+        return jsonify({'error': PERIOD_ERROR}), 400
+
+    months = AttendanceMonth.query.filter(
+        AttendanceMonth.user_id == student.id, AttendanceMonth.month >= first, AttendanceMonth.month < following
+    ).order_by(AttendanceMonth.month).all()
+    present = sum(m.present_days for m in months)
+    absent = sum(m.absent_days for m in months)
+    return jsonify({
+        'student': {'id': student.id, 'full_name': student.full_name, 'email': student.email},
+        'period': {'from': _month_label(first), 'to': _month_label(attendancebits.previous_month_key(following))},
+        'present_days': present,
+        'absent_days': absent,
+        'percentage': _percentage(present, absent),
+        'months': [{'month': _month_label(m.month), 'present_days': m.present_days, 'absent_days': m.absent_days,
+                    'percentage': _percentage(m.present_days, m.absent_days)} for m in months],
+    })
+
+
+# ======================== FULL-TEXT SEARCH ========================
+
+@app.route('/api/search')
+@login_required
+@replica_router.reads()
+def search_records():
+    """Ranked full-text search over leaves, documents, medical records and achievements"""
+    user = session_user()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+
+    kinds = [k for k in request.args.get('type', '').split(',') if k] or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+
+    # Same scoping as download_report_pdf
+    if user.role == 'HOD':
+        scope = 'all'
+    elif user.role == 'COUNSELOR':
+        scope = 'cohort'
+    else:
+        scope = 'own'
+
+    hits, has_next = fulltext.search(db.session, query, scope, user.id, kinds=kinds, page=page, per_page=per_page)
+
+    return jsonify({
+        'results': [{
+            'kind': h['kind'],
+            'id': h['id'],
+            'user_id': h['user_id'],
+            'owner_name': h['owner_name'],
+            'owner_email': h['owner_email'],
+            'title': h['title'],
+            'body': h['body'],
+            'file_url': h['file_url'],
+            'rank': float(h['rank']),
+            'archived': bool(h['archived']),
+            'created_at': str(h['created_at']) if h['created_at'] else None
+        } for h in hits],
+        'page': page,
+        'per_page': per_page,
+        'has_next': has_next
+    })
+
+
 # ======================== PROFILE ROUTE ========================
 @app.route('/profile')
 @app.route('/profile/<int:user_id>')
@@ -1329,37 +1787,112 @@ def change_password():
         db.session.commit()
         
         return jsonify({'message': 'Password updated successfully'}), 200
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-# 2. GET ACHIEVEMENTS (This was missing! That's why they didn't show up)
+# 2. GET ACHIEVEMENTS (single endpoint; /list kept as an alias for old clients)
+ACHIEVEMENTS_PAGE_SIZE = 20
+
+
+def _encode_cursor(created_at, ach_id):
+    # created_at is nullable; undated achievements sort last and carry null here
+    raw = json.dumps([created_at.isoformat() if created_at else None, ach_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, ach_id = json.loads(raw)
+    return (datetime.fromisoformat(created_at) if created_at is not None else None), int(ach_id)
+
+
+def _before_cursor(created_col, id_col, after):
+    """Rows after a decoded cursor in (created DESC NULLS LAST, id DESC) order"""
+    created_at, row_id = after
+    if created_at is None:
+        return and_(created_col.is_(None), id_col < row_id)
+    return created_col.is_(None) | (tuple_(created_col, id_col) < after)
+
+
+def _achievements_target():
+    """(target_user_id, error_response) for the achievements the caller asked for"""
+    current_user = session_user()
+    if not current_user:
+        return None, (jsonify({'error': 'User session not found'}), 404)
+
+    # Get ID from URL parameter (e.g. ?user_id=5) or default to logged-in user
+    target_user_id = request.args.get('user_id', type=int) or current_user.id
+
+    # Permission Check: HOD, or the student's assigned Counselor
+    if target_user_id != current_user.id:
+        target_user = cached_user(target_user_id)
+        if not target_user:
+            return None, (jsonify({'error': 'User not found'}), 404)
+        is_authorized = (
+            current_user.role == 'HOD' or
+            (current_user.role == 'COUNSELOR' and target_user.counselor_id == current_user.id)
+        )
+        if not is_authorized:
+            return None, (jsonify({'error': 'Unauthorized to view these achievements'}), 403)
+    return target_user_id, None
+
+
+def _achievements_version():
+    target_user_id, error = _achievements_target()
+    if error:
+        return None
+    return table_version(Achievement, Achievement.user_id == target_user_id)
+
+
 @app.route('/api/achievements', methods=['GET'])
+@app.route('/api/achievements/list', methods=['GET'])
 @login_required
+@conditional_get(_achievements_version)
 def get_achievements():
-    """Fetch achievements list"""
-    try:
-        # Get ID from URL parameter (e.g. ?user_id=5) or default to logged-in user
-        user_id = request.args.get('user_id', type=int, default=session.get('user_id'))
-        
-        achievements = Achievement.query.filter_by(user_id=user_id).order_by(Achievement.created_at.desc()).all()
-        
-        return jsonify({
-            'achievements': [{
-                'id': ach.id,
-                'title': ach.title,
-                'description': ach.description,
-                'file_url': ach.file_url,
-                'created_at': ach.created_at.isoformat() if ach.created_at else ''
-            } for ach in achievements]
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Fetch one page of a user's achievements, newest first"""
+    target_user_id, error = _achievements_target()
+    if error:
+        return error
+
+    cursor = request.args.get('cursor', '')
+    limit = min(max(request.args.get('limit', ACHIEVEMENTS_PAGE_SIZE, type=int), 1), 100)
+
+    query = db.session.query(
+        Achievement.id, Achievement.title, Achievement.description,
+        Achievement.file_url, Achievement.created_at
+    ).filter(Achievement.user_id == target_user_id)
+
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(_before_cursor(Achievement.created_at, Achievement.id, after))
+
+    # Newest first, then the undated ones (NULLs sort differently per database, so explicitly)
+    rows = query.order_by(Achievement.created_at.desc().nulls_last(), Achievement.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        'achievements': [{
+            'id': a.id,
+            'title': a.title,
+            'description': a.description,
+            'file_url': a.file_url,
+            'created_at': a.created_at.isoformat() if a.created_at else ''
+        } for a in rows],
+        'next_cursor': _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    })
 
 
 # 3. UPLOAD ACHIEVEMENT
 @app.route('/api/achievements/upload', methods=['POST'])
 @login_required
+@admission.heavy()
 def upload_achievement():
     """Upload a new achievement with PDF"""
     try:
@@ -1413,7 +1946,7 @@ def delete_achievement(id):
             return jsonify({'error': 'Not found'}), 404
             
         # Security: Allow if it's your own achievement OR you are HOD
-        current_user = User.query.get(session.get('user_id'))
+        current_user = session_user()
         if ach.user_id != current_user.id and current_user.role != 'HOD':
             return jsonify({'error': 'Unauthorized'}), 403
 
@@ -1444,197 +1977,352 @@ def uploaded_achievement_file(filename):
 
 # ======================== STUDENTS LIST ROUTE ========================
 
+STUDENTS_PER_PAGE = 24
+TYPEAHEAD_LIMIT = 10
+
+
+def _prefix_match(expr, search):
+    """Case-insensitive prefix filter on a lower(...) indexed expression"""
+    prefix = search.strip().lower()
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    clause = func.lower(expr).like(escaped + '%', escape='\\')
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite skips its LIKE index optimization for patterns starting with a
+        # digit (enrollment numbers), so bound the index range explicitly
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        clause = and_(func.lower(expr) >= prefix, func.lower(expr) < upper, clause)
+    return clause
+
+
+def _student_scope(current_user):
+    """Filter for the students current_user may see"""
+    if current_user.role == 'HOD':
+        return User.role == 'STUDENT'
+    return and_(User.role == 'STUDENT', User.counselor_id == current_user.id)
+
+
+def student_directory_query(current_user, search=None):
+    """Students visible to current_user, optionally filtered by name/email prefix"""
+    scope = _student_scope(current_user)
+    if not (search and search.strip()):
+        return User.query.filter(scope)
+
+    # UNION rather than OR so each side range-scans its own prefix index;
+    # the outer query then only fetches the matching rows by primary key
+    name_match = db.session.query(User.id).filter(scope, _prefix_match(User.full_name, search))
+    email_match = db.session.query(User.id).filter(scope, _prefix_match(User.email, search))
+    return User.query.filter(User.id.in_(name_match.union(email_match)))
+
+
 @app.route('/students')
 @login_required
+@replica_router.reads()
 def students_list():
     # 1. Fetch current user manually
     current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
+    current_user = cached_user(current_user_id)
 
     if not current_user:
         return redirect(url_for('login'))
 
-    # 2. Logic to get list of students (Case Insensitive)
-    user_role = current_user.role.upper() # Converts 'Counselor' -> 'COUNSELOR'
-
-    if user_role == 'HOD':
-        students = User.query.filter(User.role.ilike('Student')).all()
-    elif user_role == 'COUNSELOR':
-        students = User.query.filter_by(counselor_id=current_user.id).all()
-    else:
+    if current_user.role not in ['HOD', 'COUNSELOR']:
         return redirect(url_for('dashboard'))
-    
-    # 3. PASS 'user=current_user' so the sidebar works!
-    return render_template('students.html', students=students, user=current_user)
 
+    # 2. One page of the directory, filtered by name/email prefix
+    search = request.args.get('q', '').strip()
+    pagination = student_directory_query(current_user, search).order_by(
+        func.lower(User.full_name), User.id
+    ).paginate(page=request.args.get('page', 1, type=int), per_page=STUDENTS_PER_PAGE, error_out=False)
+
+    # 3. PASS 'user=current_user' so the sidebar works!
+    return render_template('students.html', students=pagination.items, pagination=pagination,
+                           search=search, user=current_user)
 
 
-# ======================== UPDATED API: FETCH ACHIEVEMENTS ========================
-@app.route('/api/achievements/list')
+@app.route('/api/students/search')
 @login_required
-def get_achievements_list():
-    # --- FIX START: Get the current user BEFORE doing anything else ---
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
+@replica_router.reads()
+def search_students():
+    """Typeahead: students whose name or email starts with ?q="""
+    current_user = session_user()
+    if not current_user or current_user.role not in ['HOD', 'COUNSELOR']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    search = request.args.get('q', '').strip()
+    if not search:
+        return jsonify({'students': []})
+    limit = max(1, min(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), 50))
+
+    # Name matches first, then email matches; each walks its index in order and
+    # stops after `limit` rows, so cost does not grow with the number of matches
+    scope = _student_scope(current_user)
+    columns = (User.id, User.full_name, User.email)
+    rows = db.session.query(*columns).filter(
+        scope, _prefix_match(User.full_name, search)
+    ).order_by(func.lower(User.full_name)).limit(limit).all()
+
+    if len(rows) < limit:
+        seen = {r.id for r in rows}
+        by_email = db.session.query(*columns).filter(
+            scope, _prefix_match(User.email, search)
+        ).order_by(func.lower(User.email)).limit(limit).all()
+        rows += [r for r in by_email if r.id not in seen][:limit - len(rows)]
 
-    if not current_user:
-        return jsonify({'error': 'User session not found'}), 404
-    # --- FIX END ----------------------------------------------------
+    return jsonify({
+        'students': [{
+            'id': r.id,
+            'full_name': r.full_name,
+            'email': r.email,
+            'profile_url': url_for('profile', user_id=r.id)
+        } for r in rows]
+    })
 
-    # 1. Check if we are looking for a specific student's achievements
-    target_user_id = request.args.get('user_id', type=int)
-    
-    # If no ID provided, default to the logged-in user
-    if not target_user_id:
-        target_user_id = current_user.id
 
-    # 2. Permission Check: Are we allowed to view this person?
-    if target_user_id != current_user.id:
-        target_user = User.query.get(target_user_id)
-        if not target_user:
-            return jsonify({'error': 'User not found'}), 404
-            
-        # Allow HOD (any case) or Assigned Counselor (any case)
-        is_authorized = (
-            current_user.role in ['HOD', 'Hod', 'hod'] or 
-            (current_user.role in ['Counselor', 'COUNSELOR', 'counselor'] and target_user.counselor_id == current_user.id)
-        )
-        
-        if not is_authorized:
-            return jsonify({'error': 'Unauthorized to view these achievements'}), 403
-            
-        user_id_to_fetch = target_user_id
+
+# ======================== UPDATED PDF REPORT ROUTE ========================
+TABLE_REPORT_SCOPES = {'leaves': LEAVE_REPORT_SCOPES, 'attendance': ATTENDANCE_REPORT_SCOPES}
+
+
+def _table_report_key(report_type, user, period=None):
+    """Store key of the HOD's or a counselor's report; students' own reports are not precomputed"""
+    if user.role == 'HOD':
+        scope = 'all'
+    elif user.role == 'COUNSELOR':
+        scope = f'counselor-{user.id}'
     else:
-        user_id_to_fetch = current_user.id
+        return None
+    key = f'{report_type}-{scope}'
+    return f'{key}-{period[0]}-{period[1]}' if period else key
 
-    # 3. Fetch the achievements
-    achievements = Achievement.query.filter_by(user_id=user_id_to_fetch).order_by(Achievement.created_at.desc()).all()
-    
-    return jsonify({
-        'achievements': [{
-            'id': a.id,
-            'title': a.title,
-            'description': a.description,
-            'file_url': a.file_url,
-            'created_at': a.created_at.isoformat()
-        } for a in achievements]
-    })
 
-# ======================== UPDATED REPORT GENERATION ========================
-import requests
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import Image as ReportLabImage
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
-from io import BytesIO
-from datetime import datetime
-from flask import send_file, session, jsonify
+def _render_table_report(report_type, user, period=None):
+    """Landscape leave list or monthly attendance summary in the user's scope"""
+    import reporting
+
+    # 1. Fetch Data
+    if report_type == 'leaves':
+        if user.role == 'HOD':
+            data = Leave.query.join(Leave.requester).options(contains_eager(Leave.requester)).order_by(Leave.created_at.desc()).limit(reporting.MAX_REPORT_ROWS + 1).yield_per(REPORT_FETCH_ROWS)
+        elif user.role == 'COUNSELOR':
+            data = Leave.query.join(Leave.requester).options(contains_eager(Leave.requester)).filter(Leave.user_id.in_(cohort_ids(user.id))).order_by(Leave.created_at.desc()).limit(reporting.MAX_REPORT_ROWS + 1).yield_per(REPORT_FETCH_ROWS)
+        else:
+            data = Leave.query.options(joinedload(Leave.requester)).filter_by(user_id=user.id).order_by(Leave.created_at.desc()).limit(reporting.MAX_REPORT_ROWS + 1).yield_per(REPORT_FETCH_ROWS)
+            
+        # --- COLUMNS: Added Name & Email ---
+        table_headers = ['Student Name', 'Email', 'Type', 'Start Date', 'End Date', 'Days', 'Status']
+        
+        # Generator: rows are formatted as the PDF consumes them
+        table_data = ([
+            leave.requester.full_name or "N/A",  # Name from relationship
+            leave.requester.email or "N/A",      # Email from relationship
+            leave.leave_type,
+            leave.start_date.strftime('%Y-%m-%d'),
+            leave.end_date.strftime('%Y-%m-%d'),
+            str(leave.number_of_days),
+            leave.status
+        ] for leave in data)
+    else:
+        # Monthly summary per student, from the attendance bitmaps
+        first, following = period
+        rows = _rollup_scope(user, db.session.query(
+            User.full_name, User.email, AttendanceMonth.month, AttendanceMonth.present_days, AttendanceMonth.absent_days
+        ), first, following).order_by(User.full_name, User.id, AttendanceMonth.month).limit(reporting.MAX_REPORT_ROWS + 1).yield_per(REPORT_FETCH_ROWS)
+        table_headers = ['Student Name', 'Email', 'Month', 'Present', 'Absent', 'Days', 'Attendance']
+        table_data = ([
+            name or "N/A",
+            email or "N/A",
+            _month_label(month),
+            str(present),
+            str(absent),
+            str(present + absent),
+            f'{_percentage(present, absent)}%' if present + absent else '-'
+        ] for name, email, month, present, absent in rows)
+
+    # 2. Render PDF (Landscape)
+    return reporting.build_table_report(report_type, table_headers, table_data)
+
 
-# ======================== UPDATED PDF REPORT ROUTE ========================
 @app.route('/api/reports/download/<report_type>/pdf')
 @login_required
+@admission.heavy()
+@query_audit.budget(5)
+@replica_router.reads()
 def download_report_pdf(report_type):
     """Generate PDF Report with Header like Base.html and Detailed Columns"""
     try:
-        user_id = session.get('user_id')
-        user = User.query.get(user_id)
-        
-        # 1. Fetch Data
-        if report_type == 'leaves':
-            if user.role == 'HOD':
-                data = Leave.query.join(User).order_by(Leave.created_at.desc()).all()
-            elif user.role == 'COUNSELOR':
-                data = Leave.query.join(User).filter(User.counselor_id == user.id).order_by(Leave.created_at.desc()).all()
-            else:
-                data = Leave.query.filter_by(user_id=user.id).order_by(Leave.created_at.desc()).all()
-                
-            # --- COLUMNS: Added Name & Email ---
-            table_headers = ['Student Name', 'Email', 'Type', 'Start Date', 'End Date', 'Days', 'Status']
-            
-            table_data = []
-            for leave in data:
-                table_data.append([
-                    leave.requester.full_name or "N/A",  # Name from relationship
-                    leave.requester.email or "N/A",      # Email from relationship
-                    leave.leave_type,
-                    leave.start_date.strftime('%Y-%m-%d'),
-                    leave.end_date.strftime('%Y-%m-%d'),
-                    str(leave.number_of_days),
-                    leave.status
-                ])
-        else:
+        if report_type not in TABLE_REPORT_SCOPES:
             return jsonify({'error': 'Invalid report type'}), 400
 
-        # 2. Setup PDF (Landscape)
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), topMargin=1.5*inch)
-        elements = []
-
-        # 3. Header Function (Draws Logos & Text)
-        def draw_header(canvas, doc):
-            canvas.saveState()
-            width, height = doc.pagesize
-            logo_width = 1.2 * inch
-            logo_height = 1.0 * inch
-            margin = 30
-            
-            # Left Logo (MBIT)
-            try:
-                mbit_url = "https://www.mbit.edu.in/wp-content/uploads/2021/12/webMBIT-1@2x.png"
-                img_data = requests.get(mbit_url).content
-                img = ReportLabImage(BytesIO(img_data), width=logo_width, height=logo_height)
-                img.drawOn(canvas, margin, height - logo_height - margin)
-            except: pass
-
-            # Center Text
-            text_y = height - margin - 30
-            canvas.setFont("Helvetica-Bold", 16)
-            canvas.drawCentredString(width / 2, text_y, "Madhuben & Bhanubhai Patel Institute of Technology")
-            canvas.setFont("Helvetica", 12)
-            canvas.drawCentredString(width / 2, text_y - 20, "(The Charutar Vidya Mandal (CVM) University)")
-            canvas.setFont("Helvetica-Bold", 14)
-            canvas.drawCentredString(width / 2, text_y - 45, f"{report_type.upper()} REPORT")
-
-            # Right Logo (CVM)
+        user_id = session.get('user_id')
+        user = cached_user(user_id)
+        period = None
+        if report_type == 'attendance':
             try:
-                cvm_url = "https://www.mbit.edu.in/wp-content/uploads/2020/02/CVM-CVMU.jpg"
-                img_data = requests.get(cvm_url).content
-                img = ReportLabImage(BytesIO(img_data), width=logo_width, height=logo_height)
-                img.drawOn(canvas, width - logo_width - margin, height - logo_height - margin)
-            except: pass
-
-            # Line
-            canvas.setStrokeColor(colors.black)
-            canvas.line(margin, height - logo_height - margin - 10, width - margin, height - logo_height - margin - 10)
-            canvas.restoreState()
-
-        # 4. Build Table
-        final_data = [table_headers] + table_data
-        # Adjusted column widths for landscape
-        col_widths = [2*inch, 2.5*inch, 1.2*inch, 1.2*inch, 1.2*inch, 0.8*inch, 1*inch]
-        
-        table = Table(final_data, colWidths=col_widths)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 1), (1, -1), 'LEFT'), # Left align Name/Email
-        ]))
-        
-        elements.append(table)
-        doc.build(elements, onFirstPage=draw_header, onLaterPages=draw_header)
-        
-        buffer.seek(0)
+                period = _rollup_period()
+            except ValueError:
+                return jsonify({'error': PERIOD_ERROR}), 400
+
+        key = _table_report_key(report_type, user, period)
+        path = _precomputed(key, TABLE_REPORT_SCOPES[report_type])[0] if key else None
+        buffer = path or _render_table_report(report_type, user, period)
         return send_file(buffer, as_attachment=True, download_name=f"{report_type}_report.pdf", mimetype='application/pdf')
 
+    except (OperationalError, InterfaceError):
+        raise  # replica_router.reads() retries these on the primary
     except Exception as e:
         print(f"PDF Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ======================== STUDENT DOSSIERS ========================
+# One PDF per student for a term, rendered on a process pool and streamed as
+# a ZIP while it is built (see dossier.py). Progress lives in dossier_jobs so
+# any worker can answer the progress poll.
+
+class DossierJob(db.Model):
+    """Progress of one bulk dossier download"""
+    __tablename__ = 'dossier_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    counselor_id = db.Column(db.Integer)  # None: whole institution
+    first_month = db.Column(db.Integer, nullable=False)  # yyyymm
+    following_month = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
+def _dossier_students(counselor_id=None):
+    """Student ids in a counselor's cohort, or every student"""
+    query = db.session.query(User.id).filter(User.role == 'STUDENT')
+    if counselor_id is not None:
+        query = query.filter(User.counselor_id == counselor_id)
+    return [id for id, in query.order_by(User.id)]
+
+
+@app.route('/api/dossiers')
+@login_required
+@role_required('HOD', 'COUNSELOR')
+@admission.heavy(cost=3)  # a whole cohort
+def download_dossiers():
+    """ZIP of term dossiers for the counselor's cohort, or any cohort (?counselor_id=) or everyone for the HOD"""
+    import dossier
+
+    user = session_user()
+    try:
+        first, following, counselor_id = _rollup_request_args()
+    except ValueError:
+        return jsonify({'error': PERIOD_ERROR}), 400
+    if user.role == 'COUNSELOR':
+        counselor_id = user.id
+
+    student_ids = _dossier_students(counselor_id)
+    if not student_ids:
+        return jsonify({'error': 'No students in scope'}), 404
+    job = DossierJob(requested_by=user.id, counselor_id=counselor_id, first_month=first,
+                     following_month=following, total=len(student_ids))
+    db.session.add(job)
+    db.session.commit()
+    job_id, total = job.id, job.total
+
+    primary = db.engine
+    jobs = DossierJob.__table__
+
+    def progress(done, failed):
+        finished_at = datetime.utcnow() if done + failed == total else None
+        with primary.begin() as conn:
+            conn.execute(jobs.update().where(jobs.c.id == job_id).values(
+                done=done, failed=failed, finished_at=finished_at))
+
+    # Loading is read-only, so it may run on the replica; progress goes to the primary
+    body = dossier.stream(replica_router.engine_for_reads() or primary, db.metadata, student_ids, first, following,
+                          app.config['DOSSIER_WORKERS'], progress=progress, log=app.logger.warning)
+    name = f"dossiers_{'all' if counselor_id is None else counselor_id}_{_month_label(first)}.zip"
+    response = app.response_class(stream_with_context(body), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename={name}'
+    response.headers['X-Dossier-Job'] = str(job_id)
+    response.headers['X-Dossier-Total'] = str(total)
+    return response
+
+
+@app.route('/api/dossiers/<int:job_id>')
+@login_required
+def dossier_progress(job_id):
+    """Progress of a dossier download started by this user"""
+    job = DossierJob.query.filter_by(id=job_id, requested_by=session.get('user_id')).first()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'id': job.id,
+        'total': job.total,
+        'done': job.done,
+        'failed': job.failed,
+        'percentage': round((job.done + job.failed) * 100 / job.total, 1) if job.total else 100.0,
+        'finished': job.finished_at is not None,
+    })
+
+# ======================== INTERNAL STATS ========================
+
+@app.route('/api/internal/etag-stats')
+@login_required
+@role_required('HOD')
+def get_etag_stats():
+    """Conditional GET hit ratios per endpoint since this worker started"""
+    return jsonify({'endpoints': etag_stats()})
+
+
+@app.route('/api/internal/user-cache')
+@login_required
+@role_required('HOD')
+def get_user_cache_stats():
+    """User cache hit ratios and memory footprint on this worker"""
+    return jsonify(user_cache.stats())
+
+
+def _etag_collector():
+    stats = etag_stats()
+    samples = [({'endpoint': endpoint, 'result': result}, s[key])
+               for endpoint, s in sorted(stats.items())
+               for result, key in (('hit', 'hits'), ('miss', 'misses'))]
+    yield 'etag_requests_total', 'counter', 'Conditional GETs answered 304 (hit) or in full (miss).', samples
+
+
+def _can_profile():
+    user = session_user()
+    return bool(user and user.role == 'HOD')
+
+
+@app.route('/api/internal/profiles')
+@login_required
+@role_required('HOD')
+def list_profiles():
+    """Saved request profiles on this worker, newest first"""
+    return jsonify({'profiles': [
+        {'name': name, 'url': url_for('download_profile', name=name)}
+        for name in request_profiler.list_profiles()
+    ]})
+
+
+@app.route('/api/internal/profiles/<name>')
+@login_required
+@role_required('HOD')
+def download_profile(name):
+    """Speedscope file for one profiled request (open at speedscope.app)"""
+    return send_from_directory(request_profiler.directory, name, as_attachment=True)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape target for this worker; off unless METRICS_TOKEN is set"""
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        # Behind a same-host proxy every request looks local, so there is no tokenless mode
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Forbidden'}), 403
+    return app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # ======================== ERROR HANDLERS ========================
 
 @app.errorhandler(404)
@@ -1652,7 +2340,7 @@ def internal_error(error):
 def assign_counselor_to_student():
     # ... (auth checks) ...
     user_id = session.get('user_id')
-    curr_user = User.query.get(user_id)
+    curr_user = cached_user(user_id)
     if curr_user.role != 'HOD': return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
@@ -1667,14 +2355,399 @@ def assign_counselor_to_student():
 
     return jsonify({'message': f'Assigned {student.email} to {counselor.email}'})
 
+# ======================== APPLICATION FACTORY ========================
+
+def _configure(config=None):
+    app.secret_key = os.environ.get('SECRET_KEY', 'workzen-secret-key-2025')
+
+    # PostgreSQL Configuration (DATABASE_URL overrides, e.g. sqlite:///workzen.db for local runs)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or (
+        f"postgresql://{os.environ.get('DB_USER', 'postgres')}:"
+        f"{os.environ.get('DB_PASSWORD', '8511')}@"
+        f"{os.environ.get('DB_HOST', 'localhost')}:"
+        f"{os.environ.get('DB_PORT', 5432)}/"
+        f"{os.environ.get('DB_NAME', 'workzen_db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Caches on disk are kept per database, so two databases on one host never share entries
+    app.config['DATABASE_NAMESPACE'] = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    if os.environ.get('REPLICA_DATABASE_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {'replica': os.environ['REPLICA_DATABASE_URL']}
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))
+    app.config['REPLICA_CHECK_SECONDS'] = float(os.environ.get('REPLICA_CHECK_SECONDS', 5))
+    app.config['JINJA_CACHE_DIR'] = (os.environ.get('JINJA_CACHE_DIR')
+                                     or os.path.join(app.instance_path, 'jinja_cache'))
+    # /metrics is off (404) until a token is set
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['QUERY_AUDIT'] = os.environ.get('QUERY_AUDIT', '').lower() in ('1', 'true', 'yes')
+    app.config['QUERY_AUDIT_REPEAT'] = int(os.environ.get('QUERY_AUDIT_REPEAT', 5))
+    app.config['QUERY_AUDIT_SLOW_MS'] = float(os.environ.get('QUERY_AUDIT_SLOW_MS', 100))
+    app.config['QUERY_AUDIT_STRICT'] = os.environ.get('QUERY_AUDIT_STRICT', '').lower() in ('1', 'true', 'yes')
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+    app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    app.config['LEAVE_FEED_POLL_SECONDS'] = float(os.environ.get('LEAVE_FEED_POLL_SECONDS', 1))
+    app.config['LEAVE_FEED_STREAM_SECONDS'] = float(os.environ.get('LEAVE_FEED_STREAM_SECONDS', 300))
+    app.config['LEAVE_FEED_GAP_SECONDS'] = float(os.environ.get('LEAVE_FEED_GAP_SECONDS', 10))
+    app.config['ACADEMIC_YEAR_START_MONTH'] = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', 6))
+    app.config['ATTENDANCE_THRESHOLD'] = float(os.environ.get('ATTENDANCE_THRESHOLD', 75))
+    app.config['DOSSIER_WORKERS'] = int(os.environ.get('DOSSIER_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['REPORT_CACHE_DIR'] = os.environ.get('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'reports')
+    app.config['PRECOMPUTE_REPORTS'] = [name.strip() for name in os.environ.get(
+        'PRECOMPUTE_REPORTS', 'leaves,counselor_leaves,attendance').split(',') if name.strip()]
+    app.config['ADMISSION_CONTROL'] = os.environ.get('ADMISSION_CONTROL', '1').lower() not in ('0', 'false', 'no')
+    app.config['ADMISSION_DIR'] = os.environ.get('ADMISSION_DIR') or os.path.join(app.instance_path, 'admission')
+    app.config['ADMISSION_MAX_CONCURRENT'] = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 2))
+    app.config['ADMISSION_RATE_PER_MINUTE'] = float(os.environ.get('ADMISSION_RATE_PER_MINUTE', 6))
+    app.config['ADMISSION_BURST'] = float(os.environ.get('ADMISSION_BURST', 3))
+    app.config['WEEKEND_DAYS'] = workcalendar.parse_weekend(os.environ.get('WEEKEND_DAYS', 'Sun'))
+    app.config['LEAVE_POLICY'] = balances.parse_policy(os.environ.get('LEAVE_POLICY', ''))
+    app.config['USER_CACHE'] = os.environ.get('USER_CACHE', '1').lower() not in ('0', 'false', 'no')
+    app.config['USER_CACHE_TTL_SECONDS'] = float(os.environ.get('USER_CACHE_TTL_SECONDS', 300))
+    app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 5000))
+    app.config['USER_CACHE_SYNC_SECONDS'] = float(os.environ.get('USER_CACHE_SYNC_SECONDS', 1))
+    # Shared L2 for every worker on the host; USER_CACHE_SHARED=0 keeps each worker's cache to itself
+    if os.environ.get('USER_CACHE_SHARED', '1').lower() not in ('0', 'false', 'no'):
+        app.config['USER_CACHE_DIR'] = os.environ.get('USER_CACHE_DIR') or os.path.join(app.instance_path, 'user_cache')
+    app.config.update(config or {})
+
+    # Compiled templates survive worker restarts (set before jinja_env is first built)
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR']))
+
+
+def _warm_up():
+    """Load everything a worker would otherwise build on its first requests"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    import reporting
+    reporting.warm_up()
+
+
+def _dispose_engines(close=True):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def _after_fork_in_child():
+    # Pooled connections and hashing threads belong to the parent; close=False
+    # leaves the parent's sockets alone and just forgets them here
+    _dispose_engines(close=False)
+    password_hasher.after_fork()
+    leave_feed.after_fork()
+    user_cache.after_fork()
+
+
+def create_app(config=None, preload=False):
+    """Configure and return the application.
+
+    Routes are registered on the module-level ``app`` at import, so this sets
+    that instance up once and later calls return it unchanged. ``preload``
+    compiles every template and loads the report styles and logos up front;
+    wsgi.py uses it so a pre-forking server (``gunicorn --preload``) shares
+    them copy-on-write instead of each worker rebuilding them.
+    """
+    if 'sqlalchemy' in app.extensions:
+        return app
+
+    _configure(config)
+    db.init_app(app)
+    request_metrics.init_app(app)
+    request_metrics.add_collector(_etag_collector)
+    replica_router.init_app(app)
+    request_metrics.add_collector(replica_router.metrics)
+    if app.config['QUERY_AUDIT']:
+        query_audit.init_app(app)
+    request_profiler.init_app(app, is_allowed=_can_profile)
+    leave_feed.init_app(app, load=_load_leave_events, head=_leave_events_head, prune=_prune_leave_events)
+    report_store.init_app(app)
+    admission.init_app(app)
+    request_metrics.add_collector(admission.metrics)
+    user_cache.init_app(app)
+    request_metrics.add_collector(user_cache.metrics)
+    work_calendar.init_app(app, holidays=_holiday_dates, version=_calendar_version)
+    if preload:
+        _warm_up()
+
+    # Whatever the master opened must not be shared by forked workers
+    _dispose_engines()
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+    return app
+
 # ======================== DATABASE INITIALIZATION ========================
 
 def init_db():
     """Create all database tables"""
+    create_app()
     with app.app_context():
         db.create_all()
+        # create_all skips indexes on tables that already exist
+        with db.engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+        fulltext.install(db.engine)
+        with db.engine.begin() as conn:
+            precompute.install(conn, db.metadata)
+        # Roles are compared and indexed in canonical upper case
+        normalized = db.session.execute(text("UPDATE users SET role = UPPER(TRIM(role)) WHERE role <> UPPER(TRIM(role))"))
+        db.session.commit()
+        if normalized.rowcount:
+            # Written below the ORM, so neither the cache nor the report versions saw it
+            user_cache.clear()
+            with db.engine.begin() as conn:
+                precompute.bump(conn, db.metadata, ['users'])
         print("✅ Database tables created successfully")
 
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables, indexes and search structures."""
+    init_db()
+
+
+@app.cli.command('seed')
+@click.option('--students', default=10000, show_default=True)
+@click.option('--leaves-per-student', default=20, show_default=True)
+@click.option('--attendance-days', default=200, show_default=True, help='Working days of attendance per student')
+@click.option('--documents-ratio', default=0.3, show_default=True, help='Share of leaves with a supporting document')
+@click.option('--until', default='2026-06-30', show_default=True, help='Last generated day (YYYY-MM-DD or "today")')
+@click.option('--seed', 'seed_value', default=42, show_default=True)
+@click.option('--password', default='workzen123', show_default=True, help='Password for every generated account')
+def seed_command(students, leaves_per_student, attendance_days, documents_ratio, until, seed_value, password):
+    """Fill an empty database with deterministic production-scale data."""
+    import seed
+
+    init_db()
+    last_day = datetime.now().date() if until == 'today' else datetime.strptime(until, '%Y-%m-%d').date()
+    with app.app_context():
+        seed.generate(db.engine, password_hasher.hash(password), students=students,
+                      leaves_per_student=leaves_per_student, attendance_days=attendance_days,
+                      documents_ratio=documents_ratio, until=last_day, seed=seed_value, log=click.echo)
+        # The generator loads attendance below the ORM, so the monthly bitmaps are built in one pass
+        with db.engine.begin() as conn:
+            click.echo(f'{"attendance_months":16s} {attendancebits.rebuild(conn, db.metadata):>10,} rows')
+            precompute.bump(conn, db.metadata, precompute.SCOPES)
+        # New accounts and cohorts were written below the ORM as well
+        user_cache.clear()
+
+
+@app.cli.command('leave-balances')
+@click.option('--year', type=int, help='Year to provision (default: the current year)')
+def leave_balances_command(year):
+    """Provision every user's leave balances for a year, carrying unused days forward."""
+    init_db()
+    year = year or datetime.now().year
+    with app.app_context(), db.engine.begin() as conn:
+        created = balances.provision(conn, db.metadata, year, app.config['LEAVE_POLICY'], datetime.utcnow())
+    click.echo(f'{created:,} leave balances provisioned for {year}')
+
+
+@app.cli.group('holidays')
+def holidays_group():
+    """Institute holidays, which leave durations do not count."""
+
+
+def _recount_leave_days(since=None):
+    """Re-store working days of leaves ending on or after since; bumps the leave reports when any changed"""
+    work_calendar.reset()
+    with db.engine.begin() as conn:
+        changed = workcalendar.recount(conn, db.metadata, work_calendar, since)
+        if changed:
+            precompute.bump(conn, db.metadata, ['leaves'])
+    click.echo(f'{changed:,} leaves recounted')
+
+
+@holidays_group.command('import')
+@click.argument('csv_file', type=click.File('r'))
+def holidays_import_command(csv_file):
+    """Add or rename holidays from a CSV of date (YYYY-MM-DD) and name."""
+    import csv
+
+    init_db()
+    days = []
+    with app.app_context():
+        for row in csv.reader(csv_file):
+            if not row or not row[0].strip():
+                continue
+            try:
+                day = datetime.strptime(row[0].strip(), '%Y-%m-%d').date()
+            except ValueError:
+                if days:
+                    raise click.BadParameter(f'Not a date: {row[0]!r}')
+                continue  # header
+            db.session.merge(Holiday(day=day, name=(row[1] if len(row) > 1 else '').strip() or 'Holiday'))
+            days.append(day)
+        db.session.commit()
+        click.echo(f'{len(days)} holidays imported')
+        if days:
+            _recount_leave_days(min(days))
+
+
+@holidays_group.command('remove')
+@click.argument('days', nargs=-1, required=True)
+def holidays_remove_command(days):
+    """Make the given dates (YYYY-MM-DD) working days again."""
+    init_db()
+    try:
+        days = [datetime.strptime(day, '%Y-%m-%d').date() for day in days]
+    except ValueError:
+        raise click.BadParameter('Use dates as YYYY-MM-DD')
+    with app.app_context():
+        removed = 0
+        for holiday in Holiday.query.filter(Holiday.day.in_(days)):
+            db.session.delete(holiday)
+            removed += 1
+        db.session.commit()
+        click.echo(f'{removed} holidays removed')
+        if removed:
+            _recount_leave_days(min(days))
+
+
+@holidays_group.command('list')
+@click.option('--year', type=int, help='Calendar year (default: every holiday)')
+def holidays_list_command(year):
+    """Print the holidays."""
+    init_db()
+    with app.app_context():
+        query = Holiday.query.order_by(Holiday.day)
+        if year:
+            query = query.filter(Holiday.day >= datetime(year, 1, 1).date(), Holiday.day < datetime(year + 1, 1, 1).date())
+        for holiday in query:
+            click.echo(f'{holiday.day:%Y-%m-%d}  {holiday.day:%a}  {holiday.name}')
+
+
+@holidays_group.command('recount')
+def holidays_recount_command():
+    """Store working days in every live leave, e.g. after changing WEEKEND_DAYS."""
+    init_db()
+    with app.app_context():
+        _recount_leave_days()
+
+
+@app.cli.command('attendance-months')
+def attendance_months_command():
+    """Rebuild the monthly attendance bitmaps from the per-day tables."""
+    init_db()
+    with app.app_context(), db.engine.begin() as conn:
+        click.echo(f'{attendancebits.rebuild(conn, db.metadata):,} student-months rebuilt')
+
+
+@app.cli.command('archive')
+@click.option('--keep-years', default=2, show_default=True,
+              help='Academic years, counting the current one, left in the live tables')
+@click.option('--dry-run', is_flag=True, help='Only count what would move')
+def archive_command(keep_years, dry_run):
+    """Move leaves and attendance of closed academic years to the archive tables."""
+    import archive
+
+    init_db()
+    cutoff = archive.cutoff_date(datetime.now().date(), max(1, keep_years), app.config['ACADEMIC_YEAR_START_MONTH'])
+    click.echo(f'Archiving decided leaves that ended and attendance taken before {cutoff}')
+    with app.app_context():
+        moved = archive.run(db.engine, db.metadata, cutoff, dry_run=dry_run, log=click.echo)
+        if not dry_run:
+            with db.engine.begin() as conn:
+                precompute.bump(conn, db.metadata, ['leaves', 'attendance'])
+    for table, rows in moved.items():
+        click.echo(f"{table:16s} {rows:>10,} rows {'to move' if dry_run else 'moved'}")
+
+
+@app.cli.command('dossiers')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='ZIP file to write')
+@click.option('--counselor-id', type=int, help="Only this counselor's students (default: every student)")
+@click.option('--from', 'first_month', help='First month, YYYY-MM (default: current term)')
+@click.option('--to', 'last_month', help='Last month, YYYY-MM (default: current term)')
+@click.option('--workers', type=int, help='Rendering processes (default: DOSSIER_WORKERS)')
+def dossiers_command(output, counselor_id, first_month, last_month, workers):
+    """Render a PDF dossier per student into one ZIP."""
+    import dossier
+
+    init_db()
+    try:
+        first, following = _month_period(first_month, last_month)
+    except ValueError:
+        raise click.BadParameter(f'Use --from/--to as YYYY-MM, --from no later than --to and at most {MAX_PERIOD_MONTHS} months')
+    with app.app_context():
+        student_ids = _dossier_students(counselor_id)
+        click.echo(f'{len(student_ids):,} students, {dossier.period_label(first, following)}')
+        with click.progressbar(length=len(student_ids), label='Rendering dossiers') as bar, open(output, 'wb') as out:
+            def progress(done, failed):
+                bar.update(done + failed - bar.pos)
+
+            for chunk in dossier.stream(db.engine, db.metadata, student_ids, first, following,
+                                        workers or app.config['DOSSIER_WORKERS'], progress=progress, log=click.echo):
+                out.write(chunk)
+    click.echo(f'Wrote {output}')
+
+
+def _precompute_jobs():
+    """(store key, data scopes, render) for every report named in PRECOMPUTE_REPORTS"""
+    names = app.config['PRECOMPUTE_REPORTS']
+    hod = User.query.filter_by(role='HOD').order_by(User.id).first()
+    counselors = User.query.filter_by(role='COUNSELOR').order_by(User.id).all()
+    owners = ([hod] if hod else []) + counselors
+    term = _month_period()
+    if 'leaves' in names:
+        yield 'leave-report', LEAVE_REPORT_SCOPES, lambda: _render_leave_report(None)
+    if 'counselor_leaves' in names:
+        for owner in owners:
+            yield (_table_report_key('leaves', owner), LEAVE_REPORT_SCOPES,
+                   lambda owner=owner: _render_table_report('leaves', owner))
+    if 'attendance' in names:
+        for owner in owners:
+            yield (_table_report_key('attendance', owner, term), ATTENDANCE_REPORT_SCOPES,
+                   lambda owner=owner: _render_table_report('attendance', owner, term))
+
+
+def precompute_reports(force=False, log=print):
+    """Render every configured report whose stored data version is stale; returns reports rendered"""
+    rendered = 0
+    for key, scopes, render in list(_precompute_jobs()):
+        version = precompute.current(db.session, db.metadata, scopes)
+        meta = report_store.meta(key)
+        if not force and version is not None and meta and meta['version'] == version:
+            continue
+        started = time.perf_counter()
+        try:
+            buffer = render()
+        except Exception as e:
+            db.session.rollback()
+            log(f'{key}: failed ({e})')
+            continue
+        seconds = round(time.perf_counter() - started, 2)
+        report_store.put(key, version, buffer, seconds=seconds)
+        rendered += 1
+        log(f'{key}: rendered in {seconds}s')
+    db.session.remove()
+    return rendered
+
+
+@app.cli.command('precompute-reports')
+@click.option('--at', help='Stay running and refresh daily at this local time (HH:MM), e.g. as a sidecar')
+@click.option('--force', is_flag=True, help='Render even reports whose data has not changed')
+def precompute_reports_command(at, force):
+    """Pre-render the standard reports so morning downloads are served from disk."""
+    init_db()
+    if at:
+        # Reject a malformed time before the first run
+        try:
+            precompute.seconds_until(at, datetime.now())
+        except ValueError:
+            raise click.BadParameter('Use a local time as HH:MM, e.g. 02:30', param_hint='--at')
+    while True:
+        with app.app_context():
+            rendered = precompute_reports(force=force, log=click.echo)
+        click.echo(f'{rendered} report(s) rendered, the rest unchanged')
+        if not at:
+            break
+        delay = precompute.seconds_until(at, datetime.now())
+        click.echo(f'Next run at {at} ({delay / 3600:.1f} h)')
+        time.sleep(delay)
+
+
 if __name__ == '__main__':
     init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
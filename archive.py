@@ -0,0 +1,98 @@
+# ======================== ARCHIVAL ========================
+"""Moves closed academic years out of the live leave and attendance tables.
+
+The live ``leaves``, ``leave_documents`` and ``attendance`` tables keep only
+the academic years still in use. ``run`` moves older rows into
+``*_archive`` tables with the same columns. Leaves that are still pending
+are never moved, whatever their dates. Every list, fragment and dashboard
+query then scans only the open years without any extra filter. Reports that
+ask for older dates read the archive as well (see ``archived_through`` in
+app.py).
+
+Rows move in id-ordered batches, and each batch is copied and deleted in
+one transaction. An interrupted run therefore leaves every row in exactly
+one table and can simply be run again. Outbox events for moved leaves are
+dropped with them. On Postgres the live tables are vacuumed afterwards so
+the freed pages are reused.
+"""
+from datetime import date
+
+from sqlalchemy import and_, func, select
+
+BATCH = 20000
+
+
+def academic_year(day, start_month):
+    """Academic year a day falls in, named by the calendar year it starts in"""
+    return day.year if day.month >= start_month else day.year - 1
+
+
+def cutoff_date(today, keep_years, start_month):
+    """First day kept live when the newest ``keep_years`` academic years stay"""
+    return date(academic_year(today, start_month) - (keep_years - 1), start_month, 1)
+
+
+def _next_bound(conn, table, condition, after):
+    """Highest id of the next batch of rows matching condition, or None"""
+    ids = select(table.c.id).where(condition, table.c.id > after).order_by(table.c.id).limit(BATCH).subquery()
+    return conn.execute(select(func.max(ids.c.id))).scalar()
+
+
+def _copy(conn, source, target, condition):
+    columns = [c.name for c in source.columns if c.name in target.columns]
+    conn.execute(target.insert().from_select(columns, select(*[source.c[name] for name in columns]).where(condition)))
+
+
+def _move(conn, source, target, condition):
+    _copy(conn, source, target, condition)
+    return conn.execute(source.delete().where(condition)).rowcount
+
+
+def run(engine, metadata, cutoff, dry_run=False, log=print):
+    """Archive leaves that ended and attendance taken before cutoff; returns {table: rows moved}"""
+    t = metadata.tables
+    leaves, documents, events, attendance = t['leaves'], t['leave_documents'], t['leave_events'], t['attendance']
+    closed_leaves = and_(leaves.c.end_date < cutoff, leaves.c.status != 'Pending')
+    old_attendance = attendance.c.attendance_date < cutoff
+
+    if dry_run:
+        with engine.connect() as conn:
+            return {
+                'leaves': conn.execute(select(func.count()).select_from(leaves).where(closed_leaves)).scalar(),
+                'attendance': conn.execute(select(func.count()).select_from(attendance).where(old_attendance)).scalar(),
+            }
+
+    moved = {'leaves': 0, 'leave_documents': 0, 'attendance': 0}
+    after = 0
+    while True:
+        with engine.begin() as conn:
+            upper = _next_bound(conn, leaves, closed_leaves, after)
+            if upper is None:
+                break
+            batch = and_(closed_leaves, leaves.c.id > after, leaves.c.id <= upper)
+            batch_ids = select(leaves.c.id).where(batch)
+            # Parents first into the archive, children first out of the live tables
+            _copy(conn, leaves, t['leaves_archive'], batch)
+            moved['leave_documents'] += _move(conn, documents, t['leave_documents_archive'],
+                                              documents.c.leave_id.in_(batch_ids))
+            conn.execute(events.delete().where(events.c.leave_id.in_(batch_ids)))
+            moved['leaves'] += conn.execute(leaves.delete().where(batch)).rowcount
+        after = upper
+        log(f"leaves           {moved['leaves']:>10,} rows moved")
+
+    after = 0
+    while True:
+        with engine.begin() as conn:
+            upper = _next_bound(conn, attendance, old_attendance, after)
+            if upper is None:
+                break
+            batch = and_(old_attendance, attendance.c.id > after, attendance.c.id <= upper)
+            moved['attendance'] += _move(conn, attendance, t['attendance_archive'], batch)
+        after = upper
+        log(f"attendance       {moved['attendance']:>10,} rows moved")
+
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for table in ('leaves', 'leave_documents', 'attendance'):
+                conn.exec_driver_sql(f'VACUUM (ANALYZE) {table}')
+    return moved
@@ -0,0 +1,127 @@
+# ======================== ATTENDANCE BITMAPS ========================
+"""Compact monthly attendance: one ``attendance_months`` row per student per month.
+
+Day ``d`` of the month is bit ``d - 1`` of ``present_bits`` or
+``absent_bits``. A month is therefore two integers instead of up to 31
+``attendance`` rows, each with its own id, remarks and timestamp. Monthly
+and term percentages come from popcounts of a handful of rows instead of a
+scan over per-day rows. ``present_days``/``absent_days`` carry the same
+popcounts, so cohort and institution rollups can be summed in SQL.
+
+The per-day tables stay the source of truth. ``refresh`` rebuilds the
+months a flush touched (app.py calls it from an ``after_flush`` hook), and
+``rebuild`` regenerates everything after bulk loads such as ``flask seed``,
+which bypass the ORM. Both read ``attendance`` and ``attendance_archive``
+together, so months moved by ``flask archive`` keep their bitmaps.
+"""
+from datetime import date
+
+from sqlalchemy import Integer, and_, case, cast, extract, func, literal, or_, select, tuple_, union_all
+
+PRESENT = 'Present'
+ABSENT = 'Absent'
+
+
+def month_key(day):
+    """Integer month key, e.g. 202609"""
+    return day.year * 100 + day.month
+
+
+def _key_from_index(index):
+    return index // 12 * 100 + index % 12 + 1
+
+
+def next_month_key(key):
+    year, month = divmod(key, 100)
+    return _key_from_index(year * 12 + month)
+
+
+def previous_month_key(key):
+    year, month = divmod(key, 100)
+    return _key_from_index(year * 12 + month - 2)
+
+
+def term_bounds(day, start_month, terms_per_year=2):
+    """(first, following) month keys of the term containing day"""
+    length = 12 // terms_per_year
+    index = day.year * 12 + day.month - 1
+    first = index - (day.month - start_month) % 12 % length
+    return _key_from_index(first), _key_from_index(first + length)
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def _daily(metadata, criteria):
+    """(user_id, month, bit, status) for every per-day row, live and archived"""
+    parts = []
+    for name in ('attendance', 'attendance_archive'):
+        table = metadata.tables[name]
+        day = table.c.attendance_date
+        parts.append(select(
+            table.c.user_id.label('user_id'),
+            (cast(extract('year', day), Integer) * 100 + cast(extract('month', day), Integer)).label('month'),
+            literal(1).op('<<')(cast(extract('day', day), Integer) - 1).label('bit'),
+            table.c.status.label('status'),
+        ).where(*criteria(table)))
+    return union_all(*parts).subquery()
+
+
+def _aggregate(metadata, criteria=lambda table: ()):
+    daily = _daily(metadata, criteria)
+    # Each (user, date) is unique, so summing distinct bits is the same as OR-ing them
+    present, absent = daily.c.status == PRESENT, daily.c.status == ABSENT
+    return select(
+        daily.c.user_id, daily.c.month,
+        func.coalesce(func.sum(case((present, daily.c.bit), else_=0)), 0),
+        func.coalesce(func.sum(case((absent, daily.c.bit), else_=0)), 0),
+        func.coalesce(func.sum(case((present, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((absent, 1), else_=0)), 0),
+    ).group_by(daily.c.user_id, daily.c.month)
+
+
+def _columns(months):
+    """The attendance_months columns _aggregate fills, in its select order"""
+    c = months.c
+    return [c.user_id, c.month, c.present_bits, c.absent_bits, c.present_days, c.absent_days]
+
+
+def rebuild(conn, metadata):
+    """Regenerate every month from the per-day tables; returns rows written"""
+    months = metadata.tables['attendance_months']
+    # Purely derived, so recreating it also picks up any column changes
+    months.drop(conn, checkfirst=True)
+    months.create(conn)
+    conn.execute(months.insert().from_select(_columns(months), _aggregate(metadata)))
+    return conn.execute(select(func.count()).select_from(months)).scalar()
+
+
+def refresh(conn, metadata, keys):
+    """Regenerate the given (user_id, date) months from the per-day tables"""
+    months = metadata.tables['attendance_months']
+    wanted = sorted({(user_id, month_key(day)) for user_id, day in keys})
+    if not wanted:
+        return
+
+    def criteria(table):
+        day = table.c.attendance_date
+        ranges = []
+        for user_id, month in wanted:
+            year, mon = divmod(month, 100)
+            first = date(year, mon, 1)
+            following = date(year + mon // 12, mon % 12 + 1, 1)
+            ranges.append(and_(table.c.user_id == user_id, day >= first, day < following))
+        return (or_(*ranges),)
+
+    conn.execute(months.delete().where(tuple_(months.c.user_id, months.c.month).in_(wanted)))
+    conn.execute(months.insert().from_select(_columns(months), _aggregate(metadata, criteria)))
+
+
+def summarize(rows):
+    """Present and absent day counts over (present_bits, absent_bits) rows"""
+    present = absent = 0
+    for present_bits, absent_bits in rows:
+        present += popcount(present_bits)
+        absent += popcount(absent_bits)
+    return present, absent
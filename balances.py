@@ -0,0 +1,82 @@
+# ======================== LEAVE BALANCES ========================
+"""Policy-driven leave balances, provisioned for everyone in one statement.
+
+``LEAVE_POLICY`` gives each leave type a yearly allowance and a cap on the
+unused days carried into the next year. Types it does not name stay
+unlimited (``UNLIMITED`` days, nothing carried), the same allowance that
+``apply_leave`` used to create one row and one commit at a time.
+
+``provision`` inserts the ``leave_balance`` rows a year is missing for
+every user and leave type with a single ``INSERT ... SELECT``. Each row
+gets the allowance, plus whatever carries over from the previous year's
+remaining days up to the cap. It also counts days already used by approved
+leaves that started that year. Existing rows are never touched, so the
+command is safe to re-run: daily, it picks up new accounts, and on the
+first run of a year it is the rollover. ``approve_leave`` calls it for a
+single user and type when the row it charges is still missing.
+"""
+from collections import namedtuple
+from datetime import date
+
+from sqlalchemy import DateTime, String, and_, case, exists, func, literal, select, true, union_all
+
+LEAVE_TYPES = ('Sick Leave', 'Culture', 'Sports', 'Academic', 'Events')
+UNLIMITED = 9999
+
+Allowance = namedtuple('Allowance', 'days carry')
+
+
+def parse_policy(text):
+    """{leave type: Allowance} from e.g. "Sick Leave=10+5,Culture=6" (10 days, up to 5 carried)"""
+    policy = {leave_type: Allowance(UNLIMITED, 0) for leave_type in LEAVE_TYPES}
+    for item in (part.strip() for part in text.split(',')):
+        if not item:
+            continue
+        leave_type, _, spec = item.partition('=')
+        days, _, carry = spec.partition('+')
+        policy[leave_type.strip()] = Allowance(int(days), int(carry or 0))
+    return policy
+
+
+def _rules(policy):
+    """The policy as a derived table, so it joins like any other"""
+    rows = [select(literal(leave_type, String).label('leave_type'),
+                   literal(allowance.days).label('days'),
+                   literal(allowance.carry).label('carry'))
+            for leave_type, allowance in sorted(policy.items())]
+    return (rows[0] if len(rows) == 1 else union_all(*rows)).subquery('policy')
+
+
+def provision(conn, metadata, year, policy, now, user_ids=None, leave_types=None):
+    """Insert every missing (user, leave type) balance of year, optionally only for
+    user_ids and leave_types; returns rows inserted"""
+    t = metadata.tables
+    users, balances, leaves = t['users'], t['leave_balance'], t['leaves']
+    if leave_types is not None:
+        policy = {leave_type: policy[leave_type] for leave_type in leave_types if leave_type in policy}
+        if not policy:
+            return 0
+    rules = _rules(policy)
+    previous, existing = balances.alias('previous'), balances.alias('existing')
+    used = select(
+        leaves.c.user_id, leaves.c.leave_type, func.sum(leaves.c.number_of_days).label('days')
+    ).where(
+        leaves.c.status == 'Approved', leaves.c.start_date >= date(year, 1, 1), leaves.c.start_date < date(year + 1, 1, 1)
+    ).group_by(leaves.c.user_id, leaves.c.leave_type).subquery('used')
+
+    left = func.coalesce(previous.c.remaining_days, 0)
+    total = rules.c.days + case((left <= 0, 0), (left < rules.c.carry, left), else_=rules.c.carry)
+    used_days = func.coalesce(used.c.days, 0)
+    query = select(
+        users.c.id, rules.c.leave_type, total, used_days, total - used_days, literal(year), literal(now, DateTime)
+    ).select_from(
+        users.join(rules, true())
+        .outerjoin(previous, and_(previous.c.user_id == users.c.id, previous.c.leave_type == rules.c.leave_type,
+                                  previous.c.year == year - 1))
+        .outerjoin(used, and_(used.c.user_id == users.c.id, used.c.leave_type == rules.c.leave_type))
+    ).where(~exists().where(existing.c.user_id == users.c.id, existing.c.leave_type == rules.c.leave_type,
+                            existing.c.year == year))
+    if user_ids is not None:
+        query = query.where(users.c.id.in_(user_ids))
+    columns = ['user_id', 'leave_type', 'total_days', 'used_days', 'remaining_days', 'year', 'created_at']
+    return conn.execute(balances.insert().from_select(columns, query)).rowcount
@@ -0,0 +1,145 @@
+"""Attendance storage benchmark: per-day rows vs monthly bitmaps.
+
+Seeds a throwaway database through seed.py, builds attendance_months, then
+reports the on-disk size of both representations and the latency of the
+same rollups computed each way (the results are checked to agree):
+
+    month_all_students   every student's percentage for one month
+    term_one_student     one student's percentage over a six-month term
+    term_all_students    every student's percentage over the term
+
+    python benchmarks/bench_attendance_bitmap.py --students 5000 --days 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2), result
+
+
+def table_bytes(conn, table):
+    """Table plus its indexes, as stored"""
+    from sqlalchemy import text
+    if conn.dialect.name == 'postgresql':
+        return conn.execute(text('SELECT pg_total_relation_size(:t)'), {'t': table}).scalar()
+    return conn.execute(text(
+        'SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = :t)'
+    ), {'t': table}).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=200, help='working days of attendance per student')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='workzen-bench-')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault('JINJA_CACHE_DIR', os.path.join(tmpdir, 'jinja_cache'))
+    os.environ['ADMISSION_DIR'] = os.path.join(tmpdir, 'admission')
+    os.environ['USER_CACHE_DIR'] = os.path.join(tmpdir, 'user_cache')
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import text
+    from app import create_app, db, init_db
+    import attendancebits
+    import seed
+
+    app = create_app()
+    init_db()
+    until = date(2026, 6, 30)
+    with app.app_context():
+        engine = db.engine
+        seed.generate(engine, 'x', students=args.students, leaves_per_student=1, attendance_days=args.days,
+                      documents_ratio=0, until=until, seed=args.seed, log=lambda line: None)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            months_rows = attendancebits.rebuild(conn, db.metadata)
+        rebuild_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    month_first, month_next = date(2026, 6, 1), date(2026, 7, 1)
+    term_first, term_next = date(2026, 1, 1), date(2026, 7, 1)
+    with engine.connect() as conn:
+        student = conn.execute(text("SELECT MIN(user_id) FROM attendance")).scalar()
+
+        def daily_grouped(first, following):
+            rows = conn.execute(text(
+                "SELECT user_id, SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) FROM attendance "
+                "WHERE attendance_date >= :a AND attendance_date < :b GROUP BY user_id"
+            ), {'a': first, 'b': following})
+            return {user_id: (present, absent) for user_id, present, absent in rows}
+
+        def bitmap_grouped(first, following):
+            totals = {}
+            rows = conn.execute(text(
+                "SELECT user_id, present_bits, absent_bits FROM attendance_months WHERE month >= :a AND month < :b"
+            ), {'a': attendancebits.month_key(first), 'b': attendancebits.month_key(following)})
+            for user_id, present_bits, absent_bits in rows:
+                present, absent = totals.get(user_id, (0, 0))
+                totals[user_id] = (present + attendancebits.popcount(present_bits),
+                                   absent + attendancebits.popcount(absent_bits))
+            return totals
+
+        def daily_one():
+            return tuple(conn.execute(text(
+                "SELECT SUM(CASE WHEN status = 'Present' THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN status = 'Absent' THEN 1 ELSE 0 END) FROM attendance "
+                "WHERE user_id = :u AND attendance_date >= :a AND attendance_date < :b"
+            ), {'u': student, 'a': term_first, 'b': term_next}).one())
+
+        def bitmap_one():
+            return attendancebits.summarize(conn.execute(text(
+                "SELECT present_bits, absent_bits FROM attendance_months "
+                "WHERE user_id = :u AND month >= :a AND month < :b"
+            ), {'u': student, 'a': attendancebits.month_key(term_first), 'b': attendancebits.month_key(term_next)}))
+
+        scenarios = {
+            'month_all_students': (lambda: daily_grouped(month_first, month_next),
+                                   lambda: bitmap_grouped(month_first, month_next)),
+            'term_one_student': (daily_one, bitmap_one),
+            'term_all_students': (lambda: daily_grouped(term_first, term_next),
+                                  lambda: bitmap_grouped(term_first, term_next)),
+        }
+        results = {}
+        for name, (daily_fn, bitmap_fn) in scenarios.items():
+            daily_ms, daily_result = timed(daily_fn, args.repeat)
+            bitmap_ms, bitmap_result = timed(bitmap_fn, args.repeat)
+            if daily_result != bitmap_result:
+                raise SystemExit(f'{name}: per-day and bitmap rollups disagree')
+            results[name] = {'daily_ms': daily_ms, 'bitmap_ms': bitmap_ms,
+                             'speedup': round(daily_ms / bitmap_ms, 1) if bitmap_ms else None}
+
+        daily_rows = conn.execute(text('SELECT COUNT(*) FROM attendance')).scalar()
+        storage = {
+            'attendance': {'rows': daily_rows, 'bytes': table_bytes(conn, 'attendance')},
+            'attendance_months': {'rows': months_rows, 'bytes': table_bytes(conn, 'attendance_months')},
+        }
+
+    print(json.dumps({
+        'dialect': engine.dialect.name,
+        'dataset': {'students': args.students, 'days': args.days, 'seed': args.seed},
+        'rebuild_ms': rebuild_ms,
+        'storage': storage,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Worker startup benchmark.
+
+Imports app in fresh interpreters under ``python -X importtime`` and reports
+the cumulative import time of ``app`` plus the child's peak RSS. Import time
+depends on the machine, so it is compared with a run saved on the same one:
+exits non-zero when the median grew by more than --tolerance against
+--baseline, or when a module listed in --forbid (ReportLab by default) is
+imported eagerly.
+
+    python benchmarks/bench_import_time.py --runs 5 --output before.json
+    python benchmarks/bench_import_time.py --runs 5 --baseline before.json --tolerance 0.15
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import app, resource, sys, json; "
+    "print(json.dumps({'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "
+    "'modules': sorted({m.split('.')[0] for m in sys.modules})}))"
+)
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S.*)$')
+
+
+def run_once(env):
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and match.group(3).strip() == 'app':
+            cumulative_us = int(match.group(2))
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative_us / 1000, probe['rss_mb'], set(probe['modules'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument('--forbid', default='reportlab,requests',
+                        help='comma-separated top-level modules that must not load at import')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='workzen-bench-')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    env['JINJA_CACHE_DIR'] = os.path.join(tmpdir, 'jinja_cache')
+
+    timings, rss, loaded = [], [], set()
+    for _ in range(args.runs):
+        ms, mb, modules = run_once(env)
+        timings.append(ms)
+        rss.append(mb)
+        loaded |= modules
+
+    forbidden = sorted(m for m in args.forbid.split(',') if m and m in loaded)
+    report = {
+        'runs': args.runs,
+        'import_ms_median': round(statistics.median(timings), 1),
+        'import_ms_min': round(min(timings), 1),
+        'rss_mb_median': round(statistics.median(rss), 1),
+        'forbidden_loaded': forbidden,
+    }
+    failed = bool(forbidden)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['import_ms_median']
+        change = report['import_ms_median'] / baseline - 1
+        report['baseline_ms_median'] = baseline
+        report['change'] = round(change, 3)
+        failed = failed or change > args.tolerance
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
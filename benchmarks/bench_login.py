@@ -0,0 +1,86 @@
+"""Login throughput benchmark.
+
+Seeds a throwaway SQLite database with plaintext-password users (the legacy
+format), then fires concurrent POST /login requests through the Flask test
+client. The first round exercises the rehash-on-login migration, the second
+measures steady-state verification against calibrated hashes.
+
+    python benchmarks/bench_login.py --users 200 --threads 16
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_round(app, emails, threads):
+    def login(email):
+        client = app.test_client()
+        start = time.perf_counter()
+        resp = client.post('/login', data={'email': email, 'password': 'secret-' + email})
+        return resp.status_code, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(login, emails))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(ms for _, ms in results)
+    statuses = {}
+    for code, _ in results:
+        statuses[code] = statuses.get(code, 0) + 1
+    return {
+        'logins': len(results),
+        'wall_s': round(wall, 3),
+        'logins_per_s': round(len(results) / wall, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='workzen-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ['ADMISSION_DIR'] = os.path.join(tmpdir, 'admission')
+    os.environ['USER_CACHE_DIR'] = os.path.join(tmpdir, 'user_cache')
+    sys.path.insert(0, ROOT)
+    from app import create_app, db, User, password_hasher
+    app = create_app()
+
+    emails = [f'student{i}@bench.local' for i in range(args.users)]
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_insert_mappings(User, [
+            {'email': e, 'password': 'secret-' + e, 'role': 'STUDENT'} for e in emails
+        ])
+        db.session.commit()
+
+    report = {
+        'iterations': password_hasher.iterations,
+        'target_ms': password_hasher.target_ms,
+        'workers': password_hasher.max_workers,
+        'max_pending': password_hasher.max_pending,
+        'migration_round': run_round(app, emails, args.threads),
+        'steady_round': run_round(app, emails, args.threads),
+    }
+    with app.app_context():
+        report['plaintext_rows_left'] = sum(
+            1 for (pw,) in db.session.query(User.password) if not password_hasher.is_hashed(pw)
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
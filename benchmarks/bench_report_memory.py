@@ -0,0 +1,90 @@
+"""Leave report memory benchmark: peak RSS against the number of leaves.
+
+Renders the full leave report (reporting.build_leave_report) from synthetic
+leaves, each size in a fresh process, and reports the peak resident memory
+and render time per row count. ReportLab holds every page until the PDF is
+saved, so the report lists at most reporting.MAX_REPORT_ROWS leaves; the
+check fails when a report past the cap peaks more than the tolerance above
+one at the cap, i.e. memory still grows with the rows.
+
+    python benchmarks/bench_report_memory.py --rows 1000,5000,20000,60000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def leaves(count):
+    start = date(2026, 1, 5)
+    for i in range(count):
+        requester = SimpleNamespace(full_name=f'Student {i % 5000}', email=f'student{i % 5000}@mbit.edu.in')
+        yield SimpleNamespace(requester=requester, leave_type='Sick Leave', start_date=start + timedelta(days=i % 300),
+                              end_date=start + timedelta(days=i % 300 + 1), number_of_days=2,
+                              status=('Pending', 'Approved', 'Rejected')[i % 3], reason='Fever and cold')
+
+
+def render(count):
+    """Child process: render one report and print its peak memory as JSON"""
+    sys.path.insert(0, ROOT)
+    import reporting
+    # No network: render without logos
+    reporting._image_cache.update({url: (None, time.monotonic())
+                                   for url in (reporting.MBIT_LOGO_URL, reporting.CVM_LOGO_URL)})
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    counts = {'Pending': (count + 2) // 3, 'Approved': (count + 1) // 3, 'Rejected': count // 3}
+    start = time.perf_counter()
+    pdf = reporting.build_leave_report(leaves(count), counts, None, title='Leave Management Report',
+                                       summary_labels=['Total', 'Pending', 'Approved', 'Rejected'],
+                                       empty_message='No leave records found.')
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'rows': count,
+        'listed': min(count, reporting.MAX_REPORT_ROWS),
+        'render_ms': round(elapsed * 1000, 1),
+        'pdf_bytes': len(pdf.getvalue()),
+        # ru_maxrss is in KiB on Linux
+        'peak_mb': round(peak / 1024, 1),
+        'render_peak_mb': round((peak - baseline) / 1024, 1),
+        'cap': reporting.MAX_REPORT_ROWS,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,5000,20000,60000', help='comma-separated leave counts')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed peak growth past the cap, as a fraction of the peak at the cap')
+    parser.add_argument('--render', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.render is not None:
+        return render(args.render)
+
+    results = []
+    for count in sorted(int(n) for n in args.rows.split(',')):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--render', str(count)],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out))
+
+    cap = results[0]['cap']
+    at_cap = [r for r in results if r['rows'] >= cap]
+    failures = []
+    if at_cap:
+        limit = at_cap[0]['peak_mb'] * (1 + args.tolerance)
+        failures = [r['rows'] for r in at_cap[1:] if r['peak_mb'] > limit]
+    print(json.dumps({'results': results, 'failures': failures}, indent=2))
+    if len(at_cap) < 2:
+        print(f'note: pass at least two row counts >= {cap} to check the cap', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
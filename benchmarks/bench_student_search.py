@@ -0,0 +1,84 @@
+"""Student typeahead latency benchmark.
+
+Seeds a throwaway SQLite database with a large student body and times
+GET /api/students/search for a spread of 1-6 character prefixes as the HOD.
+Exits non-zero when the p95 latency exceeds --budget-ms.
+
+    python benchmarks/bench_student_search.py --students 50000 --budget-ms 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nirav', 'Priya', 'Rohan', 'Sneha', 'Vivaan']
+LAST_NAMES = ['Patel', 'Shah', 'Desai', 'Mehta', 'Joshi', 'Trivedi', 'Parmar', 'Modi', 'Rana', 'Bhatt']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--budget-ms', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='workzen-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ['ADMISSION_DIR'] = os.path.join(tmpdir, 'admission')
+    os.environ['USER_CACHE_DIR'] = os.path.join(tmpdir, 'user_cache')
+    sys.path.insert(0, ROOT)
+    from app import create_app, db, User, init_db
+    app = create_app()
+
+    rng = random.Random(args.seed)
+    init_db()
+    with app.app_context():
+        rows = []
+        for i in range(args.students):
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'
+            rows.append({'email': f'{i:06d}@mbit.edu.in', 'password': 'x', 'role': 'STUDENT', 'full_name': name})
+        db.session.bulk_insert_mappings(User, rows)
+        hod = User(email='hod@mbit.edu.in', password='x', role='HOD', full_name='HOD')
+        db.session.add(hod)
+        db.session.commit()
+        hod_id = hod.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = hod_id
+
+    prefixes = []
+    for _ in range(args.queries):
+        source = rng.choice(rows)['full_name'] if rng.random() < 0.7 else rng.choice(rows)['email']
+        prefixes.append(source[:rng.randint(1, 6)])
+
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        resp = client.get('/api/students/search', query_string={'q': prefix})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.data
+
+    latencies.sort()
+    report = {
+        'students': args.students,
+        'queries': len(latencies),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        'max_ms': round(latencies[-1], 2),
+        'budget_ms': args.budget_ms,
+    }
+    print(json.dumps(report, indent=2))
+    if report['p95_ms'] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
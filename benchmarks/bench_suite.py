@@ -0,0 +1,199 @@
+"""Hot-endpoint benchmark suite.
+
+Seeds a throwaway database with a realistic institution through seed.py
+(the generator behind `flask seed`; sizes scale with --scale), then times the
+hot pages and APIs through the Flask test client, counting SQL statements
+per request. Results are written as JSON so two commits can be compared:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --baseline before.json --tolerance 0.25
+
+Exits non-zero when any timed request was not answered 2xx, and with
+--baseline when any scenario's p95 grew by more than --tolerance. --database-url points the run at a local Postgres instead of
+SQLite; the database should be empty.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (role, method, path, request kwargs, heavy)
+SCENARIOS = {
+    'timeoff': ('HOD', 'get', '/timeoff', {}, False),
+    'timeoff_fragment_all': ('HOD', 'get', '/timeoff/fragments/all', {}, False),
+    'timeoff_fragment_pending': ('HOD', 'get', '/timeoff/fragments/pending', {}, False),
+    'timeoff_fragment_history': ('STUDENT', 'get', '/timeoff/fragments/history', {}, False),
+    'reports': ('HOD', 'get', '/reports', {}, False),
+    'report_detail_leaves': ('HOD', 'get', '/reports/leaves', {}, True),
+    'report_detail_attendance': ('HOD', 'get', '/reports/attendance', {}, True),
+    'pdf_leave_report': ('HOD', 'get', '/api/leaves/report', {}, True),
+    'pdf_filtered_report': ('HOD', 'post', '/api/leaves/report/filtered',
+                            {'json': {'status': 'Pending'}}, True),
+    'pdf_download_leaves': ('COUNSELOR', 'get', '/api/reports/download/leaves/pdf', {}, True),
+    'apply_leave': ('STUDENT', 'post', '/api/leaves/apply', None, False),
+    'approve_leave': ('HOD', 'put', None, {}, False),
+}
+
+
+def next_weekdays(today, count):
+    """The first count Monday-Friday dates after today, so a leave always falls in the allowed range"""
+    days, current = [], today
+    while len(days) < count:
+        current += timedelta(days=1)
+        if current.weekday() < 5:
+            days.append(current)
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--leaves', type=int, default=200000)
+    parser.add_argument('--attendance', type=int, default=2000000)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every dataset size')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--heavy-repeat', type=int, default=3, help='repeats for PDF and full-report scenarios')
+    parser.add_argument('--only', default='', help='comma-separated scenario names')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    # stdout carries only the JSON report; app and seeding chatter goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if report['failures'] or report.get('regressions'):
+        sys.exit(1)
+
+
+def run(args):
+    tmpdir = tempfile.mkdtemp(prefix='workzen-bench-')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault('JINJA_CACHE_DIR', os.path.join(tmpdir, 'jinja_cache'))
+    # Admission limits would turn repeated heavy requests into 429s; keep its state out of instance/
+    os.environ['ADMISSION_CONTROL'] = '0'
+    os.environ['ADMISSION_DIR'] = os.path.join(tmpdir, 'admission')
+    os.environ['USER_CACHE_DIR'] = os.path.join(tmpdir, 'user_cache')
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app, db, init_db, Leave, User
+    import attendancebits
+    import seed
+
+    app = create_app()
+    init_db()
+    sizes = {name: max(1, int(getattr(args, name) * args.scale)) for name in ('students', 'leaves', 'attendance')}
+    started = time.perf_counter()
+    with app.app_context():
+        seed.generate(db.engine, 'x', students=sizes['students'],
+                      leaves_per_student=max(1, sizes['leaves'] // sizes['students']),
+                      attendance_days=max(1, sizes['attendance'] // sizes['students']),
+                      seed=args.seed, log=lambda line: None)
+        with db.engine.begin() as conn:
+            attendancebits.rebuild(conn, db.metadata)
+        ids = {key: User.query.filter_by(role=role).order_by(User.id).first().id
+               for key, role in (('hod', 'HOD'), ('counselor', 'COUNSELOR'), ('student', 'STUDENT'))}
+        pending_ids = [row[0] for row in db.session.query(Leave.id).filter(Leave.status == 'Pending')
+                       .order_by(Leave.id).limit(args.repeat + 1)]
+    seed_seconds = time.perf_counter() - started
+
+    statements = [0]
+    event.listen(Engine, 'after_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    clients = {}
+    for role, key in (('HOD', 'hod'), ('COUNSELOR', 'counselor'), ('STUDENT', 'student')):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = ids[key]
+        clients[role] = client
+
+    selected = [s for s in args.only.split(',') if s] or list(SCENARIOS)
+    results = {}
+    for name in selected:
+        role, method, path, kwargs, heavy = SCENARIOS[name]
+        client = clients[role]
+        repeat = args.heavy_repeat if heavy else args.repeat
+        latencies, counts, codes = [], [], {}
+        leave_dates = next_weekdays(date.today(), 2)
+        # One untimed warm-up request fills template and style caches
+        for i in range(repeat + 1):
+            if name == 'apply_leave':
+                kwargs = {'data': {'start_date': leave_dates[0].isoformat(), 'end_date': leave_dates[-1].isoformat(),
+                                   'leave_type': 'Sick Leave', 'reason': f'bench {i}'}}
+            if name == 'approve_leave':
+                path = f'/api/leaves/approve/{pending_ids[i % len(pending_ids)]}'
+            before = statements[0]
+            start = time.perf_counter()
+            resp = getattr(client, method)(path, **kwargs)
+            resp.get_data()
+            elapsed = (time.perf_counter() - start) * 1000
+            if i == 0:
+                continue
+            latencies.append(elapsed)
+            counts.append(statements[0] - before)
+            codes[resp.status_code] = codes.get(resp.status_code, 0) + 1
+
+        latencies.sort()
+        results[name] = {
+            'requests': len(latencies),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries': statistics.median(counts),
+            'statuses': codes,
+        }
+        print(f'{name:28s} p50 {results[name]["p50_ms"]:10.2f} ms  queries {results[name]["queries"]:6}',
+              file=sys.stderr)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'dialect': dialect,
+        'dataset': dict(sizes, seed=args.seed, seed_seconds=round(seed_seconds, 1)),
+        'results': results,
+        # Scenarios with non-2xx answers; their timings are not comparable
+        'failures': {name: result['statuses'] for name, result in results.items()
+                     if any(not 200 <= code < 300 for code in result['statuses'])},
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = {}
+        for name, result in results.items():
+            if name in baseline and baseline[name]['p95_ms'] > 0:
+                change = result['p95_ms'] / baseline[name]['p95_ms'] - 1
+                result['p95_change'] = round(change, 3)
+                if change > args.tolerance:
+                    regressions[name] = result['p95_change']
+        report['regressions'] = regressions
+    return report
+
+
+if __name__ == '__main__':
+    main()
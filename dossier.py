@@ -0,0 +1,194 @@
+# ======================== STUDENT DOSSIERS ========================
+"""Term-end PDF dossiers for a cohort, streamed as one ZIP.
+
+``stream`` loads students ``BATCH`` at a time with a handful of queries
+(leaves, their documents, achievements and monthly attendance, live and
+archived). Each student becomes a plain dict that a process pool renders
+with ``reporting.build_student_dossier``. Finished PDFs are written to the
+ZIP as they complete, in whatever order that is, and every entry is yielded
+as soon as it is written. At most ``2 * workers`` PDFs are queued or held
+at once, so memory stays flat however large the cohort is.
+
+The pool uses ``spawn``: a forked copy of a threaded web worker could
+inherit held locks and open database connections.
+"""
+import multiprocessing
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+from sqlalchemy import and_, select, union_all
+from werkzeug.utils import secure_filename
+
+import attendancebits
+
+BATCH = 50
+PROGRESS_SECONDS = 1.0
+
+
+def _month_start(key):
+    return date(key // 100, key % 100, 1)
+
+
+def period_label(first, following):
+    """e.g. "Jun 2026 - Nov 2026" for month keys first <= month < following"""
+    last = attendancebits.previous_month_key(following)
+    return f'{_month_start(first):%b %Y} - {_month_start(last):%b %Y}'
+
+
+def _union(metadata, names, columns, criteria):
+    """The same select over a live table and its archive"""
+    parts = []
+    for name in names:
+        table = metadata.tables[name]
+        parts.append(select(*[table.c[column] for column in columns]).where(*criteria(table)))
+    return union_all(*parts)
+
+
+def load(conn, metadata, student_ids, first, following):
+    """Picklable dossier data for student_ids over month keys first <= month < following"""
+    t = metadata.tables
+    users, months, achievements = t['users'], t['attendance_months'], t['achievements']
+    first_day, following_day = _month_start(first), _month_start(following)
+
+    students = {}
+    for id, full_name, email, counselor_id in conn.execute(
+            select(users.c.id, users.c.full_name, users.c.email, users.c.counselor_id)
+            .where(users.c.id.in_(student_ids)).order_by(users.c.id)):
+        students[id] = {
+            'id': id, 'full_name': full_name, 'email': email, 'counselor_id': counselor_id,
+            'filename': f'{id}_{secure_filename(full_name or email) or "student"}.pdf',
+            'attendance': [], 'leaves': [], 'achievements': [],
+        }
+    counselor_ids = {s['counselor_id'] for s in students.values() if s['counselor_id'] is not None}
+    counselors = dict(conn.execute(select(users.c.id, users.c.full_name).where(users.c.id.in_(counselor_ids))).all())
+    for student in students.values():
+        student['counselor'] = counselors.get(student.pop('counselor_id'))
+
+    for user_id, month, present, absent in conn.execute(
+            select(months.c.user_id, months.c.month, months.c.present_days, months.c.absent_days)
+            .where(months.c.user_id.in_(student_ids), months.c.month >= first, months.c.month < following)
+            .order_by(months.c.user_id, months.c.month)):
+        students[user_id]['attendance'].append((month, f'{_month_start(month):%B %Y}', present, absent))
+
+    # Leaves overlapping the period, with the archive for closed years
+    leaves = {}
+    leave_columns = ('id', 'user_id', 'leave_type', 'start_date', 'end_date', 'number_of_days', 'status', 'reason')
+    query = _union(metadata, ('leaves', 'leaves_archive'), leave_columns, lambda table: (
+        table.c.user_id.in_(student_ids),
+        and_(table.c.start_date < following_day, table.c.end_date >= first_day)))
+    for row in conn.execute(query.order_by('user_id', 'start_date')).mappings():
+        leave = dict(row, documents=[])
+        leaves[leave['id']] = leave
+        students[leave['user_id']]['leaves'].append(leave)
+    if leaves:
+        document_columns = ('leave_id', 'file_name', 'document_type', 'file_size')
+        query = _union(metadata, ('leave_documents', 'leave_documents_archive'), document_columns,
+                       lambda table: (table.c.leave_id.in_(list(leaves)),))
+        for row in conn.execute(query.order_by('leave_id', 'file_name')).mappings():
+            leaves[row['leave_id']]['documents'].append(dict(row))
+
+    for row in conn.execute(
+            select(achievements.c.user_id, achievements.c.title, achievements.c.description, achievements.c.created_at)
+            .where(achievements.c.user_id.in_(student_ids),
+                   achievements.c.created_at >= first_day, achievements.c.created_at < following_day)
+            .order_by(achievements.c.user_id, achievements.c.created_at)).mappings():
+        students[row['user_id']]['achievements'].append(dict(row))
+
+    return list(students.values())
+
+
+class _Sink:
+    """Write-only target for ZipFile; holds what was written until drained"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream(engine, metadata, student_ids, first, following, workers, progress=None, log=print):
+    """Yield a ZIP of one dossier per student, rendered on ``workers`` processes.
+
+    ``progress(done, failed)`` is called at most every PROGRESS_SECONDS and
+    once at the end. A student whose PDF fails is listed in ERRORS.txt
+    rather than aborting the archive. So is one that could not be queued
+    because a rendering process died; the rest go to a fresh pool.
+    """
+    import reporting
+
+    period = period_label(first, following)
+    total = len(student_ids)
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED)  # PDFs are already compressed
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=reporting.use_logo_cache, initargs=(reporting.logo_cache(),))
+
+    pool = new_pool()
+    pending = {}  # future -> student
+    done, failed = 0, []
+    reported_at = time.monotonic()
+
+    def fail(student, error):
+        log(f"Dossier for student {student['id']} failed: {error}")
+        failed.append(f"{student['id']}\t{student['email']}\t{error}")
+
+    def collect(futures):
+        nonlocal done, reported_at
+        for future in futures:
+            student = pending.pop(future)
+            try:
+                archive.writestr(student['filename'], future.result())
+                done += 1
+            except Exception as e:
+                fail(student, e)
+        if progress and time.monotonic() - reported_at >= PROGRESS_SECONDS:
+            reported_at = time.monotonic()
+            progress(done, len(failed))
+
+    try:
+        for start in range(0, total, BATCH):
+            with engine.connect() as conn:
+                students = load(conn, metadata, student_ids[start:start + BATCH], first, following)
+            for student in students:
+                while len(pending) >= 2 * workers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                    yield sink.drain()
+                try:
+                    pending[pool.submit(reporting.build_student_dossier, student, period)] = student
+                except BrokenProcessPool as e:
+                    # Its queued futures fail on their own and are collected as usual
+                    fail(student, e)
+                    pool.shutdown(wait=False)
+                    pool = new_pool()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+            yield sink.drain()
+
+        if failed:
+            archive.writestr('ERRORS.txt', '\n'.join(['student_id\temail\terror'] + failed) + '\n')
+        archive.close()
+        if progress:
+            progress(done, len(failed))
+        yield sink.drain()
+    finally:
+        # Also reached when the client disconnects mid-download
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,154 @@
+# ======================== FULL-TEXT SEARCH ========================
+"""Full-text search over leave reasons, leave documents, medical records and
+achievements, including leaves and documents moved to the archive tables.
+
+Postgres keeps a generated ``search_vector`` tsvector column with a GIN index
+on each table. The SQLite stand-in mirrors each table into an FTS5
+external-content table that triggers keep in sync. Neither lives on the ORM
+models, so the models stay portable; ``install`` creates whatever the current
+dialect needs and ``search`` returns ranked, role-scoped, paginated hits.
+``flask archive`` moves rows into ``ARCHIVES``, which are indexed the same
+way, so an archived leave is still found (with ``archived`` set).
+"""
+import re
+
+from sqlalchemy import text
+
+# kind -> (table, weighted text columns, title column, body column, file column)
+SOURCES = {
+    'leave': ('leaves', [('reason', 'A')], 'leave_type', 'reason', None),
+    'document': ('leave_documents', [('document_type', 'A'), ('file_name', 'B')],
+                 'document_type', 'file_name', 'file_url'),
+    'medical': ('medical_records', [('reason', 'A')], 'leave_type', 'reason', 'file_url'),
+    'achievement': ('achievements', [('title', 'A'), ('description', 'B')],
+                    'title', 'description', 'file_url'),
+}
+
+# kind -> archive table with the same columns (see archive.py)
+ARCHIVES = {
+    'leave': 'leaves_archive',
+    'document': 'leave_documents_archive',
+}
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# ---------- schema ----------
+
+def _tables(kind):
+    """(table, archived) pairs holding rows of kind"""
+    tables = [(SOURCES[kind][0], False)]
+    if kind in ARCHIVES:
+        tables.append((ARCHIVES[kind], True))
+    return tables
+
+
+def _postgres_ddl(kind, table):
+    columns = SOURCES[kind][1]
+    vector = ' || '.join(
+        f"setweight(to_tsvector('english', coalesce({col}, '')), '{weight}')" for col, weight in columns
+    )
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+    ]
+
+
+def _sqlite_ddl(kind, table, existing):
+    """Statements creating whatever of the FTS table and its triggers is not in existing"""
+    columns = SOURCES[kind][1]
+    names = [col for col, _ in columns]
+    cols = ', '.join(names)
+    new_vals = ', '.join(f'new.{c}' for c in names)
+    old_vals = ', '.join(f'old.{c}' for c in names)
+    fts = f'{table}_fts'
+    objects = {
+        fts: f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+             f"content_rowid='id', tokenize='porter unicode61')",
+        f'{fts}_ai': f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                     f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f'{fts}_ad': f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                     f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f'{fts}_au': f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+                     f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+                     f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    }
+    statements = [statement for name, statement in objects.items() if name not in existing]
+    if statements:
+        # Index rows written while the table or a trigger was missing; skipped on every later start
+        statements.append(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return statements
+
+
+def install(engine):
+    """Create search columns/indexes (Postgres) or any missing FTS5 tables and triggers (SQLite)"""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            statements = [statement for kind in SOURCES for table, _ in _tables(kind)
+                          for statement in _postgres_ddl(kind, table)]
+        else:
+            existing = {name for name, in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"))}
+            statements = [statement for kind in SOURCES for table, _ in _tables(kind)
+                          for statement in _sqlite_ddl(kind, table, existing)]
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+# ---------- querying ----------
+
+def _fts5_query(terms):
+    # Quote every term so user input cannot inject FTS5 operators
+    return ' '.join('"%s"' % term for term in terms)
+
+
+def _hit_select(kind, dialect, table, archived):
+    _, _, title, body, file_col = SOURCES[kind]
+    file_expr = f't.{file_col}' if file_col else 'NULL'
+    columns = (f"'{kind}' AS kind, t.id AS id, t.user_id AS user_id, t.{title} AS title, "
+               f"t.{body} AS body, {file_expr} AS file_url, t.created_at AS created_at, "
+               f"{int(archived)} AS archived")
+    if dialect == 'postgresql':
+        return (f"SELECT {columns}, ts_rank(t.search_vector, q) AS rank "
+                f"FROM {table} t, websearch_to_tsquery('english', :q) q "
+                f"WHERE t.search_vector @@ q")
+    fts = f'{table}_fts'
+    # bm25() is lower-is-better; negate so both dialects sort rank DESC
+    return (f"SELECT {columns}, -bm25({fts}) AS rank "
+            f"FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :q")
+
+
+def search(session, query, scope, viewer_id, kinds=None, page=1, per_page=20):
+    """Ranked hits across the requested kinds.
+
+    ``scope`` mirrors download_report_pdf: 'all' (HOD), 'cohort' (students
+    whose counselor is ``viewer_id``) or 'own'. Returns ``(hits, has_next)``.
+    """
+    terms = _WORD_RE.findall(query or '')
+    kinds = [k for k in (kinds or SOURCES) if k in SOURCES]
+    if not terms or not kinds:
+        return [], False
+
+    dialect = session.get_bind().dialect.name
+    params = {
+        'q': query if dialect == 'postgresql' else _fts5_query(terms),
+        'viewer_id': viewer_id,
+        'limit': per_page + 1,
+        'offset': (max(page, 1) - 1) * per_page,
+    }
+    if scope == 'all':
+        scope_sql = ''
+    elif scope == 'cohort':
+        scope_sql = 'WHERE u.counselor_id = :viewer_id'
+    else:
+        scope_sql = 'WHERE hits.user_id = :viewer_id'
+
+    union = ' UNION ALL '.join(_hit_select(kind, dialect, table, archived)
+                               for kind in kinds for table, archived in _tables(kind))
+    sql = (f"SELECT hits.*, u.full_name AS owner_name, u.email AS owner_email "
+           f"FROM ({union}) hits JOIN users u ON u.id = hits.user_id {scope_sql} "
+           f"ORDER BY hits.rank DESC, hits.created_at DESC LIMIT :limit OFFSET :offset")
+    rows = session.execute(text(sql), params).mappings().all()
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,182 @@
+# ======================== LEAVE STATUS FEED ========================
+"""Server-sent events for leave status changes.
+
+``apply_leave``, ``approve_leave`` and ``reject_leave`` write a row to the
+``leave_events`` outbox in the same transaction as the change itself, so an
+event exists exactly when the change was committed, whichever worker made it.
+
+Each worker runs one poller thread while at least one stream is open. It
+reads outbox rows past the last id it has seen every
+``LEAVE_FEED_POLL_SECONDS`` and appends them to a bounded in-memory buffer
+that every open stream on the worker reads from. Ids are handed out at
+insert time, not commit time, so a row can become visible after rows with
+higher ids. The poller therefore only moves past a gap in the ids once
+``LEAVE_FEED_GAP_SECONDS`` have passed since it first saw the gap. Until
+then it re-reads the rows above the gap on each poll. Gaps left by rolled
+back transactions cost that delay once. Open pages therefore cost
+one indexed query per interval in total, not one per page. A stream resumes
+from ``Last-Event-ID`` (or ``?since=``). When the buffer no longer reaches
+back that far it catches up from the table, holding back rows above a gap
+the same way the poller does. When even that gap is too large,
+it sends ``reset`` and the page reloads its sections.
+
+Streams end after ``LEAVE_FEED_STREAM_SECONDS`` and the browser reconnects
+on its own, so a worker thread is never held indefinitely.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+BUFFER_SIZE = 1000
+RETRY_MS = 2000
+PRUNE_EVERY_SECONDS = 3600
+
+
+class LeaveFeed:
+    """Per-worker fan-out of outbox rows to open event streams"""
+
+    def __init__(self):
+        self._reset_state()
+
+    def _reset_state(self):
+        self._cond = threading.Condition()
+        self._buffer = deque()  # event dicts, ascending id
+        self._floor = None      # buffer holds every event with id > floor
+        self._gaps = {}         # id just above a gap -> when the gap was first seen
+        self._subscribers = 0
+        self._thread = None
+        self._pruned_at = 0.0
+
+    def init_app(self, app, load, head, prune):
+        """``load(after_id, limit)`` returns event dicts with ascending ``id``,
+        ``head()`` the newest id (0 when empty), ``prune()`` drops old rows"""
+        self.app = app
+        self.poll_seconds = float(app.config.get('LEAVE_FEED_POLL_SECONDS', 1))
+        self.stream_seconds = float(app.config.get('LEAVE_FEED_STREAM_SECONDS', 300))
+        self.heartbeat_seconds = float(app.config.get('LEAVE_FEED_HEARTBEAT_SECONDS', 15))
+        self.gap_seconds = float(app.config.get('LEAVE_FEED_GAP_SECONDS', 10))
+        self._load, self._head, self._prune = load, head, prune
+
+    def after_fork(self):
+        # The poller thread does not survive fork; the first stream starts a new one
+        self._reset_state()
+
+    # ---------- poller ----------
+
+    def _ensure_poller(self):
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='leave-feed', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    # Idle: nobody is listening, so nothing is kept in step
+                    self._floor = None
+                    self._buffer.clear()
+                    self._gaps.clear()
+                    while not self._subscribers:
+                        self._cond.wait()
+            try:
+                self._poll()
+            except Exception:
+                self.app.logger.exception('Leave feed poll failed')
+            time.sleep(self.poll_seconds)
+
+    def _poll(self):
+        with self.app.app_context():
+            if self._floor is None:
+                head = self._head()
+                with self._cond:
+                    self._floor = head
+                    self._cond.notify_all()
+                return
+            after = self._buffer[-1]['id'] if self._buffer else self._floor
+            events = self._settled(after, self._load(after, BUFFER_SIZE), self._gaps)
+            if time.monotonic() - self._pruned_at > PRUNE_EVERY_SECONDS:
+                self._pruned_at = time.monotonic()
+                self._prune()
+        if events:
+            with self._cond:
+                self._buffer.extend(events)
+                while len(self._buffer) > BUFFER_SIZE:
+                    self._floor = self._buffer.popleft()['id']
+                self._cond.notify_all()
+
+    def _settled(self, after, events, gaps):
+        """The leading events that may be published: contiguous ids, or past gaps older than gap_seconds.
+
+        ``gaps`` maps the id just above each gap to when it was first seen, and is updated in place.
+        """
+        now = time.monotonic()
+        ready = []
+        for event in events:
+            if event['id'] != after + 1:
+                # A lower id may still be in an uncommitted transaction
+                if now - gaps.setdefault(event['id'], now) < self.gap_seconds:
+                    break
+            ready.append(event)
+            after = event['id']
+        for event_id in [event_id for event_id in gaps if event_id <= after]:
+            del gaps[event_id]
+        return ready
+
+    def cursor(self):
+        """Newest id this worker has published, or the table's newest id while it is not polling"""
+        with self._cond:
+            if self._floor is not None:
+                return self._buffer[-1]['id'] if self._buffer else self._floor
+        return self._head()
+
+    def _after(self, cursor):
+        """Buffered events past cursor, or None if the buffer starts after it"""
+        if self._floor is None or cursor < self._floor:
+            return None
+        return [event for event in self._buffer if event['id'] > cursor]
+
+    # ---------- streams ----------
+
+    def stream(self, since, matches, payload):
+        """SSE body for one client: events past ``since`` for which ``matches(event)``"""
+        self._ensure_poller()
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            cursor = self.cursor() if since is None else since
+            gaps = {}  # this stream's own, while it catches up from the table
+            deadline = time.monotonic() + self.stream_seconds
+            while time.monotonic() < deadline:
+                with self._cond:
+                    events = self._after(cursor)
+                    if events == [] or (events is None and self._floor is None):
+                        self._cond.wait(self.heartbeat_seconds)
+                        events = self._after(cursor)
+                if events is None and self._floor is not None:
+                    # Fell behind the buffer: catch up from the table, or give up and reset
+                    loaded = self._load(cursor, BUFFER_SIZE)
+                    if len(loaded) == BUFFER_SIZE:
+                        cursor = self._head()
+                        yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+                        continue
+                    # The same gap rule as the poller: rows above a fresh gap wait for it
+                    events = self._settled(cursor, loaded, gaps)
+                    if not events:
+                        time.sleep(self.poll_seconds)
+                if not events:
+                    # Also advances Last-Event-ID past events this client was not shown
+                    yield f': keepalive\nid: {cursor}\n\n'
+                    continue
+                for event in events:
+                    cursor = event['id']
+                    if matches(event):
+                        yield f'id: {cursor}\nevent: leave\ndata: {json.dumps(payload(event))}\n\n'
+        finally:
+            self._release()
@@ -0,0 +1,177 @@
+# ======================== REQUEST METRICS ========================
+"""Per-request timing and SQL instrumentation, rendered in the Prometheus
+text exposition format.
+
+Each request costs two ``perf_counter`` calls plus a few dict updates under
+one lock, and each SQL statement costs two more ``perf_counter`` calls.
+Endpoints are labelled by Flask endpoint name (not path), so the number of
+series stays bounded. Counters live in the worker process; with several
+workers, each one reports its own totals.
+"""
+import bisect
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                    for k, v in labels.items())
+
+
+class Histogram:
+    """Fixed-bucket histogram; callers hold the registry lock"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestMetrics:
+    """Latency, SQL and response-size metrics per endpoint"""
+
+    def __init__(self, prefix='workzen'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._requests = {}    # (endpoint, method, status) -> count
+        self._histograms = {}  # (metric, endpoint) -> Histogram
+        self._in_flight = 0
+        self._collectors = []
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Listening on the Engine class covers every engine the app creates
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_collector(self, fn):
+        """Register ``fn() -> iterable of (name, type, help, [(labels dict, value)])``"""
+        self._collectors.append(fn)
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        local = self._local
+        local.active = True
+        local.start = time.perf_counter()
+        local.sql_count = 0
+        local.sql_time = 0.0
+        local.status = 500
+        local.size = None
+        with self._lock:
+            self._in_flight += 1
+
+    def _after_request(self, response):
+        self._local.status = response.status_code
+        # None for streamed bodies, whose size is unknown up front; calculate_content_length
+        # would buffer a generator body (SSE, ZIP downloads) to measure it
+        self._local.size = response.calculate_content_length() if response.is_sequence else None
+        return response
+
+    def _teardown_request(self, exc):
+        local = self._local
+        if not getattr(local, 'active', False):
+            return
+        local.active = False
+        elapsed = time.perf_counter() - local.start
+        endpoint = request.endpoint or 'unmatched'
+        key = (endpoint, request.method, local.status)
+        with self._lock:
+            self._in_flight -= 1
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._observe('request_duration_seconds', endpoint, LATENCY_BUCKETS, elapsed)
+            self._observe('request_sql_statements', endpoint, SQL_COUNT_BUCKETS, local.sql_count)
+            self._observe('request_sql_duration_seconds', endpoint, LATENCY_BUCKETS, local.sql_time)
+            if local.size is not None:
+                self._observe('response_size_bytes', endpoint, SIZE_BUCKETS, local.size)
+
+    def _observe(self, metric, endpoint, buckets, value):
+        hist = self._histograms.get((metric, endpoint))
+        if hist is None:
+            hist = self._histograms[(metric, endpoint)] = Histogram(buckets)
+        hist.observe(value)
+
+    # ---------- SQL hooks ----------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start'].pop()
+        local = self._local
+        if getattr(local, 'active', False):
+            local.sql_count += 1
+            local.sql_time += time.perf_counter() - started
+
+    # ---------- exposition ----------
+
+    def render(self):
+        p = self.prefix
+        with self._lock:
+            requests = dict(self._requests)
+            # Materialize under the lock so each histogram's buckets agree
+            histograms = [(metric, list(h.lines(f'{p}_{metric}', _labels(endpoint=endpoint))))
+                          for (metric, endpoint), h in sorted(self._histograms.items())]
+            in_flight = self._in_flight
+
+        out = [
+            f'# HELP {p}_requests_total Requests served, by endpoint, method and status.',
+            f'# TYPE {p}_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            out.append(f'{p}_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+        out += [
+            f'# HELP {p}_requests_in_flight Requests currently being handled by this worker.',
+            f'# TYPE {p}_requests_in_flight gauge',
+            f'{p}_requests_in_flight {in_flight}',
+        ]
+
+        helps = {
+            'request_duration_seconds': 'Wall time from before_request to teardown.',
+            'request_sql_statements': 'SQL statements executed per request.',
+            'request_sql_duration_seconds': 'Time spent executing SQL per request.',
+            'response_size_bytes': 'Response body size, when known up front.',
+        }
+        for metric, help_text in helps.items():
+            out += [f'# HELP {p}_{metric} {help_text}', f'# TYPE {p}_{metric} histogram']
+            for name, lines in histograms:
+                if name == metric:
+                    out += lines
+
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                out += [f'# HELP {p}_{name} {help_text}', f'# TYPE {p}_{name} {kind}']
+                for labels, value in samples:
+                    out.append(f'{p}_{name}{{{_labels(**labels)}}} {value}' if labels else f'{p}_{name} {value}')
+        return '\n'.join(out) + '\n'
@@ -0,0 +1,142 @@
+# ======================== PASSWORD HASHING ========================
+"""Password hashing for WorkZen.
+
+Passwords are stored as Werkzeug PBKDF2-SHA256 hashes. The iteration count is
+calibrated once at startup so a single verification costs roughly
+``PASSWORD_HASH_TARGET_MS`` on the current hardware, and every verification
+runs on a small, bounded thread pool (hashlib releases the GIL while hashing)
+so a burst of logins cannot tie up every request thread.
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+MIN_ITERATIONS = 100_000
+MAX_ITERATIONS = 2_000_000
+PROBE_ITERATIONS = 20_000
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many verifications are already queued."""
+
+
+class PasswordHasher:
+    """Calibrated PBKDF2 hasher with a bounded verification pool"""
+
+    def __init__(self, target_ms=50, max_workers=2, max_pending=16, wait_timeout=5.0):
+        self.target_ms = target_ms
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self.iterations = MIN_ITERATIONS
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def method(self):
+        return f'pbkdf2:sha256:{self.iterations}'
+
+    def calibrate(self):
+        """Pick an iteration count that takes about ``target_ms`` per hash."""
+        start = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'calibration', b'workzen-salt', PROBE_ITERATIONS)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        iterations = int(PROBE_ITERATIONS * self.target_ms / max(elapsed_ms, 0.001))
+        # Round so restarts on the same hardware agree on the cost.
+        iterations = round(iterations, -4)
+        self.iterations = max(MIN_ITERATIONS, min(MAX_ITERATIONS, iterations))
+        return self.iterations
+
+    # ---------- hashing ----------
+
+    @staticmethod
+    def is_hashed(stored):
+        return bool(stored) and stored.startswith(HASH_PREFIXES)
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def _verify(self, stored, password):
+        if not stored or password is None:
+            return False
+        if not self.is_hashed(stored):
+            # Legacy plaintext row, migrated by the caller on success.
+            return hmac.compare_digest(stored.encode(), password.encode())
+        return check_password_hash(stored, password)
+
+    def needs_rehash(self, stored):
+        """True for plaintext rows and hashes well below the current cost."""
+        if not self.is_hashed(stored):
+            return True
+        method = stored.split('$', 1)[0]
+        parts = method.split(':')
+        if parts[0] != 'pbkdf2' or len(parts) != 3:
+            return False
+        try:
+            return int(parts[2]) < self.iterations // 2
+        except ValueError:
+            return True
+
+    # ---------- bounded pool ----------
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='password-hasher'
+                    )
+        return self._pool
+
+    def run(self, fn, *args):
+        """Run ``fn`` on the hashing pool, failing fast when it is saturated."""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Password verification queue is full')
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except FutureTimeout:
+            raise PasswordHasherBusy('Password verification timed out') from None
+
+    def verify(self, stored, password):
+        return self.run(self._verify, stored, password)
+
+    def hash_in_pool(self, password):
+        return self.run(self.hash, password)
+
+    def after_fork(self):
+        """Forget the parent's pool in a forked child; its threads do not exist here."""
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+def hasher_from_env():
+    """Build and calibrate the hasher from environment settings"""
+    hasher = PasswordHasher(
+        target_ms=float(os.environ.get('PASSWORD_HASH_TARGET_MS', 50)),
+        max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', min(2, os.cpu_count() or 1))),
+        max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16)),
+    )
+    hasher.calibrate()
+    return hasher
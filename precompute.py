@@ -0,0 +1,112 @@
+# ======================== PRECOMPUTED REPORTS ========================
+"""Standard reports rendered ahead of time and served while their data is unchanged.
+
+Every report depends on a few data scopes (``SCOPES``). ``data_versions``
+holds one counter per scope. app.py bumps it in a short transaction of its
+own right after any ORM write to the scope commits, so writers never queue
+on the counter rows. The bulk commands (``flask seed``, ``flask archive``)
+and init_db's role clean-up write below the ORM and bump it themselves. Leave
+balances are not a scope, since no report reads them. A report's data version is the
+counters of its scopes, read just before it was rendered. A render that
+reads data committed before its bump keeps the old version and is simply
+rendered again.
+
+``ReportStore`` keeps each rendered PDF in a directory per database under
+``REPORT_CACHE_DIR`` along with that version. A download route reads the current counters (one small query)
+and sends the stored file when they still match. Otherwise it renders as
+before. ``flask precompute-reports`` refreshes every configured report whose
+stored version is stale. It runs once (for cron) or, with ``--at HH:MM``,
+stays up as a sidecar and runs daily after hours.
+"""
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+SCOPES = ('leaves', 'attendance', 'users', 'calendar')
+
+
+def install(conn, metadata):
+    """Create the counter of any scope that does not have one yet"""
+    versions = metadata.tables['data_versions']
+    existing = {name for name, in conn.execute(select(versions.c.name))}
+    missing = [{'name': name, 'version': 0} for name in SCOPES if name not in existing]
+    if missing:
+        conn.execute(versions.insert(), missing)
+
+
+def bump(conn, metadata, scopes):
+    versions = metadata.tables['data_versions']
+    conn.execute(versions.update().where(versions.c.name.in_(sorted(scopes)))
+                 .values(version=versions.c.version + 1))
+
+
+def current(conn, metadata, scopes):
+    """{scope: counter} for scopes, or None if a counter is missing (never matches a stored report)"""
+    versions = metadata.tables['data_versions']
+    found = dict(conn.execute(select(versions.c.name, versions.c.version).where(versions.c.name.in_(scopes))).all())
+    return found if len(found) == len(set(scopes)) else None
+
+
+def seconds_until(at, now):
+    """Seconds from now to the next local HH:MM"""
+    hour, minute = (int(part) for part in at.split(':'))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+class ReportStore:
+    """Rendered reports on disk, each with the data version it was rendered from"""
+
+    def __init__(self):
+        self.directory = None
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.config['REPORT_CACHE_DIR'], app.config['DATABASE_NAMESPACE'])
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def meta(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key, version):
+        """Path of the stored report if it was rendered from this version"""
+        meta = self.meta(key)
+        if version is None or meta is None or meta['version'] != version:
+            return None
+        path = os.path.join(self.directory, meta['file'])
+        return path if os.path.exists(path) else None
+
+    def put(self, key, version, buffer, seconds=None):
+        """Store a rendered report; readers switch over when its metadata is replaced"""
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        file_name = f'{key}-{stamp}.pdf'
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+            while True:
+                chunk = buffer.read(1024 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+        os.replace(f.name, os.path.join(self.directory, file_name))
+        with tempfile.NamedTemporaryFile('w', dir=self.directory, delete=False) as f:
+            json.dump({'version': version, 'file': file_name, 'rendered_at': datetime.now().isoformat(timespec='seconds'),
+                       'render_seconds': seconds}, f)
+        os.replace(f.name, self._meta_path(key))
+        # Earlier renders of this report; a download that already opened one keeps its handle
+        for name in os.listdir(self.directory):
+            stamp = name[len(key) + 1:-len('.pdf')]
+            if name.startswith(f'{key}-') and name.endswith('.pdf') and stamp.isdigit() and name != file_name:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,154 @@
+# ======================== REQUEST PROFILER ========================
+"""On-demand sampling profiler for single live requests.
+
+A request carrying ``X-Profile: 1`` (or ``?_profile=1``) from an allowed user
+is sampled by a helper thread that reads the handling thread's stack via
+``sys._current_frames()`` every ``PROFILE_INTERVAL_MS``. When the request
+finishes the samples are written to ``PROFILE_DIR`` as a speedscope file
+(https://www.speedscope.app), tagged with the route, view arguments and
+query string. The response names the file in an ``X-Profile`` header.
+
+Only the flagged request is sampled and only one profile runs per worker at
+a time, so other requests are unaffected apart from the sampler's brief GIL
+hold on each tick.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import request
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._frames = {}   # (function, file, first line) -> index
+        self._samples = []  # stacks of frame indexes, root first
+        self._weights = []  # seconds each sample stands for
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._started = self._last = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self._frames.get(key)
+                if index is None:
+                    index = self._frames[key] = len(self._frames)
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            self._samples.append(stack)
+            self._weights.append(now - self._last)
+            self._last = now
+
+    def speedscope(self, name, metadata=None):
+        frames = [{'name': fn, 'file': path, 'line': line} for fn, path, line in self._frames]
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'workzen-profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(self.duration * 1000, 3),
+                'samples': self._samples,
+                'weights': [round(w * 1000, 3) for w in self._weights],
+            }],
+            'metadata': metadata or {},
+        }
+
+
+class RequestProfiler:
+    """Runs flagged requests under SamplingProfiler and saves the result"""
+
+    def __init__(self):
+        self._busy = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app, is_allowed):
+        """``is_allowed()`` runs inside the request and gates every profile"""
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        self.interval = float(app.config.get('PROFILE_INTERVAL_MS', 5)) / 1000
+        self.is_allowed = is_allowed
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _requested(self):
+        return request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'
+
+    def _before_request(self):
+        self._local.profile = None
+        if not self._requested() or not self.is_allowed():
+            return
+        # One profile per worker at a time; extra requests just run normally
+        if not self._busy.acquire(blocking=False):
+            return
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        file_name = f'{stamp}-{request.endpoint or "unmatched"}.speedscope.json'
+        profiler = SamplingProfiler(self.interval)
+        self._local.profile = (profiler, file_name)
+        profiler.start()
+
+    def _after_request(self, response):
+        profile = getattr(self._local, 'profile', None)
+        if profile is not None:
+            response.headers['X-Profile'] = profile[1]
+        return response
+
+    def _teardown_request(self, exc):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return
+        self._local.profile = None
+        profiler, file_name = profile
+        try:
+            profiler.stop()
+            name = f'{request.method} {request.full_path.rstrip("?")}'
+            metadata = {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'view_args': request.view_args or {},
+                'args': request.args.to_dict(flat=False),
+                'duration_ms': round(profiler.duration * 1000, 3),
+                'error': repr(exc) if exc else None,
+            }
+            with open(os.path.join(self.directory, file_name), 'w') as f:
+                json.dump(profiler.speedscope(name, metadata), f)
+        finally:
+            self._busy.release()
+
+    def list_profiles(self):
+        return sorted((f for f in os.listdir(self.directory) if f.endswith('.speedscope.json')), reverse=True)
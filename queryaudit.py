@@ -0,0 +1,137 @@
+# ======================== QUERY AUDIT ========================
+"""Opt-in N+1 and slow-query detection for development and staging.
+
+Statements are grouped per request by normalized SQL (literals and IN
+lists folded), so a lazy relationship loaded once per row shows up as one
+statement repeated N times. Repeats at or above ``QUERY_AUDIT_REPEAT`` and
+statements slower than ``QUERY_AUDIT_SLOW_MS`` are logged with the endpoint
+and the first application frame that issued them. Views can declare a
+budget with ``@query_audit.budget(n)``; with ``QUERY_AUDIT_STRICT`` a request
+over budget raises, which fails the test that made it.
+
+Nothing is hooked unless ``init_app`` runs, so production pays nothing.
+"""
+import os
+import re
+import threading
+import time
+import traceback
+from functools import wraps
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\([^()]*\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a view runs more statements than its budget."""
+
+
+def normalize(statement):
+    """Fold literals and IN lists so repeated lookups compare equal"""
+    sql = _STRING_RE.sub('?', statement)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (?)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def call_site():
+    """Innermost frame in this project (views, models or compiled templates)"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(ROOT) and 'site-packages' not in path and path != __file__:
+            return f'{os.path.relpath(path, ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryAudit:
+    """Per-request statement grouping with N+1, slow-query and budget checks"""
+
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.enabled = True
+        self.logger = app.logger
+        self.repeat_threshold = int(app.config.get('QUERY_AUDIT_REPEAT', 5))
+        self.slow_ms = float(app.config.get('QUERY_AUDIT_SLOW_MS', 100))
+        self.strict = bool(app.config.get('QUERY_AUDIT_STRICT'))
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def budget(self, max_queries):
+        """Declare how many statements a view may run per request"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if self.enabled:
+                    self._local.budget = max_queries
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    # ---------- request hooks ----------
+
+    def _before_request(self):
+        local = self._local
+        local.statements = {}  # normalized sql -> [count, total seconds, call site]
+        local.total = 0
+        local.budget = None
+
+    def _after_request(self, response):
+        local = self._local
+        statements = getattr(local, 'statements', None)
+        if statements is None:
+            return response
+        local.statements = None
+        route = f'{request.method} {request.path} ({request.endpoint})'
+
+        for sql, (count, seconds, site) in statements.items():
+            if count >= self.repeat_threshold:
+                self.logger.warning('N+1 suspected on %s: %d x %.1f ms total, from %s\n    %s',
+                                    route, count, seconds * 1000, site, sql)
+
+        if local.budget is not None and local.total > local.budget:
+            message = f'{route} ran {local.total} statements, budget is {local.budget}'
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            self.logger.warning('Query budget exceeded: %s', message)
+        return response
+
+    # ---------- SQL hooks ----------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('audit_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['audit_start'].pop()
+        statements = getattr(self._local, 'statements', None)
+        if statements is None:
+            return
+
+        self._local.total += 1
+        sql = normalize(statement)
+        entry = statements.get(sql)
+        if entry is None:
+            entry = statements[sql] = [0, 0.0, None]
+        entry[0] += 1
+        entry[1] += elapsed
+        # Walking the stack is costly; only do it for statements worth reporting
+        if entry[0] == self.repeat_threshold:
+            entry[2] = call_site()
+
+        if elapsed * 1000 >= self.slow_ms:
+            self.logger.warning('Slow query on %s %s (%s): %.1f ms, from %s\n    %s',
+                                request.method, request.path, request.endpoint,
+                                elapsed * 1000, call_site(), sql)
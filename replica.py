@@ -0,0 +1,146 @@
+# ======================== READ REPLICA ========================
+"""Optional read-replica routing for reporting and export traffic.
+
+With ``REPLICA_DATABASE_URL`` set, the replica is registered as the
+``replica`` bind. Views wrapped in ``replica_router.reads()`` send their
+SELECTs to it through ``RoutingSession``, while flushes and explicit DML
+still go to the primary. Before routing, the replica's health and
+replication lag are checked, and the result is cached for
+``REPLICA_CHECK_SECONDS``. Traffic stays on the primary when the replica
+is unreachable or further behind than the view's tolerance
+(``REPLICA_MAX_LAG_SECONDS`` by default). Lag is read from the standby on
+Postgres. Other databases, such as a second SQLite file in development,
+report zero lag.
+"""
+import threading
+import time
+from functools import wraps
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+BIND_KEY = 'replica'
+
+_PG_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class RoutingSession(Session):
+    """Session that reads from ``info['read_bind']`` while a routed view runs"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        read_bind = self.info.get('read_bind')
+        if (read_bind is not None and bind is None and not self._flushing
+                and not getattr(clause, 'is_dml', False)):
+            return read_bind
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Health-checked routing of read-only views to the replica bind"""
+
+    def __init__(self, db):
+        self.db = db
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._available = False
+        self._lag = None
+        self.routed = {'replica': 0, 'primary': 0}
+
+    def init_app(self, app):
+        self.enabled = BIND_KEY in (app.config.get('SQLALCHEMY_BINDS') or {})
+        self.max_lag = float(app.config.get('REPLICA_MAX_LAG_SECONDS', 30))
+        self.check_interval = float(app.config.get('REPLICA_CHECK_SECONDS', 5))
+        if self.enabled:
+            with app.app_context():
+                engine = self.db.engines[BIND_KEY]
+            # A connection error mid-query takes the replica out of rotation until the next check
+            event.listen(engine, 'handle_error', self._on_error)
+
+    # ---------- health ----------
+
+    def _on_error(self, context):
+        if context.is_disconnect or isinstance(context.original_exception, (OperationalError, InterfaceError)):
+            self.mark_down()
+
+    def mark_down(self):
+        with self._lock:
+            self._available = False
+            self._checked_at = time.monotonic()
+
+    def _probe(self, engine):
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    return True, float(conn.execute(_PG_LAG_SQL).scalar() or 0)
+                conn.execute(text('SELECT 1'))
+                return True, 0.0
+        except Exception:
+            return False, None
+
+    def status(self):
+        """(available, lag seconds), re-probed at most every check_interval"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            available, lag = self._probe(self.db.engines[BIND_KEY])
+            with self._lock:
+                self._available, self._lag, self._checked_at = available, lag, now
+        return self._available, self._lag
+
+    def engine_for_reads(self, max_lag=None):
+        """The replica engine if it may serve this read, else None"""
+        if not self.enabled:
+            return None
+        available, lag = self.status()
+        if not available or lag > (self.max_lag if max_lag is None else max_lag):
+            return None
+        return self.db.engines[BIND_KEY]
+
+    # ---------- routing ----------
+
+    def reads(self, max_lag=None):
+        """Route the view's reads to the replica, tolerating ``max_lag`` seconds of staleness"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                engine = self.engine_for_reads(max_lag)
+                self._count('replica' if engine is not None else 'primary')
+                if engine is None:
+                    return f(*args, **kwargs)
+
+                session = self.db.session
+                session.info['read_bind'] = engine
+                try:
+                    return f(*args, **kwargs)
+                except (OperationalError, InterfaceError):
+                    # Replica went away mid-request: retry once on the primary
+                    self.mark_down()
+                    session.rollback()
+                    session.info.pop('read_bind', None)
+                    self._count('primary')
+                    return f(*args, **kwargs)
+                finally:
+                    session.info.pop('read_bind', None)
+            return decorated_function
+        return decorator
+
+    def _count(self, target):
+        with self._lock:
+            self.routed[target] += 1
+
+    def metrics(self):
+        if not self.enabled:
+            return
+        available, lag = self._available, self._lag
+        with self._lock:
+            routed = dict(self.routed)
+        yield 'replica_available', 'gauge', 'Whether the last replica health check succeeded.', [({}, int(available))]
+        yield 'replica_lag_seconds', 'gauge', 'Replication lag seen by the last health check.', [({}, lag or 0)]
+        yield 'replica_routed_total', 'counter', 'Routed views served from the replica or the primary.', [
+            ({'target': target}, count) for target, count in sorted(routed.items())
+        ]
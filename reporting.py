@@ -0,0 +1,435 @@
+# ======================== PDF REPORTS ========================
+"""PDF rendering for the leave reports.
+
+Imported on first use from the report routes, so a worker that never builds
+a PDF does not pay ReportLab's import time or memory.
+
+Report rows arrive as iterators (the routes stream them with ``yield_per``)
+and are laid out as a sequence of ``CHUNK_ROWS``-row tables, each repeating
+the header. Cells are plain strings rather than ``Paragraph`` objects.
+ReportLab keeps every finished page in memory until the document is saved,
+so memory grows with the rows listed. Leave and table reports therefore list
+at most ``MAX_REPORT_ROWS`` rows and say so when rows were left out; the
+summary counts still cover every leave. ``benchmarks/bench_report_memory.py``
+checks that peak memory stops growing at the cap.
+"""
+import ssl
+import time
+from datetime import datetime
+from io import BytesIO
+from itertools import islice
+from urllib.request import Request, urlopen
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+MBIT_LOGO_URL = "https://www.mbit.edu.in/wp-content/uploads/2021/12/webMBIT-1@2x.png"
+CVM_LOGO_URL = "https://www.mbit.edu.in/wp-content/uploads/2020/02/CVM-CVMU.jpg"
+
+# Logo bytes per URL, fetched once per process instead of once per page.
+# Failures are remembered too (as None) and retried after LOGO_RETRY_SECONDS,
+# so an unreachable host costs one timeout rather than one per page.
+LOGO_RETRY_SECONDS = 300
+_image_cache = {}
+_styles = None
+
+CHUNK_ROWS = 250
+MAX_REPORT_ROWS = 5000
+
+
+# ---------- helpers ----------
+
+def get_image_from_url(url):
+    """Fetch an image safely (bypassing SSL errors); None if unavailable"""
+    data, fetched_at = _image_cache.get(url, (None, None))
+    if fetched_at is None or (data is None and time.monotonic() - fetched_at > LOGO_RETRY_SECONDS):
+        try:
+            # Create a context that doesn't verify SSL certificates (fixes common download issues)
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+
+            # Add a User-Agent header so the server doesn't block us
+            req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+            data = urlopen(req, context=ctx, timeout=10).read()
+        except Exception as e:
+            print(f"Error fetching image {url}: {e}")
+            data = None
+        _image_cache[url] = (data, time.monotonic())
+    return ImageReader(BytesIO(data)) if data else None
+
+
+def draw_institute_header(canvas, doc):
+    """Portrait header: MBIT logo, institute name, CVM logo and a rule"""
+    canvas.saveState()
+    page_width, page_height = A4
+
+    # Left Logo (MBIT)
+    logo_mbit = get_image_from_url(MBIT_LOGO_URL)
+    if logo_mbit:
+        canvas.drawImage(logo_mbit, 0.4*inch, page_height - 1.6*inch,
+                         width=2.5*inch, height=0.9*inch,
+                         mask='auto', preserveAspectRatio=True, anchor='w')
+    else:
+        # Fallback text
+        canvas.setFont('Helvetica-Oblique', 10)
+        canvas.drawString(0.5*inch, page_height - 1*inch, "MBIT")
+
+    # Right Logo (CVM)
+    logo_cvm = get_image_from_url(CVM_LOGO_URL)
+    if logo_cvm:
+        canvas.drawImage(logo_cvm, page_width - 1.8*inch, page_height - 1.6*inch,
+                         width=1.3*inch, height=1.3*inch,
+                         mask='auto', preserveAspectRatio=True, anchor='e')
+
+    # Center Text
+    canvas.setFont('Helvetica-Bold', 14)
+    canvas.setFillColor(colors.HexColor('#1f2937'))
+    center_x = page_width / 2.0
+    text_y = page_height - 0.8*inch
+
+    canvas.drawCentredString(center_x, text_y, "Madhuben & Bhanubhai Patel")
+    canvas.drawCentredString(center_x, text_y - 18, "Institute of Technology")
+
+    canvas.setFont('Helvetica', 10)
+    canvas.setFillColor(colors.HexColor('#6b7280'))
+    canvas.drawCentredString(center_x, text_y - 35, "(The Charutar Vidya Mandal (CVM) University)")
+
+    # Separator Line
+    canvas.setStrokeColor(colors.HexColor('#e5e7eb'))
+    canvas.setLineWidth(1)
+    canvas.line(0.5*inch, page_height - 1.8*inch, page_width - 0.5*inch, page_height - 1.8*inch)
+
+    canvas.restoreState()
+
+
+def _leave_report_styles():
+    global _styles
+    if _styles is None:
+        styles = getSampleStyleSheet()
+        heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#208099'), spaceAfter=12, spaceBefore=12)
+        normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=10, spaceAfter=6)
+        _styles = (heading_style, normal_style)
+    return _styles
+
+
+def _chunked_tables(header, rows, col_widths, style):
+    """One Table per CHUNK_ROWS rows, each repeating the header row across page breaks"""
+    chunk = [header]
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) > CHUNK_ROWS:
+            yield _table(chunk, col_widths, style)
+            chunk = [header]
+    if len(chunk) > 1:
+        yield _table(chunk, col_widths, style)
+
+
+def _table(data, col_widths, style):
+    table = Table(data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(style)
+    return table
+
+
+def _capped(rows):
+    """(up to MAX_REPORT_ROWS rows as a list, whether there were more)"""
+    rows = iter(rows)
+    listed = list(islice(rows, MAX_REPORT_ROWS))
+    return listed, next(rows, None) is not None
+
+
+def _truncation_note(listed, total, style):
+    of_total = f' of {total:,}' if total else ''
+    return Paragraph(f'<b>Showing the first {listed:,}{of_total} rows.</b> '
+                     f'Narrow the report to see the rest.', style)
+
+
+def warm_up():
+    """Build styles and fetch logos now, e.g. in a pre-fork master"""
+    _leave_report_styles()
+    for url in (MBIT_LOGO_URL, CVM_LOGO_URL):
+        get_image_from_url(url)
+
+
+def logo_cache():
+    """Logo bytes (None if unavailable) by URL, fetched here once for handing to worker processes"""
+    warm_up()
+    return {url: data for url, (data, fetched_at) in _image_cache.items()}
+
+
+def use_logo_cache(cache):
+    """Process pool initializer: start from the parent's logos instead of fetching them again"""
+    now = time.monotonic()
+    _image_cache.update({url: (data, now) for url, data in cache.items()})
+
+
+# ---------- leave reports (portrait) ----------
+
+def build_leave_report(leaves, counts, user, title, summary_labels, empty_message,
+                       filters=None, footer_note=''):
+    """Render the leave report used by the full and filtered report routes.
+
+    leaves may be any iterable and is read once; counts maps status to the
+    number of leaves (the summary precedes the rows, so it is counted in SQL).
+    user is None for reports rendered ahead of time.
+    summary_labels names the Total/Pending/Approved/Rejected rows; filters is
+    an optional list of "Label: value" strings shown under the title.
+    """
+    total_leaves = sum(counts.values())
+    pending_leaves = counts.get('Pending', 0)
+    approved_leaves = counts.get('Approved', 0)
+    rejected_leaves = counts.get('Rejected', 0)
+
+    pdf_buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        pdf_buffer,
+        pagesize=A4,
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=2.2*inch,  # Space for Header
+        bottomMargin=0.75*inch,
+        title=title
+    )
+
+    story = []
+    heading_style, normal_style = _leave_report_styles()
+
+    # Report Title
+    story.append(Paragraph(title, heading_style))
+    story.append(Paragraph(f'Generated on {datetime.now().strftime("%d %B %Y at %H:%M:%S")}', normal_style))
+    if filters:
+        story.append(Paragraph(f"<b>Filters:</b> {', '.join(filters)}", normal_style))
+    story.append(Spacer(1, 0.2*inch))
+
+    # Summary Statistics
+    story.append(Paragraph('Summary Statistics', heading_style))
+    summary_data = [['Metric', 'Count']] + [
+        [label, str(value)] for label, value in
+        zip(summary_labels, [total_leaves, pending_leaves, approved_leaves, rejected_leaves])
+    ]
+
+    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f0f0')])
+    ]))
+
+    story.append(summary_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Detailed Leave Records
+    story.append(Paragraph('Detailed Leave Records', heading_style))
+
+    def rows():
+        for leave in leaves:
+            if leave.requester:
+                name = getattr(leave.requester, 'full_name', None) or leave.requester.email.split('@')[0]
+                emp_details = f"{name}\n{leave.requester.email}"
+            else:
+                emp_details = 'N/A'
+
+            yield [
+                emp_details,
+                leave.leave_type,
+                leave.start_date.strftime('%d/%m/%Y'),
+                leave.end_date.strftime('%d/%m/%Y'),
+                str(leave.number_of_days),
+                leave.status,
+                leave.reason[:30] + '...' if leave.reason and len(leave.reason) > 30 else leave.reason or 'N/A'
+            ]
+
+    leave_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
+    ])
+    header = ['Employee', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Status', 'Reason']
+    col_widths = [2.0*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.9*inch, 1.4*inch]
+
+    # Footer (no user when the report was precomputed)
+    generated_by = f"Generated by: {user.email}<br/>Role: {user.role}" if user else "Generated by: scheduled report run"
+    footer_text = f"""
+    <b>Report Information:</b><br/>
+    {generated_by}<br/>
+    <br/>
+    {footer_note}
+    """
+
+    if total_leaves:
+        listed, truncated = _capped(rows())
+        if truncated:
+            story.append(_truncation_note(len(listed), total_leaves, normal_style))
+        story.extend(_chunked_tables(header, listed, col_widths, leave_style))
+    else:
+        story.append(Paragraph(empty_message, normal_style))
+    story.append(Spacer(1, 0.5*inch))
+    story.append(Paragraph(footer_text, normal_style))
+
+    # BUILD PDF
+    doc.build(story, onFirstPage=draw_institute_header, onLaterPages=draw_institute_header)
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+# ---------- student dossiers (portrait) ----------
+
+def build_student_dossier(student, period):
+    """One student's term dossier as PDF bytes.
+
+    student is the plain dict built by dossier.load (picklable, so this runs
+    in a worker process); period is the human-readable term, e.g. "Jun 2026 - Nov 2026".
+    """
+    heading_style, normal_style = _leave_report_styles()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=0.5*inch, leftMargin=0.5*inch,
+                            topMargin=2.2*inch, bottomMargin=0.75*inch,
+                            title=f"Dossier - {student['full_name'] or student['email']}")
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#208099')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
+    ])
+
+    def section(title, header, rows, col_widths, empty_message):
+        story.append(Paragraph(title, heading_style))
+        if rows:
+            story.extend(_chunked_tables(header, rows, col_widths, style))
+        else:
+            story.append(Paragraph(empty_message, normal_style))
+        story.append(Spacer(1, 0.2*inch))
+
+    story = [
+        Paragraph('Student Dossier', heading_style),
+        Paragraph(f"<b>{student['full_name'] or 'N/A'}</b> ({student['email']})", normal_style),
+        Paragraph(f"<b>Counselor:</b> {student['counselor'] or 'N/A'}", normal_style),
+        Paragraph(f"<b>Period:</b> {period}", normal_style),
+        Paragraph(f'Generated on {datetime.now().strftime("%d %B %Y at %H:%M:%S")}', normal_style),
+        Spacer(1, 0.2*inch),
+    ]
+
+    months = student['attendance']
+    present = sum(p for _, _, p, _ in months)
+    absent = sum(a for _, _, _, a in months)
+    attendance_rows = [[label, str(p), str(a), f'{p * 100 / (p + a):.1f}%' if p + a else '-']
+                       for _, label, p, a in months]
+    if months:
+        attendance_rows.append(['Total', str(present), str(absent),
+                                f'{present * 100 / (present + absent):.1f}%' if present + absent else '-'])
+    section('Attendance', ['Month', 'Present', 'Absent', 'Attendance'], attendance_rows,
+            [2*inch, 1.2*inch, 1.2*inch, 1.4*inch], 'No attendance recorded in this period.')
+
+    leaves = student['leaves']
+    section('Leave Requests', ['Type', 'Start Date', 'End Date', 'Days', 'Status', 'Reason'], [[
+        leave['leave_type'],
+        leave['start_date'].strftime('%d/%m/%Y'),
+        leave['end_date'].strftime('%d/%m/%Y'),
+        str(leave['number_of_days'] or ''),
+        leave['status'],
+        leave['reason'][:40] + '...' if leave['reason'] and len(leave['reason']) > 40 else leave['reason'] or 'N/A'
+    ] for leave in leaves], [1*inch, 1*inch, 1*inch, 0.6*inch, 0.9*inch, 2.7*inch], 'No leave requests in this period.')
+
+    section('Attached Documents', ['Leave', 'File', 'Type', 'Size'], [[
+        f"{leave['leave_type']} {leave['start_date'].strftime('%d/%m/%Y')}",
+        document['file_name'],
+        document['document_type'] or 'N/A',
+        f"{(document['file_size'] or 0) / 1024:.0f} KB"
+    ] for leave in leaves for document in leave['documents']],
+        [1.8*inch, 3*inch, 1.3*inch, 1*inch], 'No documents attached.')
+
+    section('Achievements', ['Date', 'Title', 'Description'], [[
+        achievement['created_at'].strftime('%d/%m/%Y') if achievement['created_at'] else 'N/A',
+        achievement['title'],
+        achievement['description'][:60] + '...' if len(achievement['description'] or '') > 60
+        else achievement['description'] or ''
+    ] for achievement in student['achievements']], [1*inch, 2.4*inch, 3.8*inch], 'No achievements in this period.')
+
+    doc.build(story, onFirstPage=draw_institute_header, onLaterPages=draw_institute_header)
+    return buffer.getvalue()
+
+
+# ---------- tabular reports (landscape) ----------
+
+def build_table_report(report_type, table_headers, table_data):
+    """Landscape report with the base.html-style header; table_data may be any iterable of rows"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), topMargin=1.5*inch)
+    elements = []
+
+    # Header Function (Draws Logos & Text)
+    def draw_header(canvas, doc):
+        canvas.saveState()
+        width, height = doc.pagesize
+        logo_width = 1.2 * inch
+        logo_height = 1.0 * inch
+        margin = 30
+
+        # Left Logo (MBIT)
+        logo_mbit = get_image_from_url(MBIT_LOGO_URL)
+        if logo_mbit:
+            canvas.drawImage(logo_mbit, margin, height - logo_height - margin,
+                             width=logo_width, height=logo_height, mask='auto')
+
+        # Center Text
+        text_y = height - margin - 30
+        canvas.setFont("Helvetica-Bold", 16)
+        canvas.drawCentredString(width / 2, text_y, "Madhuben & Bhanubhai Patel Institute of Technology")
+        canvas.setFont("Helvetica", 12)
+        canvas.drawCentredString(width / 2, text_y - 20, "(The Charutar Vidya Mandal (CVM) University)")
+        canvas.setFont("Helvetica-Bold", 14)
+        canvas.drawCentredString(width / 2, text_y - 45, f"{report_type.upper()} REPORT")
+
+        # Right Logo (CVM)
+        logo_cvm = get_image_from_url(CVM_LOGO_URL)
+        if logo_cvm:
+            canvas.drawImage(logo_cvm, width - logo_width - margin, height - logo_height - margin,
+                             width=logo_width, height=logo_height, mask='auto')
+
+        # Line
+        canvas.setStrokeColor(colors.black)
+        canvas.line(margin, height - logo_height - margin - 10, width - margin, height - logo_height - margin - 10)
+        canvas.restoreState()
+
+    # Build Table
+    # Adjusted column widths for landscape
+    col_widths = [2*inch, 2.5*inch, 1.2*inch, 1.2*inch, 1.2*inch, 0.8*inch, 1*inch]
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 1), (1, -1), 'LEFT'),  # Left align Name/Email
+    ])
+
+    listed, truncated = _capped(table_data)
+    if truncated:
+        elements.append(_truncation_note(len(listed), None, _leave_report_styles()[1]))
+    # Header row only, as before when there was no data
+    elements.extend(_chunked_tables(table_headers, listed, col_widths, style) if listed
+                    else [_table([table_headers], col_widths, style)])
+    doc.build(elements, onFirstPage=draw_header, onLaterPages=draw_header)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,246 @@
+# ======================== DATA GENERATOR ========================
+"""Deterministic, production-scale test data.
+
+``generate`` fills an empty database with an HOD, counselors, students
+assigned round-robin to counselors, per-year leave balances, leaves, their
+supporting documents and daily attendance. Each table draws from its own
+``random.Random`` derived from the seed, so the same seed and sizes always
+produce identical rows, and resizing one table leaves the others unchanged.
+
+Rows are generated a batch at a time, column by column (``choices(k=n)``
+runs in C), and loaded with the driver's executemany, or COPY on Postgres,
+bypassing the ORM. Absences line up with approved leave and balances
+with approved days, so reports built on the data add up.
+"""
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+LEAVE_TYPES = ['Sick Leave', 'Culture', 'Sports', 'Academic', 'Events']
+LEAVE_TYPE_WEIGHTS = [45, 15, 15, 15, 10]
+DURATIONS = [1, 2, 3, 4, 5, 7]
+DURATION_WEIGHTS = [40, 25, 15, 8, 8, 4]
+# Relative leave volume by month (Jan..Dec): festival season and exams peak
+MONTH_WEIGHTS = [8, 7, 9, 10, 6, 5, 6, 8, 9, 14, 12, 10]
+REASONS = {
+    'Sick Leave': ['Fever and cold', 'Viral infection', 'Stomach infection', 'Migraine', 'Dental treatment'],
+    'Culture': ['Cultural fest performance', 'Drama rehearsal', 'Music competition'],
+    'Sports': ['Inter-college cricket', 'State athletics meet', 'Football tournament'],
+    'Academic': ['Hackathon', 'Paper presentation', 'Industrial visit', 'Workshop'],
+    'Events': ['Family wedding', 'Religious ceremony', 'Community event'],
+}
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nirav', 'Priya', 'Rohan', 'Sneha', 'Vivaan',
+               'Aditi', 'Dhruv', 'Hetvi', 'Jay', 'Krupa', 'Manan', 'Nisha', 'Parth', 'Riya', 'Yash']
+LAST_NAMES = ['Patel', 'Shah', 'Desai', 'Mehta', 'Joshi', 'Trivedi', 'Parmar', 'Modi', 'Rana', 'Bhatt',
+              'Chauhan', 'Dave', 'Gandhi', 'Pandya', 'Solanki', 'Vyas']
+STUDENTS_PER_COUNSELOR = 50
+BATCH = 50000
+
+
+def _rng(seed, table):
+    return random.Random(f'{seed}:{table}')
+
+
+def _load(conn, table, columns, rows):
+    """Bulk-insert a batch of tuples with the fastest path the driver offers"""
+    if conn.dialect.name == 'postgresql':
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    else:
+        if conn.dialect.name == 'sqlite':
+            # SQLite compares timestamps as text: store them the way the ORM does
+            # (always with microseconds), or keyset cursors mis-order equal times
+            rows = [tuple(v.strftime('%Y-%m-%d %H:%M:%S.%f') if isinstance(v, datetime) else v for v in row)
+                    for row in rows]
+        marks = ', '.join('?' if conn.dialect.paramstyle == 'qmark' else '%s' for _ in columns)
+        conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows)
+
+
+def _batches(total):
+    for start in range(0, total, BATCH):
+        yield start, min(BATCH, total - start)
+
+
+def _working_days(until, days):
+    """The last ``days`` Monday-Saturday dates up to ``until``, oldest first"""
+    out, current = [], until
+    while len(out) < days:
+        if current.weekday() != 6:
+            out.append(current)
+        current -= timedelta(days=1)
+    return out[::-1]
+
+
+def generate(engine, password_hash, students=10000, leaves_per_student=20,
+             attendance_days=200, documents_ratio=0.3, until=date(2026, 6, 30), seed=42, log=print):
+    """Fill an empty database; returns {table: rows inserted}"""
+    with engine.connect() as conn:
+        existing = conn.execute(text('SELECT COUNT(*) FROM users')).scalar()
+    if existing:
+        raise ValueError(f'seed expects an empty database, found {existing} users')
+
+    counselors = max(1, -(-students // STUDENTS_PER_COUNSELOR))
+    first_student = 2 + counselors
+    span_days = 730
+    first_day = until - timedelta(days=span_days - 1)
+    now = datetime.combine(until, datetime.min.time()) + timedelta(hours=18)
+    counts = {}
+
+    def timed(table, fn):
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            counts[table] = fn(conn)
+        log(f'{table:16s} {counts[table]:>10,} rows  {time.perf_counter() - started:6.1f}s')
+
+    # ---------- users ----------
+    def users(conn):
+        rng = _rng(seed, 'users')
+        cols = ('id', 'email', 'password', 'role', 'full_name', 'counselor_id')
+        rows = [(1, 'hod@mbit.edu.in', password_hash, 'HOD', 'Head of Department', None)]
+        rows += [(2 + i, f'counselor{i + 1}@mbit.edu.in', password_hash, 'COUNSELOR',
+                  f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', None) for i in range(counselors)]
+        _load(conn, 'users', cols, rows)
+        for start, n in _batches(students):
+            firsts = rng.choices(FIRST_NAMES, k=n)
+            lasts = rng.choices(LAST_NAMES, k=n)
+            _load(conn, 'users', cols, [
+                (first_student + i, f'{f.lower()}.{l.lower()}{i}@mbit.edu.in', password_hash, 'STUDENT',
+                 f'{f} {l}', 2 + i % counselors)
+                for i, f, l in zip(range(start, start + n), firsts, lasts)
+            ])
+        return len(rows) + students
+
+    # ---------- leaves ----------
+    day_weights = [MONTH_WEIGHTS[(first_day + timedelta(days=d)).month - 1]
+                   * (0.3 if (first_day + timedelta(days=d)).weekday() == 6 else 1.0)
+                   for d in range(span_days)]
+    approved_days = {}   # (student, leave type, year) -> approved days
+    on_leave = set()     # (student, date) covered by approved leave
+
+    def leaves(conn):
+        rng = _rng(seed, 'leaves')
+        total = students * leaves_per_student
+        cols = ('id', 'user_id', 'leave_type', 'start_date', 'end_date', 'reason', 'status',
+                'approved_by', 'number_of_days', 'created_at', 'updated_at')
+        for start, n in _batches(total):
+            owners = rng.choices(range(students), k=n)
+            offsets = rng.choices(range(span_days), weights=day_weights, k=n)
+            durations = rng.choices(DURATIONS, weights=DURATION_WEIGHTS, k=n)
+            types = rng.choices(LEAVE_TYPES, weights=LEAVE_TYPE_WEIGHTS, k=n)
+            lead_days = rng.choices(range(1, 21), k=n)
+            draws = [rng.random() for _ in range(n)]
+            reason_picks = [rng.random() for _ in range(n)]
+            rows = []
+            for i in range(n):
+                student = first_student + owners[i]
+                begin = first_day + timedelta(days=offsets[i])
+                days = durations[i]
+                created = datetime.combine(begin, datetime.min.time()) - timedelta(days=lead_days[i], hours=-10)
+                # Recent requests are still waiting; older ones were decided
+                age = (until - begin).days
+                if age < 14 and draws[i] < 0.6:
+                    status = 'Pending'
+                elif draws[i] < 0.82:
+                    status = 'Approved'
+                else:
+                    status = 'Rejected'
+                decided = created if status == 'Pending' else min(created + timedelta(days=2), now)
+                options = REASONS[types[i]]
+                rows.append((start + i + 1, student, types[i], begin, begin + timedelta(days=days - 1),
+                             options[int(reason_picks[i] * len(options))], status,
+                             2 + owners[i] % counselors, days, created, decided))
+                if status == 'Approved':
+                    key = (student, types[i], begin.year)
+                    approved_days[key] = approved_days.get(key, 0) + days
+                    for d in range(days):
+                        on_leave.add((student, begin + timedelta(days=d)))
+            _load(conn, 'leaves', cols, rows)
+        return total
+
+    # ---------- leave documents ----------
+    def documents(conn):
+        rng = _rng(seed, 'leave_documents')
+        total_leaves = students * leaves_per_student
+        cols = ('leave_id', 'user_id', 'file_url', 'file_size', 'file_name', 'document_type',
+                'created_at', 'updated_at')
+        # Re-derive owner/type per leave id from the stored rows rather than keeping them in memory
+        inserted = 0
+        for start, n in _batches(total_leaves):
+            rows = conn.execute(text(
+                'SELECT id, user_id, leave_type, created_at FROM leaves WHERE id > :lo AND id <= :hi ORDER BY id'
+            ), {'lo': start, 'hi': start + n}).all()
+            draws = [rng.random() for _ in rows]
+            sizes = rng.choices(range(80_000, 2_000_000, 1000), k=len(rows))
+            batch = []
+            for (leave_id, user_id, leave_type, created), draw, size in zip(rows, draws, sizes):
+                ratio = documents_ratio * (1.5 if leave_type == 'Sick Leave' else 0.5)
+                if draw < ratio:
+                    doc_type = 'Medical Certificate' if leave_type == 'Sick Leave' else 'Supporting Document'
+                    name = f'leave_{leave_id}_{user_id}.pdf'
+                    batch.append((leave_id, user_id, f'/uploads/leave_documents/{name}', size, name,
+                                  doc_type, created, created))
+            if batch:
+                _load(conn, 'leave_documents', cols, batch)
+                inserted += len(batch)
+        return inserted
+
+    # ---------- leave balances ----------
+    def balances(conn):
+        cols = ('user_id', 'leave_type', 'total_days', 'used_days', 'remaining_days', 'year', 'created_at')
+        years = sorted({first_day.year, until.year})
+        rows = []
+        for i in range(students):
+            student = first_student + i
+            for year in years:
+                created = datetime(year, 1, 1)
+                for leave_type in LEAVE_TYPES:
+                    used = approved_days.get((student, leave_type, year), 0)
+                    # Same "unlimited" allowance apply_leave creates
+                    rows.append((student, leave_type, 9999, used, 9999 - used, year, created))
+        for start, n in _batches(len(rows)):
+            _load(conn, 'leave_balance', cols, rows[start:start + n])
+        return len(rows)
+
+    # ---------- attendance ----------
+    days = _working_days(until, attendance_days)
+
+    def attendance(conn):
+        rng = _rng(seed, 'attendance')
+        cols = ('user_id', 'attendance_date', 'status', 'remarks', 'created_at')
+        stamps = [datetime.combine(d, datetime.min.time()) + timedelta(hours=9, minutes=30) for d in days]
+        total = 0
+        per_batch = max(1, BATCH // len(days))
+        for start in range(0, students, per_batch):
+            students_here = range(first_student + start, first_student + min(students, start + per_batch))
+            draws = rng.choices(range(100), k=len(students_here) * len(days))
+            rows, k = [], 0
+            for student in students_here:
+                for day, stamp in zip(days, stamps):
+                    if (student, day) in on_leave:
+                        rows.append((student, day, 'Absent', 'On approved leave', stamp))
+                    else:
+                        rows.append((student, day, 'Present' if draws[k] < 92 else 'Absent', None, stamp))
+                    k += 1
+            _load(conn, 'attendance', cols, rows)
+            total += len(rows)
+        return total
+
+    timed('users', users)
+    timed('leaves', leaves)
+    timed('leave_documents', documents)
+    timed('leave_balance', balances)
+    timed('attendance', attendance)
+
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            for table in ('users', 'leaves', 'leave_documents', 'leave_balance', 'attendance'):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                  f"COALESCE((SELECT MAX(id) FROM {table}), 1))"))
+    return counts
@@ -0,0 +1,304 @@
+# ======================== USER CACHE ========================
+"""Cross-request cache for users, the counselor list and counselor cohorts.
+
+Almost every request resolves the same reference data: the signed-in user
+(``role_required`` and then the view itself), the counselors in
+``apply_leave`` and a counselor's student ids for the time-off and report
+pages. ``UserCache.get(key, load)`` answers these from two tiers:
+
+* L1 is an LRU ``OrderedDict`` in the worker process. It holds at most
+  ``USER_CACHE_MAX_ENTRIES`` values, each for up to
+  ``USER_CACHE_TTL_SECONDS``.
+* L2 is an optional SQLite file in ``USER_CACHE_DIR``, shared by every worker
+  on the host that uses the same database. The file is named after
+  ``DATABASE_NAMESPACE``, so an app pointed at another database on the same
+  host cannot read these rows. Values are stored as JSON and given back through ``decode``,
+  so a worker whose L1 is cold, for example just after a restart, fills it
+  without touching the database.
+
+Values are immutable snapshots (tuples), never ORM objects, so they cannot
+be tied to a session. ``invalidate(*keys)`` drops keys from both tiers
+straight away and appends them to an ``invalidations`` log in L2. Each
+worker reads that log at most every ``USER_CACHE_SYNC_SECONDS``, before a
+request runs, and evicts the same keys from its own L1. ``clear()`` does
+the same for everything, e.g. after bulk imports. A value loaded while one
+of its keys was being invalidated is used for that request but not stored,
+so a stale read cannot outlive the invalidation. Without L2, the other
+workers only notice a change once their copy expires.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+CLEAR_ALL = '*'
+PRUNE_EVERY_SECONDS = 3600
+LOG_RETENTION_SECONDS = 3600
+
+
+def _footprint(value):
+    """Approximate bytes held by a cached snapshot (tuples/lists of scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(_footprint(item) for item in value)
+    return size
+
+
+class UserCache:
+    """Two-tier TTL/LRU cache with explicit, cross-worker invalidation"""
+
+    def __init__(self):
+        self.enabled = False
+        self.shared = False
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._entries = OrderedDict()  # key -> (value, expires, bytes)
+        self._bytes = 0
+        self._epoch = 0        # bumped by every local eviction; guards fills racing an invalidation
+        self._seen = None      # newest invalidation log id applied to L1
+        self._synced_at = 0.0
+        self._pruned_at = 0.0
+        self.counts = {'l1': 0, 'l2': 0, 'miss': 0}
+        self.evicted = 0
+        self.invalidated = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('USER_CACHE', True)
+        self.ttl = float(app.config.get('USER_CACHE_TTL_SECONDS', 300))
+        self.max_entries = int(app.config.get('USER_CACHE_MAX_ENTRIES', 5000))
+        self.sync_seconds = float(app.config.get('USER_CACHE_SYNC_SECONDS', 1))
+        self.directory = app.config.get('USER_CACHE_DIR')
+        self.shared = bool(self.enabled and self.directory)
+        if not self.shared:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"users-{app.config['DATABASE_NAMESPACE']}.sqlite3")
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS invalidations '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, created REAL NOT NULL)')
+            self._seen = self._log_head(conn)
+        finally:
+            conn.close()
+        app.before_request(self._before_request)
+
+    def after_fork(self):
+        # The lock may have been held by another thread at fork time
+        self._lock = threading.Lock()
+
+    # ---------- lookups ----------
+
+    def get(self, key, load, decode=None):
+        """Cached value of key, calling ``load()`` on a miss; ``decode`` rebuilds a value read back from L2"""
+        if not self.enabled:
+            return load()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.counts['l1'] += 1
+                return entry[0]
+            epoch = self._epoch
+
+        seen = None
+        if self.shared:
+            try:
+                found, value, seen = self._l2_get(key)
+            except sqlite3.Error:
+                self.app.logger.exception('User cache store unavailable; reading through')
+                found = False
+            if found:
+                value = decode(value) if decode else value
+                self._l1_put(key, value, epoch)
+                with self._lock:
+                    self.counts['l2'] += 1
+                return value
+
+        value = load()
+        with self._lock:
+            self.counts['miss'] += 1
+        if value is None:
+            return None  # unknown ids are not cached
+        if self._l1_put(key, value, epoch) and seen is not None:
+            try:
+                self._l2_put(key, value, seen)
+            except sqlite3.Error:
+                self.app.logger.exception('User cache store unavailable; not sharing %s', key)
+        return value
+
+    def _l1_put(self, key, value, epoch):
+        """Store unless something was evicted since the caller read epoch; True when stored"""
+        size = _footprint(value)
+        with self._lock:
+            if self._epoch != epoch:
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                _, (_, _, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evicted += 1
+            return True
+
+    def _evict(self, keys):
+        with self._lock:
+            self._epoch += 1
+            if CLEAR_ALL in keys:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for key in keys:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[2]
+
+    # ---------- shared store ----------
+
+    def _connect(self):
+        return sqlite3.connect(self._path, timeout=2, isolation_level=None)
+
+    @staticmethod
+    def _log_head(conn):
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM invalidations').fetchone()[0]
+
+    def _l2_get(self, key):
+        """(found, value, log head); the head is read first so a later invalidation blocks the refill"""
+        conn = self._connect()
+        try:
+            seen = self._log_head(conn)
+            row = conn.execute('SELECT value FROM entries WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+            return (True, json.loads(row[0]), seen) if row else (False, None, seen)
+        finally:
+            conn.close()
+
+    def _l2_put(self, key, value, seen):
+        conn = self._connect()
+        try:
+            # Skipped when key (or everything) was invalidated after the value was loaded
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires) SELECT ?, ?, ? '
+                'WHERE NOT EXISTS (SELECT 1 FROM invalidations WHERE id > ? AND key IN (?, ?))',
+                (key, json.dumps(value), time.time() + self.ttl, seen, key, CLEAR_ALL))
+        finally:
+            conn.close()
+
+    def _before_request(self):
+        if request.endpoint == 'static' or time.monotonic() - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = time.monotonic()
+        try:
+            self.sync()
+        except sqlite3.Error:
+            self.app.logger.exception('User cache store unavailable; clearing this worker')
+            self._evict([CLEAR_ALL])
+
+    def sync(self):
+        """Apply invalidations other workers logged since the last sync"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT id, key FROM invalidations WHERE id > ? ORDER BY id', (self._seen,)).fetchall()
+            now = time.time()
+            if now - self._pruned_at > PRUNE_EVERY_SECONDS:
+                # Workers sync every few seconds; one that idled longer clears itself (below)
+                self._pruned_at = now
+                conn.execute('DELETE FROM invalidations WHERE created < ? AND id < (SELECT MAX(id) FROM invalidations)',
+                             (now - LOG_RETENTION_SECONDS,))
+                conn.execute('DELETE FROM entries WHERE expires < ?', (now,))
+        finally:
+            conn.close()
+        if not rows:
+            return
+        # Ids are consecutive, so a gap means rows were pruned before this worker read them
+        keys = {CLEAR_ALL} if rows[0][0] > self._seen + 1 else {key for _, key in rows}
+        self._seen = rows[-1][0]
+        self._evict(keys)
+
+    # ---------- invalidation ----------
+
+    def invalidate(self, *keys):
+        """Drop keys here and in L2, and tell the other workers"""
+        keys = [key for key in keys if key is not None]
+        if not keys or not self.enabled:
+            return
+        self._evict(keys)
+        with self._lock:
+            self.invalidated += len(keys)
+        if not self.shared:
+            return
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                now = time.time()
+                conn.executemany('INSERT INTO invalidations (key, created) VALUES (?, ?)', [(key, now) for key in keys])
+                if CLEAR_ALL in keys:
+                    conn.execute('DELETE FROM entries')
+                else:
+                    conn.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Other workers keep their copies until the TTL runs out
+            self.app.logger.exception('User cache store unavailable; invalidation of %s not shared', keys)
+
+    def clear(self):
+        """Drop everything on every worker, e.g. after users were written below the ORM"""
+        self.invalidate(CLEAR_ALL)
+
+    # ---------- introspection ----------
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            entries, size = len(self._entries), self._bytes
+        lookups = sum(counts.values())
+        store_bytes = None
+        if self.shared:
+            try:
+                store_bytes = sum(os.path.getsize(self._path + suffix)
+                                  for suffix in ('', '-wal') if os.path.exists(self._path + suffix))
+            except OSError:
+                pass
+        return {
+            'enabled': self.enabled,
+            'shared': self.shared,
+            'lookups': counts,
+            'hit_ratio': round((counts['l1'] + counts['l2']) / (lookups or 1), 3),
+            'l1_hit_ratio': round(counts['l1'] / (lookups or 1), 3),
+            'entries': entries,
+            'bytes': size,
+            'store_bytes': store_bytes,
+            'evicted': self.evicted,
+            'invalidated': self.invalidated,
+        }
+
+    def metrics(self):
+        if not self.enabled:
+            return
+        stats = self.stats()
+        yield 'user_cache_lookups_total', 'counter', 'User cache lookups by the tier that answered (miss: database).', [
+            ({'tier': tier}, count) for tier, count in sorted(stats['lookups'].items())
+        ]
+        yield 'user_cache_hit_ratio', 'gauge', 'Share of user cache lookups answered by L1 or L2.', [({}, stats['hit_ratio'])]
+        yield 'user_cache_entries', 'gauge', 'Values held in this worker\'s L1.', [({}, stats['entries'])]
+        yield 'user_cache_bytes', 'gauge', 'Approximate memory held by this worker\'s L1.', [({}, stats['bytes'])]
+        if stats['store_bytes'] is not None:
+            yield 'user_cache_store_bytes', 'gauge', 'Size of the shared L2 file.', [({}, stats['store_bytes'])]
+        yield 'user_cache_evicted_total', 'counter', 'L1 values dropped to stay under the size limit.', [({}, stats['evicted'])]
+        yield 'user_cache_invalidated_total', 'counter', 'Keys invalidated by this worker.', [({}, stats['invalidated'])]
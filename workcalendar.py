@@ -0,0 +1,167 @@
+# ======================== WORKING-DAY CALENDAR ========================
+"""Working days between two dates, as one subtraction.
+
+A day is a working day unless its weekday is in ``WEEKEND_DAYS`` or it is
+listed in the ``holidays`` table. For each academic year in use,
+``WorkCalendar`` builds a prefix array where entry ``i`` counts the working
+days before the year's ``i``-th day. Any range inside one year is then
+``prefix[end + 1] - prefix[start]``, and a range that crosses years adds
+one such difference per year. An array is built from a single holiday
+query the first time its year is asked for, and costs about 750 bytes.
+
+Leaves store their working days in ``number_of_days`` (``apply_leave``,
+``approve_leave``), so the time-off pages, reports, dossiers and balances
+all read the calendar's figure. Holiday edits go through
+``flask holidays``, which bumps the ``calendar`` data version and then
+``recount``s the leaves they affect. Each worker compares that version at
+most every ``CHECK_SECONDS`` and drops its arrays when it has moved. The
+write paths ask for a ``fresh`` count, which compares it first, so a leave
+applied just after a holiday import is counted against the new holidays.
+
+Requested ranges go through ``check_range`` first. It accepts at most
+``MAX_SPAN_DAYS``, within the academic years next to the current one, so a
+request cannot make a worker build and keep arrays for arbitrary years.
+"""
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+
+from sqlalchemy import and_, bindparam, select
+
+CHECK_SECONDS = 60
+BATCH = 5000
+MAX_SPAN_DAYS = 366
+YEARS_AROUND = 1  # academic years before and after the current one that leave may fall in
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+def parse_weekend(text):
+    """Weekday numbers (Monday=0) from e.g. "Sat,Sun" """
+    days = set()
+    for name in (part.strip().lower()[:3] for part in text.split(',')):
+        if name:
+            days.add(WEEKDAYS.index(name))
+    return frozenset(days)
+
+
+class WorkCalendar:
+    """Per-academic-year prefix sums of working days"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._years = {}  # first day of the academic year -> array of cumulative working days
+        self._version = None
+        self._checked_at = 0.0
+
+    def init_app(self, app, holidays, version):
+        """``holidays(first, following)`` returns the holiday dates in [first, following),
+        ``version()`` a token that changes whenever holidays do"""
+        self.start_month = int(app.config.get('ACADEMIC_YEAR_START_MONTH', 6))
+        self.weekend = app.config.get('WEEKEND_DAYS', frozenset([6]))
+        self._holidays, self._version_fn = holidays, version
+
+    def reset(self):
+        with self._lock:
+            self._years = {}
+            self._checked_at = 0.0
+
+    def _year_start(self, day):
+        year = day.year if day.month >= self.start_month else day.year - 1
+        return date(year, self.start_month, 1)
+
+    def check_range(self, start, end, today):
+        """Raise ValueError unless start..end may be counted for a leave requested on today"""
+        if end < start:
+            raise ValueError('The end date is before the start date')
+        if (end - start).days >= MAX_SPAN_DAYS:
+            raise ValueError(f'A leave can span at most {MAX_SPAN_DAYS} days')
+        current = self._year_start(today)
+        first = current.replace(year=current.year - YEARS_AROUND)
+        following = current.replace(year=current.year + YEARS_AROUND + 1)
+        if start < first or end >= following:
+            raise ValueError(f'Dates must fall between {first} and {following - timedelta(days=1)}')
+
+    def _check_version(self, force=False):
+        if not force and time.monotonic() - self._checked_at < CHECK_SECONDS:
+            return
+        version = self._version_fn()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version != self._version:
+                self._version = version
+                self._years = {}
+
+    def _prefix(self, first):
+        prefix = self._years.get(first)
+        if prefix is not None:
+            return prefix
+        following = first.replace(year=first.year + 1)
+        holidays = set(self._holidays(first, following))
+        prefix = array('H', [0])
+        day, count = first, 0
+        while day < following:
+            if day.weekday() not in self.weekend and day not in holidays:
+                count += 1
+            prefix.append(count)
+            day += timedelta(days=1)
+        with self._lock:
+            self._years[first] = prefix
+        return prefix
+
+    def working_days(self, start, end, fresh=False):
+        """Working days from start to end, both included (0 when end is before start).
+
+        ``fresh`` compares the calendar version now instead of relying on the last check.
+        """
+        self._check_version(force=fresh)
+        total = 0
+        while start <= end:
+            first = self._year_start(start)
+            prefix = self._prefix(first)
+            last = min(end, first.replace(year=first.year + 1) - timedelta(days=1))
+            total += prefix[(last - first).days + 1] - prefix[(start - first).days]
+            start = last + timedelta(days=1)
+        return total
+
+
+def recount(conn, metadata, calendar, since=None):
+    """Store calendar working days in every live leave ending on or after since (all when None).
+
+    Approved leaves move their balance (the year the leave starts) by the
+    same difference. Returns the number of leaves changed.
+    """
+    leaves, balances = metadata.tables['leaves'], metadata.tables['leave_balance']
+    update_leave = leaves.update().where(leaves.c.id == bindparam('leave_id')).values(number_of_days=bindparam('days'))
+    update_balance = balances.update().where(and_(
+        balances.c.user_id == bindparam('b_user'), balances.c.leave_type == bindparam('b_type'),
+        balances.c.year == bindparam('b_year'),
+    )).values(used_days=balances.c.used_days + bindparam('delta'),
+              remaining_days=balances.c.remaining_days - bindparam('delta'))
+
+    changed, after = 0, 0
+    while True:
+        query = select(leaves.c.id, leaves.c.user_id, leaves.c.leave_type, leaves.c.start_date, leaves.c.end_date,
+                       leaves.c.status, leaves.c.number_of_days).where(leaves.c.id > after)
+        if since is not None:
+            query = query.where(leaves.c.end_date >= since)
+        rows = conn.execute(query.order_by(leaves.c.id).limit(BATCH)).all()
+        if not rows:
+            return changed
+        after = rows[-1].id
+        updates, deltas = [], {}
+        for row in rows:
+            days = calendar.working_days(row.start_date, row.end_date)
+            if days == row.number_of_days:
+                continue
+            updates.append({'leave_id': row.id, 'days': days})
+            if row.status == 'Approved':
+                key = (row.user_id, row.leave_type, row.start_date.year)
+                deltas[key] = deltas.get(key, 0) + days - (row.number_of_days or 0)
+        if updates:
+            conn.execute(update_leave, updates)
+            changed += len(updates)
+        moves = [{'b_user': user_id, 'b_type': leave_type, 'b_year': year, 'delta': delta}
+                 for (user_id, leave_type, year), delta in deltas.items() if delta]
+        if moves:
+            conn.execute(update_balance, moves)
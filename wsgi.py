@@ -0,0 +1,11 @@
+"""WSGI entry point.
+
+    gunicorn --preload --workers 4 --bind 0.0.0.0:8000 wsgi:app
+
+With ``--preload`` the master imports this module once: templates are
+compiled and report assets loaded before forking, and every worker starts
+with fresh database connections.
+"""
+from app import create_app
+
+app = create_app(preload=True)